@@ -3,8 +3,8 @@ Camera Module - Tích hợp MediaPipe Face Processor
 Sử dụng PySide6 cho GUI và MediaPipe để xử lý
 """
 
+import argparse
 import sys
-import cv2
 import time  # --- MỚI ---: Cần để theo dõi thời gian (nhắm mắt, ngáp)
 import threading # <--- Thêm dòng này để chạy âm thanh không bị lag
 # --- CẬP NHẬT IMPORT ---
@@ -19,9 +19,27 @@ from PySide6.QtWidgets import (
 
 from modules.sound import SoundModule # <--- Import module phát nhạc có sẵn
 from modules.email_alert import send_alert_email
+from modules.mjpeg_server import MJPEGServer
+from modules import metrics
+from modules.latency_trace import AlertLatencyTracer
+from modules.alert_logic import AlertEngine, SEVERITY_SAFE
+from modules.clock import SystemClock
+from modules.driver_profile import DriverProfileStore
+from modules.outbox import Outbox, OutboxUploader
+from modules.credential_cache import CredentialCache
+from modules.quality_governor import QUALITY_LEVELS, QualityGovernor
+from modules.detector_scheduler import DetectorScheduler
+from modules.identity import IdentityStore, IdentityVerifier
+from modules.telemetry import TelemetryRecorder
+from modules.trip_log import TripRecorder
+from modules.retention import RetentionManager
+from modules.timeseries import MetricHistory
+from modules.live_chart import LiveChartWidget
+from modules.ui_refresh import UIRefreshScheduler, property_applier
+from modules import firebase_config
 # --- MỚI ---: Import FaceProcessor từ file face_processor.py
 try:
-    from modules.face_processor import FaceProcessor
+    from modules.face_processor import ProcessorLoader
 except ImportError:
     print("Lỗi: Không tìm thấy file 'face_processor.py'.")
     print("Hãy đảm bảo bạn có file 'modules/__init__.py' (có thể rỗng)")
@@ -33,34 +51,93 @@ except ImportError:
 class VideoThread(QThread):
     change_pixmap_signal = Signal(QImage)
     # --- MỚI ---: Signal để gửi dữ liệu (EAR, MAR, góc) về MainWindow
-    detection_data_signal = Signal(dict)
+    # object (DetectionRecord): Qt chỉ chuyển tham chiếu, không đổi sang QVariantMap mỗi frame
+    detection_data_signal = Signal(object)
 
-    def __init__(self, source=0):
+    def __init__(self, source=0, frame_sink=None, processor_loader=None, governor=None, detectors=None,
+                 identity=None):
         super().__init__()
         self._run_flag = True
         self.source = source
-        # --- MỚI ---: Khởi tạo processor
-        try:
-            self.processor = FaceProcessor()
-        except Exception as e:
-            print(f"Lỗi khi khởi tạo FaceProcessor: {e}")
-            self.processor = None
+        # --- MỚI ---: FaceProcessor được tạo + làm nóng sẵn trên luồng nền và dùng lại
+        self.processor_loader = processor_loader or ProcessorLoader()
+        # --- MỚI ---: Nơi nhận ảnh đã vẽ (VD: MJPEGServer), None = không dùng
+        self.frame_sink = frame_sink
+        self.frame_seq = 0  # Số thứ tự frame (đi kèm dữ liệu nhận diện)
+        # --- MỚI ---: Tự điều chỉnh chất lượng để giữ FPS mục tiêu (None = luôn chất lượng cao nhất)
+        self.governor = governor
+        # --- MỚI ---: Mô hình phụ (điện thoại, tay lái...) chạy trên worker riêng, tần số thấp
+        self.detectors = detectors
+        # --- MỚI ---: Xác minh tài xế từ landmark đã có (None = tắt)
+        self.identity = identity
+        self.processor = None
 
     def run(self):
+        import cv2  # Import trễ: không làm chậm lúc mở cửa sổ
+        # Chờ processor (nếu chưa làm nóng xong) ngay trên luồng video, không chặn giao diện
+        self.processor = self.processor_loader.get()
         if not self.processor:
             print("Lỗi: FaceProcessor không được khởi tạo. Thoát thread.")
             return
+        self.processor.identity = self.identity
+
+        # --- MỚI ---: Lấy sẵn các chỉ số con (tránh tra nhãn mỗi frame)
+        capture_hist = metrics.STAGE_LATENCY.labels(stage="capture")
+        inference_hist = metrics.STAGE_LATENCY.labels(stage="inference")
+        convert_hist = metrics.STAGE_LATENCY.labels(stage="convert")
+        read_failed = metrics.FRAMES_DROPPED.labels(reason="read_failed")
+        governor_skipped = metrics.FRAMES_DROPPED.labels(reason="governor_skip")
+        governor = self.governor
+        detectors = self.detectors
+        capture_seq = 0
+        if governor is not None:
+            self.processor.configure(**self._level_settings(governor.level))
+        else:
+            # Tắt governor -> về chất lượng cao nhất (processor được dùng lại, có thể đang ở mức đã hạ)
+            self.processor.configure(**self._level_settings(QUALITY_LEVELS[0]))
+        capture_rate = metrics.RateMeter(metrics.CAPTURE_FPS, time.perf_counter)
+        inference_rate = metrics.RateMeter(metrics.INFERENCE_FPS, time.perf_counter)
 
         cap = cv2.VideoCapture(self.source)
         while self._run_flag and cap.isOpened():
+            t_start = time.perf_counter()
             ret, frame = cap.read()
+            t_captured = time.perf_counter()
             if ret:
+                capture_hist.observe(t_captured - t_start)
+                metrics.FRAMES_CAPTURED.inc()
+                capture_rate.tick()
+
                 # --- MỚI ---: Lật ảnh (webcam thường bị ngược)
                 frame = cv2.flip(frame, 1)
 
+                # --- MỚI ---: Governor: đổi mức chất lượng / bỏ bớt frame trên máy yếu
+                capture_seq += 1
+                if governor is not None:
+                    new_level = governor.tick()
+                    if new_level is not None:
+                        self.processor.configure(**self._level_settings(new_level))
+                    if not governor.should_infer(capture_seq):
+                        governor_skipped.inc()
+                        continue
+
                 # --- MỚI ---: Xử lý frame bằng processor
                 # annotated_frame là ảnh BGR đã vẽ, data là dict kết quả
-                annotated_frame, data = self.processor.process_frame(frame)
+                annotated_frame, data = self.processor.process_frame(frame, timestamp=t_captured)
+                self.frame_seq += 1
+                data["frame_seq"] = self.frame_seq
+                if detectors is not None:
+                    # Chỉ trao tham chiếu frame cho worker (không chờ), rồi gộp kết quả mới nhất
+                    detectors.submit(frame, t_captured)
+                    detectors.apply(data, t_captured)
+                t_inferred = time.perf_counter()
+                inference_hist.observe(t_inferred - t_captured)
+                metrics.FRAMES_PROCESSED.inc()
+                inference_rate.tick()
+
+                # --- MỚI ---: Đẩy ảnh cho server MJPEG (không chặn, tự bỏ khung nếu chậm)
+                if self.frame_sink is not None:
+                    self.frame_sink.publish(annotated_frame)
 
                 # --- CẬP NHẬT ---: Chuyển đổi ảnh đã vẽ (annotated_frame)
                 rgb_image = cv2.cvtColor(annotated_frame, cv2.COLOR_BGR2RGB)
@@ -69,92 +146,150 @@ class VideoThread(QThread):
                 convert_to_Qt_format = QImage(
                     rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888
                 )
+                t_converted = time.perf_counter()
+                convert_hist.observe(t_converted - t_inferred)
+                if governor is not None:
+                    governor.observe(inference=t_inferred - t_captured, convert=t_converted - t_inferred)
                 
                 # Gửi ảnh đi
                 self.change_pixmap_signal.emit(convert_to_Qt_format)
                 
                 # --- MỚI ---: Gửi dữ liệu (EAR, MAR, v.v.) đi
                 self.detection_data_signal.emit(data)
+            else:
+                read_failed.inc()
 
         cap.release()
         print("Đã giải phóng camera.")
 
+    @staticmethod
+    def _level_settings(level):
+        return {"inference_width": level.inference_width, "overlay": level.overlay, "refine": level.refine}
+
     def stop(self):
         self._run_flag = False
         self.wait()
-        # --- MỚI ---: Giải phóng tài nguyên MediaPipe
-        if self.processor:
-            self.processor.close()
-            print("Đã đóng FaceProcessor.")
+        # FaceProcessor KHÔNG đóng ở đây: được dùng lại cho lần bắt đầu sau
+        # (MainWindow đóng nó khi thoát ứng dụng)
 
 
 # --- Cửa sổ chính (ĐÃ CẬP NHẬT) ---
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, user_id):
+        """user_id: uid Firebase của tài khoản đã đăng nhập (log.py truyền vào qua --user-id)"""
         super().__init__()
         self.setWindowTitle("Hệ thống Giám sát Lái xe")
         self.setGeometry(100, 100, 1024, 768)
         self.video_thread = None
+        self.mjpeg_server = None
+        self.metrics_server = None
 
         # --- MỚI ---: Thêm biến trạng thái giao diện
         self.current_theme = "dark" # Bắt đầu với theme tối
 
-        # --- MỚI ---: Khởi tạo các biến cấu hình và trạng thái
+        # --- MỚI ---: Khởi tạo các biến cấu hình
         self.init_config_vars()
-        self.init_state_vars()
         # --- MỚI: Khởi tạo module âm thanh ---
         self.sound_module = SoundModule()
+        # --- MỚI: Đo độ trễ cảnh báo đầu-cuối (frame -> còi / email) ---
+        self.latency_tracer = AlertLatencyTracer()
+        # --- MỚI: Logic cảnh báo (tách riêng, dùng chung với chế độ phát lại) ---
+        # MainWindow đóng vai trò "sink": nhận lệnh phát âm thanh / gửi email
+        self.user_id = user_id
+        # Ngưỡng EAR/MAR tự học + roll_offset được lưu theo tài xế -> ca sau không phải học lại
+        self.alert_engine = AlertEngine(
+            clock=SystemClock(), sink=self,
+            profile_store=DriverProfileStore(), driver_id=self.user_id
+        )
+        # --- MỚI: FaceMesh được tạo + chạy thử trên luồng nền khi cửa sổ đã hiện ---
+        self.processor_loader = ProcessorLoader()
+        # Giữ qua các lần Bắt đầu/Dừng -> không phải dò lại mức phù hợp với máy
+        self.governor = QualityGovernor(target_fps=self.config_target_fps, cpu_budget=self.config_cpu_budget)
+        # Mô hình phụ khai báo trong config/detectors.json (nạp trên worker khi bắt đầu giám sát)
+        self.detector_scheduler = DetectorScheduler()
+        # Xác minh người lái đúng là tài khoản đang đăng nhập (chữ ký hình học khuôn mặt)
+        self.identity_verifier = IdentityVerifier(IdentityStore(), self.user_id)
+        # --- MỚI: Telemetry -> outbox SQLite (offline-first), tải lên nền khi có mạng ---
+        self.outbox = Outbox()
+        self.telemetry = TelemetryRecorder(self.outbox, user_id=self.user_id)
+        self.alert_engine.alert_listeners.append(self.telemetry.on_alert)
+        # Ghi từng frame + cảnh báo của chuyến (data/trips/...) để làm báo cáo sau ca (trip_report.py)
+        self.trip_recorder = TripRecorder(user_id=self.user_id)
+        # Giữ data/ trong ngân sách dung lượng (gộp chuyến cũ, nén log, xóa clip cũ) – luồng nền ưu tiên thấp
+        self.retention = RetentionManager()
+        self.uploader = OutboxUploader(
+            self.outbox, firebase_config.config["databaseURL"], f"telemetry/{self.user_id}",
+            # idToken từ refresh token lưu lúc đăng nhập (log.py); chưa có -> giữ dữ liệu trong outbox
+            # (chỉ refresh token của chính tài khoản này)
+            auth_token_provider=firebase_config.IdTokenProvider(
+                lambda: CredentialCache().load_refresh_token(self.user_id)
+            ),
+        )
+
+        # --- MỚI: Lịch sử EAR/MAR/góc cho biểu đồ (vòng đệm cố định, tối đa 30 FPS) ---
+        self.chart_history = MetricHistory(capacity=int(self.config_chart_window_sec * 30))
+        # --- MỚI: Gom cập nhật status bar, áp dụng ~10 lần/giây và chỉ khi giá trị đổi ---
+        self.ui_refresh = UIRefreshScheduler()
+        self.ui_refresh_timer = QTimer(self)
+        self.ui_refresh_timer.setInterval(self.ui_refresh.interval_ms)
+        self.ui_refresh_timer.timeout.connect(self.ui_refresh.flush)
 
         self.initUI()
         self.apply_styles() # <-- Sẽ áp dụng theme "dark" mặc định
         self.show_monitoring_page()
+        self.update_metrics_server()
+        # Đợi vòng lặp sự kiện chạy (cửa sổ đã vẽ) rồi mới khởi động các phần nặng
+        QTimer.singleShot(0, self.start_background_warmup)
+
+    def start_background_warmup(self):
+        """Làm nóng FaceMesh và mixer âm thanh trên luồng nền"""
+        self.processor_loader.start()
+        self.sound_module.preload()
+        if self.config_sync_enabled:
+            self.uploader.start()
+        self.retention.start()
 
     # --- MỚI ---: Hàm khởi tạo các biến CẤU HÌNH (settings)
     def init_config_vars(self):
-        """Lưu trữ các giá trị ngưỡng từ trang Cài đặt"""
-        
-        # Ngưỡng vật lý (nội bộ, không đổi)
-        self.INTERNAL_EAR_THRESHOLD = 0.25 
-        self.INTERNAL_MAR_THRESHOLD = 0.5   
-        self.INTERNAL_YAWN_RESET_TIME_SEC = 60 
-        
-        # Ngưỡng do người dùng cài đặt (lấy từ giá trị mặc định của SpinBox)
-        self.config_yawn_threshold_count = 3  # (lần)
-        self.config_eye_time_sec = 2          # (giây)
-        self.config_head_angle_deg = 20       # (độ)
-        self.config_audio_alert = "Tiếng Bíp (Mặc định)" 
-        self.config_recipient_email = ""  # Email nhận cảnh báo
-    # --- MỚI ---: Hàm khởi tạo các biến TRẠNG THÁI (state)
-    def init_state_vars(self):
-        """Reset các biến theo dõi trạng thái (dùng khi bắt đầu/dừng)"""
-        self.eye_closed_start_time = None
-        # --- MỚI: Biến theo dõi thời gian cho Ngáp và Mất mặt ---
-        self.no_face_start_time = None # Thời điểm bắt đầu mất mặt
-        self.yawn_start_time = None    # Thời điểm bắt đầu mở miệng (ngáp)
-        self.is_yawning_state = False # Trạng thái đang ngáp (để đếm 1 lần)
-        self.eye_closed_start_time = None
-        self.yawn_count = 0
-        self.last_yawn_time = None
-        self.last_sound_time = 0
-        self.last_email_time = 0
-    # --- MỚI: Biến lưu góc lệch của đầu (Calibration) ---
-        # Nếu chưa calibrate thì mặc định là 0
-        if not hasattr(self, 'roll_offset'):
-            self.roll_offset = 0
+        """Cấu hình riêng của giao diện (ngưỡng cảnh báo nằm trong AlertEngine)"""
+        # --- MỚI: Phát video qua mạng nội bộ (MJPEG) cho người giám sát ---
+        self.config_stream_enabled = False
+        self.config_stream_port = 8080
+        self.config_stream_fps = 10           # (FPS tối đa cho người xem)
+        # --- MỚI: Endpoint /metrics (Prometheus) ---
+        self.config_metrics_enabled = False
+        self.config_metrics_port = 9108
+        # --- MỚI: Đồng bộ cảnh báo + tóm tắt theo phút lên Firebase (qua outbox SQLite) ---
+        self.config_sync_enabled = True
+        # --- MỚI: Governor chất lượng (giữ FPS xử lý ổn định trên máy yếu) ---
+        self.config_governor_enabled = True
+        self.config_target_fps = 15
+        self.config_cpu_budget = 0.7          # (phần của 1 nhân CPU)
+        # --- MỚI: Biểu đồ thời gian thực ---
+        self.config_chart_window_sec = 180    # Hiển thị 3 phút gần nhất
+
+    def chart_thresholds(self):
+        """Ngưỡng đang dùng để vẽ trên biểu đồ (gật / ngẩng: góc đã cân bằng, luật nghiêng đầu)"""
+        engine = self.alert_engine
+        return {
+            "ear": engine.INTERNAL_EAR_THRESHOLD,
+            "mar": engine.INTERNAL_MAR_THRESHOLD,
+            "head_pitch": (engine.config_head_angle_deg, -engine.config_head_angle_deg),
+        }
+
+    def show_status(self, text):
+        """Thông báo do người dùng thao tác: hiện ngay, thay cho giá trị frame đang chờ"""
+        self.ui_refresh.set_now("status_text", text)
 
     # --- LOGIC MỚI: Cân bằng đầu ---
     @Slot()
     def calibrate_head_pose(self):
         """Lấy góc nghiêng hiện tại làm mốc 0"""
-        # Chúng ta cần lấy giá trị roll hiện tại. 
-        # Vì biến roll nằm trong luồng thread, ta sẽ truy cập qua biến tạm hoặc
-        # đơn giản là set flag để lần update sau tự lấy.
-        # Cách đơn giản nhất: Lưu giá trị raw_roll mới nhất vào self
-        if hasattr(self, 'current_raw_roll'):
-            self.roll_offset = self.current_raw_roll
-            self.status_bar_label.setText(f"Đã cân bằng! Góc lệch mới: {self.roll_offset:.1f} độ")
+        offset = self.alert_engine.calibrate_head_pose()
+        if offset is not None:
+            self.show_status(f"Đã cân bằng! Góc lệch mới: {offset:.1f} độ")
         else:
-            self.status_bar_label.setText("Chưa nhận diện được khuôn mặt để cân bằng!")
+            self.show_status("Chưa nhận diện được khuôn mặt để cân bằng!")
 
     # --- LOGIC MỚI: Tắt còi thủ công ---
     @Slot()
@@ -164,10 +299,10 @@ class MainWindow(QMainWindow):
         self.sound_module.stop_sound()
         
         # 2. Reset toàn bộ bộ đếm
-        self.init_state_vars()
+        self.alert_engine.init_state_vars()
         
         # 3. Thông báo
-        self.status_bar_label.setText("Trạng thái: Đã tắt còi & Reset hệ thống")
+        self.show_status("Trạng thái: Đã tắt còi & Reset hệ thống")
         print("Người dùng đã tắt cảnh báo thủ công.")
 
     def initUI(self):
@@ -228,9 +363,14 @@ class MainWindow(QMainWindow):
 
         main_area_layout.addWidget(self.stacked_widget)
 
-        self.status_bar_label = QLabel("Trạng thái: Idle (User: GX6dYP8C63db3jEVACfvmw3uJDH2)")
+        self.status_bar_label = QLabel(f"Trạng thái: Idle (User: {self.user_id})")
         self.status_bar_label.setObjectName("StatusBar")
         self.status_bar_label.setFixedHeight(25)
+        # --- MỚI ---: Màu theo mức độ = thuộc tính động, QSS viết sẵn trong theme (không setStyleSheet mỗi frame)
+        self.status_bar_label.setProperty("severity", SEVERITY_SAFE)
+        self.ui_refresh.bind("status_text", self.status_bar_label.setText, shown=self.status_bar_label.text())
+        self.ui_refresh.bind("status_severity", property_applier(self.status_bar_label, "severity"),
+                             shown=SEVERITY_SAFE)
         
         main_area_layout.addWidget(self.status_bar_label)
         main_layout.addWidget(main_area, 1)
@@ -252,6 +392,11 @@ class MainWindow(QMainWindow):
         self.video_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.video_label.setMinimumSize(640, 480)
         layout.addWidget(self.video_label, 1)
+        # --- MỚI: Biểu đồ EAR / MAR / góc đầu vài phút gần nhất ---
+        self.live_chart = LiveChartWidget(
+            self.chart_history, thresholds=self.chart_thresholds, window_sec=self.config_chart_window_sec
+        )
+        layout.addWidget(self.live_chart)
         # --- MỚI: Hàng nút chức năng phụ ---
         tools_layout = QHBoxLayout()
         
@@ -316,6 +461,11 @@ class MainWindow(QMainWindow):
         self.btn_switch_account.setCursor(Qt.CursorShape.PointingHandCursor)
         self.btn_switch_account.clicked.connect(self.do_switch_account) # Kết nối
 
+        self.btn_enroll_face = QPushButton("ĐĂNG KÝ KHUÔN MẶT")
+        self.btn_enroll_face.setObjectName("MenuButton")
+        self.btn_enroll_face.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.btn_enroll_face.clicked.connect(self.do_enroll_face)
+
         self.btn_logout = QPushButton("ĐĂNG XUẤT")
         self.btn_logout.setObjectName("StopButton") # Dùng style nút Dừng màu đỏ
         self.btn_logout.setCursor(Qt.CursorShape.PointingHandCursor)
@@ -326,6 +476,8 @@ class MainWindow(QMainWindow):
         form_layout.addSpacing(20)
         form_layout.addWidget(self.btn_switch_account)
         form_layout.addSpacing(10)
+        form_layout.addWidget(self.btn_enroll_face)
+        form_layout.addSpacing(10)
         form_layout.addWidget(self.btn_logout)
         
         main_layout.addSpacerItem(QSpacerItem(20, 40, QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding))
@@ -355,13 +507,13 @@ class MainWindow(QMainWindow):
 # --- MỚI: Ô nhập Email người thân ---
         self.email_input = QLineEdit()
         self.email_input.setPlaceholderText("Ví dụ: nguoi_than@gmail.com")
-        self.email_input.setText(self.config_recipient_email) # Hiển thị email cũ nếu có
+        self.email_input.setText(self.alert_engine.config_recipient_email) # Hiển thị email cũ nếu có
         self.email_input.setStyleSheet("background-color: #ffffff; color: #2c3e50; padding: 8px; border-radius: 4px;")
         settings_form.addRow(QLabel("Email người thân:"), self.email_input)
         # 1. Âm thanh
         self.audio_alert_combo = QComboBox()
         self.audio_alert_combo.addItems(["Tiếng Bíp (Mặc định)", "Giọng nói cảnh báo", "Tắt âm thanh"])
-        self.audio_alert_combo.setCurrentText(self.config_audio_alert)
+        self.audio_alert_combo.setCurrentText(self.alert_engine.config_audio_alert)
         self.audio_alert_combo.setCursor(Qt.CursorShape.PointingHandCursor)
         settings_form.addRow(QLabel("Âm thanh cảnh báo:"), self.audio_alert_combo)
 
@@ -377,7 +529,7 @@ class MainWindow(QMainWindow):
         # 3. Ngưỡng ngáp
         self.yawn_threshold_spinbox = QSpinBox()
         self.yawn_threshold_spinbox.setRange(1, 10) 
-        self.yawn_threshold_spinbox.setValue(self.config_yawn_threshold_count) # Cập nhật
+        self.yawn_threshold_spinbox.setValue(self.alert_engine.config_yawn_threshold_count) # Cập nhật
         self.yawn_threshold_spinbox.setSuffix(" lần")
         self.yawn_threshold_spinbox.setCursor(Qt.CursorShape.PointingHandCursor)
         settings_form.addRow(QLabel("Ngưỡng ngáp:"), self.yawn_threshold_spinbox)
@@ -385,7 +537,7 @@ class MainWindow(QMainWindow):
         # 4. Ngưỡng nhắm mắt
         self.eye_time_spinbox = QSpinBox()
         self.eye_time_spinbox.setRange(1, 10) 
-        self.eye_time_spinbox.setValue(self.config_eye_time_sec) # Cập nhật
+        self.eye_time_spinbox.setValue(self.alert_engine.config_eye_time_sec) # Cập nhật
         self.eye_time_spinbox.setSuffix(" giây")
         self.eye_time_spinbox.setCursor(Qt.CursorShape.PointingHandCursor)
         settings_form.addRow(QLabel("Nhắm mắt quá:"), self.eye_time_spinbox)
@@ -393,11 +545,49 @@ class MainWindow(QMainWindow):
         # 5. Ngưỡng nghiêng đầu
         self.head_angle_spinbox = QSpinBox()
         self.head_angle_spinbox.setRange(10, 45) 
-        self.head_angle_spinbox.setValue(self.config_head_angle_deg) # Cập nhật
+        self.head_angle_spinbox.setValue(self.alert_engine.config_head_angle_deg) # Cập nhật
         self.head_angle_spinbox.setSuffix(" độ")
         self.head_angle_spinbox.setCursor(Qt.CursorShape.PointingHandCursor)
         settings_form.addRow(QLabel("Đầu nghiêng quá:"), self.head_angle_spinbox)
 
+        # 5b. Ngưỡng EAR/MAR tự học theo tài xế (2 phút đầu ca)
+        self.adaptive_thresholds_cb = QCheckBox("Tự học ngưỡng mắt/miệng theo tài xế")
+        self.adaptive_thresholds_cb.setChecked(self.alert_engine.config_adaptive_thresholds)
+        self.adaptive_thresholds_cb.setCursor(Qt.CursorShape.PointingHandCursor)
+        settings_form.addRow(QLabel("Ngưỡng cá nhân:"), self.adaptive_thresholds_cb)
+
+        # 6. Phát video qua mạng (MJPEG)
+        self.stream_enabled_cb = QCheckBox("Bật xem trực tiếp qua trình duyệt")
+        self.stream_enabled_cb.setChecked(self.config_stream_enabled)
+        self.stream_enabled_cb.setCursor(Qt.CursorShape.PointingHandCursor)
+        settings_form.addRow(QLabel("Phát video (MJPEG):"), self.stream_enabled_cb)
+
+        self.stream_fps_spinbox = QSpinBox()
+        self.stream_fps_spinbox.setRange(1, 30)
+        self.stream_fps_spinbox.setValue(self.config_stream_fps)
+        self.stream_fps_spinbox.setSuffix(" FPS")
+        self.stream_fps_spinbox.setCursor(Qt.CursorShape.PointingHandCursor)
+        settings_form.addRow(QLabel("FPS người xem:"), self.stream_fps_spinbox)
+
+        # 6b. Governor chất lượng
+        self.governor_enabled_cb = QCheckBox("Tự giảm chất lượng để giữ FPS")
+        self.governor_enabled_cb.setChecked(self.config_governor_enabled)
+        self.governor_enabled_cb.setCursor(Qt.CursorShape.PointingHandCursor)
+        settings_form.addRow(QLabel("Tối ưu hiệu năng:"), self.governor_enabled_cb)
+
+        self.target_fps_spinbox = QSpinBox()
+        self.target_fps_spinbox.setRange(5, 30)
+        self.target_fps_spinbox.setValue(self.config_target_fps)
+        self.target_fps_spinbox.setSuffix(" FPS")
+        self.target_fps_spinbox.setCursor(Qt.CursorShape.PointingHandCursor)
+        settings_form.addRow(QLabel("FPS xử lý mục tiêu:"), self.target_fps_spinbox)
+
+        # 7. Endpoint /metrics cho Prometheus
+        self.metrics_enabled_cb = QCheckBox(f"Bật /metrics (cổng {self.config_metrics_port})")
+        self.metrics_enabled_cb.setChecked(self.config_metrics_enabled)
+        self.metrics_enabled_cb.setCursor(Qt.CursorShape.PointingHandCursor)
+        settings_form.addRow(QLabel("Giám sát hiệu năng:"), self.metrics_enabled_cb)
+
         # Nút Lưu
         btn_save = QPushButton("LƯU CÀI ĐẶT")
         btn_save.setObjectName("StartButton")
@@ -452,34 +642,89 @@ class MainWindow(QMainWindow):
     @Slot()
     def start_video(self):
         # --- MỚI ---: Reset trạng thái mỗi khi bắt đầu
-        self.init_state_vars()
+        self.alert_engine.init_state_vars()
 
         if self.video_thread is not None:
             self.video_thread.stop()
             
-        self.video_thread = VideoThread(source=0)
+        # --- MỚI ---: Bật server MJPEG nếu được cấu hình
+        self.start_stream_server()
+
+        self.video_thread = VideoThread(
+            source=0, frame_sink=self.mjpeg_server, processor_loader=self.processor_loader,
+            governor=self.governor if self.config_governor_enabled else None,
+            detectors=self.detector_scheduler, identity=self.identity_verifier
+        )
         self.video_thread.change_pixmap_signal.connect(self.update_image)
         # --- MỚI ---: Kết nối với signal dữ liệu
         self.video_thread.detection_data_signal.connect(self.handle_detection_data)
         
+        self.detector_scheduler.reset()
+        self.detector_scheduler.start()
+        self.identity_verifier.reset()
         self.video_thread.start()
+        self.ui_refresh_timer.start()
+        self.chart_history.clear()
+        self.live_chart.start()
+        self.trip_recorder.start()
         self.btn_bat_dau.setEnabled(False)
         self.btn_dung_lai.setEnabled(True)
         self.video_label.setText("")
-        self.status_bar_label.setText("Trạng thái: Đang khởi động...")
+        self.show_status("Trạng thái: Đang khởi động...")
 
     @Slot()
     def stop_video(self):
         if self.video_thread:
             self.video_thread.stop()
             self.video_thread = None
+        self.detector_scheduler.stop()
+        # Dữ liệu frame cũ chưa kịp hiển thị không được đè lên trạng thái Idle
+        self.ui_refresh_timer.stop()
+        self.ui_refresh.discard()
+        self.live_chart.stop()
+        self.stop_stream_server()
+        # Ghi nốt bản tóm tắt của phút đang dở
+        self.telemetry.close()
+        self.trip_recorder.close(self.alert_engine)
         self.btn_bat_dau.setEnabled(True)
         self.btn_dung_lai.setEnabled(False)
         self.video_label.setText("No video")
         # --- CẬP NHẬT ---: Reset status bar
-        self.status_bar_label.setText("Trạng thái: Idle (User: GX6dYP8C63db3jEVACfvmw3uJDH2)")
+        self.show_status(f"Trạng thái: Idle (User: {self.user_id})")
 
 
+    # --- MỚI ---: Bật/tắt server MJPEG
+    def start_stream_server(self):
+        if not self.config_stream_enabled or self.mjpeg_server is not None:
+            return
+        try:
+            self.mjpeg_server = MJPEGServer(
+                port=self.config_stream_port,
+                max_fps=self.config_stream_fps
+            )
+            self.mjpeg_server.start()
+        except OSError as e:
+            print(f"Lỗi khởi động server MJPEG: {e}")
+            self.mjpeg_server = None
+
+    def stop_stream_server(self):
+        if self.mjpeg_server is not None:
+            self.mjpeg_server.stop()
+            self.mjpeg_server = None
+
+    # --- MỚI ---: Bật/tắt endpoint /metrics theo cấu hình
+    def update_metrics_server(self):
+        if self.config_metrics_enabled and self.metrics_server is None:
+            try:
+                self.metrics_server = metrics.MetricsServer(port=self.config_metrics_port)
+                self.metrics_server.start()
+            except OSError as e:
+                print(f"Lỗi khởi động endpoint metrics: {e}")
+                self.metrics_server = None
+        elif not self.config_metrics_enabled and self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+
     @Slot(QImage)
     def update_image(self, qt_img):
         pixmap = QPixmap.fromImage(qt_img).scaled(
@@ -491,6 +736,14 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         self.stop_video()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        # Giải phóng tài nguyên MediaPipe
+        self.processor_loader.close()
+        self.detector_scheduler.close()
+        self.uploader.stop()
+        self.retention.stop()
+        self.outbox.close()
         event.accept()
 
     # --- HÀM apply_styles (ĐÃ TÁCH RA ĐỂ HỖ TRỢ LIGHT/DARK MODE) ---
@@ -616,6 +869,8 @@ class MainWindow(QMainWindow):
                 color: #95a5a6;
                 font-size: 11px;
             }
+            QLabel#StatusBar[severity="warning"] { color: #f39c12; font-weight: bold; }
+            QLabel#StatusBar[severity="danger"] { color: #e74c3c; font-weight: bold; }
             
             /* --- Trang Cài đặt (Form) --- */
             QWidget#FormContainer {
@@ -787,6 +1042,9 @@ class MainWindow(QMainWindow):
                 color: #34495e;
                 font-size: 11px;
             }
+            QLabel#StatusBar[severity="safe"] { color: #95a5a6; }
+            QLabel#StatusBar[severity="warning"] { color: #f39c12; font-weight: bold; }
+            QLabel#StatusBar[severity="danger"] { color: #e74c3c; font-weight: bold; }
             
             /* --- Trang Cài đặt (Form) --- */
             QWidget#FormContainer {
@@ -864,28 +1122,40 @@ class MainWindow(QMainWindow):
     @Slot()
     def save_settings(self):
         """Đọc giá trị từ SpinBox và lưu vào biến config"""
-        self.config_yawn_threshold_count = self.yawn_threshold_spinbox.value()
-        self.config_eye_time_sec = self.eye_time_spinbox.value()
-        self.config_head_angle_deg = self.head_angle_spinbox.value()
-        self.config_audio_alert = self.audio_alert_combo.currentText()
+        self.alert_engine.config_yawn_threshold_count = self.yawn_threshold_spinbox.value()
+        self.alert_engine.config_eye_time_sec = self.eye_time_spinbox.value()
+        self.alert_engine.config_head_angle_deg = self.head_angle_spinbox.value()
+        self.alert_engine.config_audio_alert = self.audio_alert_combo.currentText()
         # --- MỚI: Lưu email ---
-        self.config_recipient_email = self.email_input.text().strip()
+        self.alert_engine.config_recipient_email = self.email_input.text().strip()
+        adaptive = self.adaptive_thresholds_cb.isChecked()
+        if adaptive != self.alert_engine.config_adaptive_thresholds:
+            self.alert_engine.config_adaptive_thresholds = adaptive
+            self.alert_engine.load_profile()
+        # --- MỚI: Lưu cấu hình phát video (áp dụng từ lần BẮT ĐẦU kế tiếp) ---
+        self.config_stream_enabled = self.stream_enabled_cb.isChecked()
+        self.config_stream_fps = self.stream_fps_spinbox.value()
+        self.config_metrics_enabled = self.metrics_enabled_cb.isChecked()
+        self.config_governor_enabled = self.governor_enabled_cb.isChecked()
+        self.config_target_fps = self.target_fps_spinbox.value()
+        self.governor.target_fps = float(self.config_target_fps)
+        self.update_metrics_server()
         
         print("--- CÀI ĐẶT ĐÃ LƯU ---")
-        print(f"Email người nhận: {self.config_recipient_email}")
+        print(f"Email người nhận: {self.alert_engine.config_recipient_email}")
         
         print("--- CÀI ĐẶT ĐÃ LƯU ---")
-        print(f"Âm thanh cảnh báo: {self.config_audio_alert}")
-        print(f"Ngưỡng ngáp: {self.config_yawn_threshold_count} lần")
-        print(f"Ngưỡng nhắm mắt: {self.config_eye_time_sec} giây")
-        print(f"Ngưỡng nghiêng đầu: {self.config_head_angle_deg} độ")
+        print(f"Âm thanh cảnh báo: {self.alert_engine.config_audio_alert}")
+        print(f"Ngưỡng ngáp: {self.alert_engine.config_yawn_threshold_count} lần")
+        print(f"Ngưỡng nhắm mắt: {self.alert_engine.config_eye_time_sec} giây")
+        print(f"Ngưỡng nghiêng đầu: {self.alert_engine.config_head_angle_deg} độ")
         
         # Cập nhật thanh trạng thái (tạm thời)
         original_text = self.status_bar_label.text()
-        self.status_bar_label.setText("Trạng thái: Đã lưu cài đặt!")
+        self.show_status("Trạng thái: Đã lưu cài đặt!")
         
         # Tạo hiệu ứng thông báo ngắn
-        QTimer.singleShot(2000, lambda: self.status_bar_label.setText(original_text))
+        QTimer.singleShot(2000, lambda: self.show_status(original_text))
 
     # --- MỚI ---: Các hàm cho trang Tài khoản
     @Slot()
@@ -893,15 +1163,24 @@ class MainWindow(QMainWindow):
         print("Chức năng 'Chuyển tài khoản' đã được nhấn.")
         # TODO: Thêm logic chuyển tài khoản (ví dụ: hiển thị cửa sổ đăng nhập)
         original_text = self.status_bar_label.text()
-        self.status_bar_label.setText("Trạng thái: Yêu cầu chuyển tài khoản...")
-        QTimer.singleShot(2000, lambda: self.status_bar_label.setText(original_text))
+        self.show_status("Trạng thái: Yêu cầu chuyển tài khoản...")
+        QTimer.singleShot(2000, lambda: self.show_status(original_text))
+
+    @Slot()
+    def do_enroll_face(self):
+        # Lấy mẫu từ các frame nhìn thẳng tiếp theo trong lúc đang giám sát
+        self.identity_verifier.start_enrollment()
+        if self.video_thread is None:
+            self.show_status("Trạng thái: Bấm BẮT ĐẦU và nhìn thẳng vào camera để đăng ký khuôn mặt")
+        else:
+            self.show_status("Trạng thái: Đang đăng ký khuôn mặt, hãy nhìn thẳng vào camera...")
 
     @Slot()
     def do_logout(self):
         print("Chức năng 'Đăng xuất' đã được nhấn.")
         # TODO: Thêm logic đăng xuất (ví dụ: đóng cửa sổ này, mở đăng nhập)
         original_text = self.status_bar_label.text()
-        self.status_bar_label.setText("Trạng thái: Đang đăng xuất...")
+        self.show_status("Trạng thái: Đang đăng xuất...")
         # Ví dụ: Tự động đóng app sau 2s
         QTimer.singleShot(2000, lambda: self.close()) 
 
@@ -916,160 +1195,59 @@ class MainWindow(QMainWindow):
         
         self.apply_styles() # Áp dụng lại toàn bộ stylesheet
 
-# --- HÀM MỚI: Xử lý phát âm thanh cảnh báo ---
-    def trigger_warning_sound(self, sound_file, cooldown=3.0, loop=False):
-        """Phát âm thanh cụ thể"""
-        if self.config_audio_alert == "Tắt âm thanh":
-            return
-        current_time = time.time()
-        # Nếu chưa đủ thời gian chờ từ lần phát trước -> Bỏ qua
-        # Nếu đang báo động nguy hiểm (loop=True) thì bỏ qua cooldown
-        if not loop and (current_time - self.last_sound_time < cooldown):
-            return
-
-        # Cập nhật thời gian phát mới
-        self.last_sound_time = current_time
+# --- "Sink" của AlertEngine: thực sự phát âm thanh / gửi email ---
+    def play_sound(self, sound_file, loop, trace):
+        """Gọi từ AlertEngine sau khi đã qua cooldown"""
         # Gọi hàm bên module sound (đã có threading bên đó rồi)
-        self.sound_module.play_sound(sound_file, loop=loop)
-        
-    # --- MỚI ---: Hàm xử lý dữ liệu từ VideoThread
-    @Slot(dict)
-    def handle_detection_data(self, data):
-        current_time = time.time()
-        status_messages = []
-
-        # === 1. Xử lý: KHÔNG TÌM THẤY KHUÔN MẶT ===
-        if not data["face_found"]:
-            if self.no_face_start_time is None:
-                self.no_face_start_time = current_time
-            else:
-                no_face_duration = current_time - self.no_face_start_time
-                
-                # Cấp độ 2: Mất mặt > 3s -> NGUY HIỂM (Kêu dồn dập mỗi 2s)
-                if no_face_duration > 3:
-                    self.status_bar_label.setText(f"NGUY HIỂM: KHÔNG THẤY TÀI XẾ ({no_face_duration:.1f}s)")
-                    self.trigger_warning_sound("alarm_danger.mp3", cooldown=2.0, loop=True)
-                    # --- [GỬI EMAIL] ---
-                    self.trigger_alert_email(
-                        subject="[CẢNH BÁO KHẨN] Mất tín hiệu tài xế!",
-                        message=f"Hệ thống không thấy tài xế trong {no_face_duration:.1f} giây. Vui lòng kiểm tra ngay."
-                    )
-                    # Reset các timer khác để tránh xung đột
-                    self.eye_closed_start_time = None
-                    self.yawn_start_time = None
-                    return # Thoát luôn để ưu tiên cảnh báo này
-                else:
-                    self.status_bar_label.setText(f"Cảnh báo: Mất tín hiệu khuôn mặt ({no_face_duration:.1f}s)")
-            return
-        else:
-            self.no_face_start_time = None
-
-        # Lấy dữ liệu
-        ear = data["ear"]
-        mar = data["mar"]
-        raw_roll = data["roll"]
-        # Lưu raw_roll để dùng cho nút Cân bằng
-        self.current_raw_roll = raw_roll
-        # Tính roll thực tế sau khi trừ đi góc lệch (offset)
-        roll = raw_roll - self.roll_offset
-
-        # === 2. Xử lý: NHẮM MẮT (EAR) ===
-        if ear < self.INTERNAL_EAR_THRESHOLD:
-            if self.eye_closed_start_time is None:
-                self.eye_closed_start_time = current_time
-            else:
-                eye_duration = current_time - self.eye_closed_start_time
-                
-                if eye_duration > 5: # NGUY HIỂM
-                    msg = f"NGUY HIỂM: NHẮM MẮT ({eye_duration:.1f}s)"
-                    status_messages.append(msg)
-                    # Ưu tiên cao nhất, cooldown ngắn (2s)
-                    self.trigger_warning_sound("alarm_danger.mp3", cooldown=2.0, loop=True)
-                    # --- [GỬI EMAIL] ---
-                    self.trigger_alert_email(
-                        subject="[CẢNH BÁO KHẨN] Tài xế ngủ gật!",
-                        message=f"Tài xế đã nhắm mắt quá {eye_duration:.1f} giây. Nguy cơ tai nạn cao."
-                    )
-                elif eye_duration > self.config_eye_time_sec: # Cảnh báo thường
-                    msg = f"Buồn ngủ ({eye_duration:.1f}s)"
-                    status_messages.append(msg)
-                    # Cảnh báo thường, cooldown dài hơn (3s)
-                    self.trigger_warning_sound("warning_eye.mp3", cooldown=3.0)
-        else:
-            self.eye_closed_start_time = None
-
-        # === 3. Xử lý: NGÁP (MAR) ===
-        if mar > self.INTERNAL_MAR_THRESHOLD:
-            if self.yawn_start_time is None:
-                self.yawn_start_time = current_time
-            else:
-                yawn_duration = current_time - self.yawn_start_time
-                
-                if yawn_duration > 5: # NGUY HIỂM
-                    msg = f"NGUY HIỂM: NGÁP DÀI ({yawn_duration:.1f}s)"
-                    status_messages.append(msg)
-                    self.trigger_warning_sound("alarm_eye.mp3", cooldown=2.0, loop=True)
-                
-                # Logic đếm số lần ngáp (giữ nguyên như cũ)
-                if not self.is_yawning_state:
-                    self.is_yawning_state = True
-                    self.yawn_count += 1
-                    # # Phát tiếng ngáp 1 lần duy nhất khi bắt đầu mở miệng
-                    # self.trigger_warning_sound("warning_eye.mp3", cooldown=3.0)
-        else:
-            self.is_yawning_state = False
-            self.yawn_start_time = None
-
-        if self.yawn_count >= self.config_yawn_threshold_count:
-             status_messages.append(f"Đã ngáp {self.yawn_count} lần")
-
-        # === 4. Xử lý: NGHIÊNG ĐẦU ===
-        if abs(roll) > self.config_head_angle_deg:
-            msg = f"Nghiêng đầu ({roll:.0f} độ)"
-            status_messages.append(msg)
-            self.trigger_warning_sound("warning_eye.mp3", cooldown=3.0)
-
-        # === 5. Hiển thị Status Bar ===
-        if not status_messages:
-            self.status_bar_label.setText("Trạng thái: Đang theo dõi... (An toàn)")
-            self.status_bar_label.setStyleSheet("color: #95a5a6") 
-        else:
-            text = " | ".join(status_messages)
-            self.status_bar_label.setText("⚠️ " + text)
-            if "NGUY HIỂM" in text:
-                self.status_bar_label.setStyleSheet("color: #e74c3c; font-weight: bold;")
-            else:
-                self.status_bar_label.setStyleSheet("color: #f39c12; font-weight: bold;")
-
-    def trigger_alert_email(self, subject, message):
-        """Gửi email cảnh báo đến người thân"""
-        
-        # 1. Kiểm tra xem đã nhập email người nhận chưa
-        if not self.config_recipient_email:
-            print("⚠️ Chưa nhập email người thân trong Cài đặt -> Không gửi mail.")
-            return
-
-        current_time = time.time()
-        
-        # 2. Chặn Spam (60s mới gửi 1 lần)
-        EMAIL_COOLDOWN = 60 
-        if current_time - self.last_email_time < EMAIL_COOLDOWN:
-            return
-
-        self.last_email_time = current_time
-        recipient = self.config_recipient_email # Lấy từ cài đặt
+        self.sound_module.play_sound(
+            sound_file, loop=loop, on_started=self.latency_tracer.sound_callback(trace)
+        )
 
+    def send_email(self, recipient, subject, message, trace):
+        """Gọi từ AlertEngine sau khi đã qua cooldown chống spam"""
         print(f"📧 Đang gửi email tới: {recipient}")
-        
-        # 3. Gửi trong luồng riêng
+
+        # Gửi trong luồng riêng
         def _send():
+            started = time.perf_counter()
             success = send_alert_email(recipient, subject, message)
-            # Log kết quả ra console nếu cần
-                
+            # Ghi độ trễ gửi mail (theo kết quả) cho metrics
+            sent_at = time.perf_counter()
+            metrics.EMAIL_DISPATCH_LATENCY.labels(result="ok" if success else "error").observe(
+                sent_at - started
+            )
+            if success:
+                self.latency_tracer.record("email", trace, sent_at)
+
         threading.Thread(target=_send, daemon=True).start()
+
+    # --- MỚI ---: Hàm xử lý dữ liệu từ VideoThread
+    @Slot(object)
+    def handle_detection_data(self, data):
+        started = time.perf_counter()
+        text, severity = self.alert_engine.evaluate(data)
+        now = self.alert_engine.clock.now()
+        self.telemetry.on_frame(data, now)
+        self.trip_recorder.on_frame(data, self.alert_engine)
+        # Biểu đồ: chỉ ghi vào vòng đệm, vẽ lại theo timer riêng
+        if data["face_found"]:
+            self.chart_history.append(now, data)
+
+        # === Hiển thị Status Bar (chỉ ghi nhận, QTimer áp dụng ~10 lần/giây nếu có thay đổi) ===
+        if text is not None:
+            self.ui_refresh.set("status_text", text)
+            self.ui_refresh.set("status_severity", severity)
+        metrics.STAGE_LATENCY.labels(stage="gui").observe(time.perf_counter() - started)
+
 # --- Chạy ứng dụng ---
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = MainWindow()
+    parser = argparse.ArgumentParser(description="Cửa sổ giám sát tài xế (mở từ log.py sau khi đăng nhập)")
+    parser.add_argument("--user-id", help="uid Firebase của tài khoản đã đăng nhập")
+    args, qt_args = parser.parse_known_args()
+    if not args.user_id:
+        print("Hãy đăng nhập bằng log.py (hoặc chạy: python camera.py --user-id <uid>)")
+        sys.exit(2)
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = MainWindow(args.user_id)
     window.show()
     sys.exit(app.exec())
\ No newline at end of file
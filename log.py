@@ -1,8 +1,15 @@
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+
 import customtkinter as ctk
 from tkinter import messagebox
 from PIL import Image
-import requests
-from io import BytesIO
+
+from modules.credential_cache import CredentialCache
 
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("green")
@@ -12,43 +19,153 @@ app.title("Sign In / Sign Up")
 app.geometry("900x550")
 app.minsize(700, 450)
 
-users = {}
+# Tài khoản lưu cục bộ (mật khẩu đã băm) -> đăng nhập tức thì, không cần mạng
+credential_cache = CredentialCache()
 password_visible = False
 
-# Hàm tải icon 
-def load_icon(url, size=(24, 24)):
-    response = requests.get(url)
-    return ctk.CTkImage(Image.open(BytesIO(response.content)), size=size)
+# Kết quả từ luồng nền (Firebase) -> xử lý trên luồng giao diện
+ui_queue = queue.Queue()
 
-# Icon mắt mở / mắt bị chéo
-eye_open = load_icon("https://cdn-icons-png.flaticon.com/512/159/159604.png")
-eye_closed = load_icon("https://cdn-icons-png.flaticon.com/512/10812/10812267.png")
+# Icon đi kèm ứng dụng (assets/), chỉ đọc file khi cần lần đầu
+ICON_DIR = "assets"
+_icon_cache = {}
+
+def get_icon(name, size=(24, 24)):
+    key = (name, size)
+    if key not in _icon_cache:
+        _icon_cache[key] = ctk.CTkImage(Image.open(os.path.join(ICON_DIR, name)), size=size)
+    return _icon_cache[key]
 
 def toggle_password():
     global password_visible
     password_visible = not password_visible
     entry_password.configure(show="" if password_visible else "*")
-    btn_eye.configure(image=eye_open if password_visible else eye_closed)
+    btn_eye.configure(image=get_icon("eye_open.png" if password_visible else "eye_closed.png"))
+
+def run_in_background(func, on_done):
+    """Chạy func() trên luồng nền, on_done(kết quả) được gọi lại trên luồng giao diện"""
+    def _worker():
+        ui_queue.put((on_done, func()))
+    threading.Thread(target=_worker, daemon=True).start()
+
+def poll_ui_queue():
+    while True:
+        try:
+            callback, result = ui_queue.get_nowait()
+        except queue.Empty:
+            break
+        callback(result)
+    app.after(100, poll_ui_queue)
+
+def login_success(email):
+    if remember_var.get():
+        credential_cache.issue_session(email)
+    else:
+        credential_cache.clear_session()
+    status_label.configure(text=f"Đã đăng nhập: {email}")
+    messagebox.showinfo("Thành công", "Đăng nhập thành công!")
+    # Mở cửa sổ giám sát cho đúng tài khoản vừa đăng nhập (uid Firebase, không phải email)
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    subprocess.Popen([sys.executable, os.path.join(app_dir, "camera.py"), "--user-id", credential_cache.get_uid(email)],
+                     cwd=app_dir)
+    app.destroy()
+
+def _firebase_error_kind(error):
+    """"rejected" nếu Firebase trả về lỗi nghiệp vụ (sai mật khẩu, email đã có...), còn lại là "offline"."""
+    import requests
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return "offline"
+    if isinstance(error, requests.exceptions.HTTPError):
+        # pyrebase: HTTPError(lỗi gốc, nội dung phản hồi) – phản hồi lỗi của Firebase có dạng {"error": {...}}
+        body = error.args[1] if len(error.args) > 1 else getattr(error.response, "text", "")
+        try:
+            if "error" in json.loads(body):
+                return "rejected"
+        except (TypeError, ValueError):
+            pass
+    return "offline"
+
+def _firebase_sign_in(email, password):
+    """(Luồng nền) Đăng nhập Firebase. Trả về "ok", "offline" hoặc "invalid"."""
+    from modules.firebase_config import get_auth
+    auth = get_auth()
+    if auth is None:
+        return "offline"
+    try:
+        user = auth.sign_in_with_email_and_password(email, password)
+    except Exception as e:
+        return "invalid" if _firebase_error_kind(e) == "rejected" else "offline"
+    # Lưu lại (đã băm) + uid để lần sau đăng nhập ngay cả khi mất mạng
+    credential_cache.set_password(email, password, uid=user.get("localId"))
+    # Refresh token -> luồng tải telemetry lấy idToken để ghi vào Realtime Database
+    if user.get("refreshToken"):
+        credential_cache.set_refresh_token(email, user["refreshToken"], uid=user.get("localId"))
+    return "ok"
 
 def handle_login():
-    email = entry_email.get()
+    email = entry_email.get().strip()
     password = entry_password.get()
-    if email in users and users[email] == password:
-        messagebox.showinfo("Thành công", "Đăng nhập thành công!")
-    else:
-        messagebox.showerror("Lỗi", "Sai email hoặc mật khẩu.")
+    # 1. Kiểm tra cục bộ trước (tức thì, không cần mạng); chưa có uid thì vẫn phải hỏi Firebase 1 lần
+    local_ok = credential_cache.verify(email, password)
+    if local_ok and credential_cache.get_uid(email):
+        login_success(email)
+        return
+    known_user = credential_cache.has_user(email)
+
+    # 2. Chưa có trên máy HOẶC sai so với bản lưu (có thể đã đổi mật khẩu ở máy khác)
+    #    -> hỏi Firebase trên luồng nền (giao diện không bị treo); đúng thì bản lưu được cập nhật
+    status_label.configure(text="Đang kiểm tra trực tuyến...")
+
+    def _done(result):
+        status_label.configure(text="")
+        if result == "ok":
+            login_success(email)
+        elif result == "offline" and (local_ok or not known_user):
+            messagebox.showerror("Lỗi", "Không có mạng và tài khoản chưa từng đăng nhập trực tuyến trên máy này.")
+        else:
+            messagebox.showerror("Lỗi", "Sai email hoặc mật khẩu.")
+
+    run_in_background(lambda: _firebase_sign_in(email, password), _done)
+
+def _firebase_sign_up(email, password):
+    """(Luồng nền) Tạo tài khoản Firebase. Trả về "ok", "offline" hoặc "exists" (email đã có / bị từ chối)."""
+    from modules.firebase_config import get_auth
+    auth = get_auth()
+    if auth is None:
+        return "offline"
+    try:
+        auth.create_user_with_email_and_password(email, password)
+        return "ok"
+    except Exception as e:
+        print(f"Không tạo được tài khoản trực tuyến: {e}")
+        return "exists" if _firebase_error_kind(e) == "rejected" else "offline"
 
 def handle_register():
     name = entry_name.get()
-    email = entry_email.get()
+    email = entry_email.get().strip()
     password = entry_password.get()
     if agree_var.get() == 0:
         messagebox.showwarning("Chưa đồng ý", "Bạn phải đồng ý với điều khoản!")
-    elif email in users:
+    elif credential_cache.has_user(email):
         messagebox.showerror("Lỗi", "Email đã tồn tại!")
     else:
-        users[email] = password
-        messagebox.showinfo("Thành công", f"Chào {name}, bạn đã đăng ký thành công!")
+        # Tạo tài khoản trực tuyến trước (luồng nền), chỉ lưu trên máy khi không mâu thuẫn với Firebase
+        status_label.configure(text="Đang tạo tài khoản trực tuyến...")
+
+        def _done(result):
+            status_label.configure(text="")
+            if result == "exists":
+                messagebox.showerror("Lỗi", "Không tạo được tài khoản trực tuyến: email đã được đăng ký "
+                                            "(hoặc mật khẩu không hợp lệ). Hãy đăng nhập bằng tài khoản đó.")
+                return
+            credential_cache.set_password(email, password, name=name)
+            if result == "ok":
+                messagebox.showinfo("Thành công", f"Chào {name}, bạn đã đăng ký thành công!")
+            else:
+                messagebox.showwarning("Chưa đồng bộ", f"Chào {name}, tài khoản đã được tạo trên máy này nhưng "
+                                                       "CHƯA tạo được trực tuyến (không có mạng).")
+
+        run_in_background(lambda: _firebase_sign_up(email, password), _done)
 
 def show_signup():
     btn_signin.configure(fg_color="gray")
@@ -119,7 +236,7 @@ ctk.CTkLabel(form_frame, text="PASSWORD", font=("Arial", 12)).grid(row=4, column
 entry_password = ctk.CTkEntry(form_frame, show="*", width=280)
 entry_password.grid(row=5, column=0, padx=20, pady=(0, 10))
 
-btn_eye = ctk.CTkButton(form_frame,text="",image=eye_closed,width=30,height=30,fg_color="transparent",hover=False,command=toggle_password)
+btn_eye = ctk.CTkButton(form_frame,text="",image=get_icon("eye_closed.png"),width=30,height=30,fg_color="transparent",hover=False,command=toggle_password)
 btn_eye.grid(row=5, column=1, padx=(0, 10), pady=(0, 10))
 
 remember_var = ctk.BooleanVar()
@@ -135,7 +252,19 @@ ctk.CTkLabel(form_frame, text="Hoặc", font=("Arial", 12)).grid(row=8, column=0
 btn_google = ctk.CTkButton(form_frame,text="Đăng nhập bằng Google",fg_color="white",text_color="black",hover_color="#f2ebeb",corner_radius=20,width=280)
 btn_google.grid(row=9, column=0, pady=(0, 20))
 
+status_label = ctk.CTkLabel(form_frame, text="", font=("Arial", 12), text_color="#bdc3c7")
+status_label.grid(row=10, column=0, pady=(0, 10))
+
 # Mặc định là đăng nhập
 show_signin()
 
+# Phiên "Ghi nhớ đăng nhập" còn hạn -> điền sẵn, không cần mạng
+remembered_email = credential_cache.load_session()
+if remembered_email:
+    entry_email.insert(0, remembered_email)
+    remember_var.set(True)
+    status_label.configure(text=f"Đã đăng nhập: {remembered_email}")
+
+poll_ui_queue()
+
 app.mainloop()
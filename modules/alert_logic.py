@@ -0,0 +1,328 @@
+"""
+alert_logic.py – Logic cảnh báo buồn ngủ / mất tập trung (không phụ thuộc Qt)
+Dùng chung cho giao diện (camera.py), chạy nền và phát lại video (modules/replay.py).
+
+Mọi mốc thời gian đều lấy từ `clock` được truyền vào:
+    - SystemClock khi chạy trực tiếp
+    - ManualClock (theo timestamp video) khi phát lại -> chạy nhanh hơn thời gian thực, kết quả như nhau
+Âm thanh/email được gửi qua `sink` (duck-typing):
+    sink.play_sound(sound_file, loop, trace)
+    sink.send_email(recipient, subject, message, trace)
+Khi 1 loại cảnh báo BẮT ĐẦU, các hàm trong `alert_listeners` được gọi:
+    listener(alert_type, now, data)
+Điều kiện cảnh báo (ngưỡng, thời lượng, mức độ, cooldown, âm thanh, email) nằm trong
+config/alert_rules.json, được biên dịch 1 lần và tự nạp lại khi sửa file (xem alert_rules.py).
+Ngưỡng EAR/MAR tự học theo từng tài xế (driver_profile.py) nếu truyền `profile_store` + `driver_id`.
+"""
+
+import time
+
+from modules import metrics
+from modules.alert_rules import DEFAULT_RULES_PATH, RuleEngine, format_message
+from modules.clock import SystemClock
+from modules.driver_profile import BaselineLearner
+from modules.eye_metrics import EyeMetrics
+from modules.fatigue import DEFAULT_WEIGHTS, FatigueTracker
+from modules.head_motion import FRONTAL_ROLL_DEG, HeadMotionDetector, head_angles, wrap_deg
+from modules.latency_trace import AlertTrace
+
+# Mức độ hiển thị trên thanh trạng thái
+SEVERITY_SAFE = "safe"
+SEVERITY_WARNING = "warning"
+SEVERITY_DANGER = "danger"
+
+EMAIL_COOLDOWN = 60  # Chặn Spam (60s mới gửi 1 lần)
+
+
+class AlertEngine:
+    # Ngưỡng mặc định khi chưa có hồ sơ tài xế
+    DEFAULT_EAR_THRESHOLD = 0.25
+    DEFAULT_MAR_THRESHOLD = 0.5
+
+    def __init__(self, clock=None, sink=None, profile_store=None, driver_id=None,
+                 rules_path=DEFAULT_RULES_PATH):
+        self.clock = clock or SystemClock()
+        self.sink = sink
+        self.alert_listeners = []  # VD: ghi telemetry/outbox
+        self.profile_store = profile_store
+        self.driver_id = driver_id
+        self.baseline = None  # BaselineLearner khi đang học ngưỡng, None = đã có ngưỡng
+        self.init_config_vars()
+        # Luật cảnh báo đọc ngưỡng từ các thuộc tính config_* / INTERNAL_* ở trên
+        self.rules = RuleEngine(self, rules_path)
+        self.init_state_vars()
+        self.load_profile()
+
+    # --- Hàm khởi tạo các biến CẤU HÌNH (settings) ---
+    def init_config_vars(self):
+        """Lưu trữ các giá trị ngưỡng từ trang Cài đặt"""
+
+        # Ngưỡng vật lý (nội bộ). Có thể được thay bằng ngưỡng tự học của tài xế
+        self.INTERNAL_EAR_THRESHOLD = self.DEFAULT_EAR_THRESHOLD
+        self.INTERNAL_MAR_THRESHOLD = self.DEFAULT_MAR_THRESHOLD
+        self.INTERNAL_YAWN_RESET_TIME_SEC = 60  # Cửa sổ đếm sự kiện (ngáp, micro-sleep, gật, nghiêng)
+
+        # Ngưỡng do người dùng cài đặt (lấy từ giá trị mặc định của SpinBox)
+        self.config_yawn_threshold_count = 3  # (lần)
+        self.config_eye_time_sec = 2          # (giây)
+        self.config_head_angle_deg = 20       # (độ)
+        self.config_audio_alert = "Tiếng Bíp (Mặc định)"
+        self.config_recipient_email = ""  # Email nhận cảnh báo
+        # Mất tập trung: quay đầu/cúi ngẩng quá giới hạn liên tục quá N giây
+        self.config_off_road_sec = 2.0          # (giây)
+        self.config_yaw_limit_deg = 30          # (độ)
+        self.config_pitch_limit_deg = 20        # (độ)
+        self.NOD_DISPLAY_SEC = 3.0  # Giữ trạng thái "gật gù" (nod_recent) sau mỗi lần gật
+        # Điểm mệt mỏi: trọng số mỗi loại sự kiện + chu kỳ bán rã (giây) + ngưỡng cảnh báo
+        self.config_fatigue_weights = dict(DEFAULT_WEIGHTS)
+        self.config_fatigue_half_life_sec = 300
+        self.config_fatigue_warning = 40
+        self.config_fatigue_danger = 70
+        self.config_adaptive_thresholds = True  # Tự học ngưỡng EAR/MAR đầu ca cho từng tài xế
+        # PERCLOS (% thời gian nhắm mắt trong 60s): > 15% được coi là mệt mỏi
+        self.config_perclos_threshold = 0.15
+        self.PERCLOS_MIN_COVERAGE = 0.5  # Cần ít nhất 30s dữ liệu mới cảnh báo theo PERCLOS
+
+    # --- Hàm khởi tạo các biến TRẠNG THÁI (state) ---
+    def init_state_vars(self):
+        """Reset các biến theo dõi trạng thái (dùng khi bắt đầu/dừng)"""
+        self.rules.reset()  # Bộ đếm thời gian của mọi luật (mất mặt, nhắm mắt, ngáp ...)
+        self.is_yawning_state = False # Trạng thái đang ngáp (để đếm 1 lần)
+        self.is_tilted_state = False
+        # Đếm sự kiện trong INTERNAL_YAWN_RESET_TIME_SEC giây gần nhất + điểm mệt mỏi
+        self.fatigue = FatigueTracker(
+            self.INTERNAL_YAWN_RESET_TIME_SEC, self.config_fatigue_weights, self.config_fatigue_half_life_sec
+        )
+        # -inf: lần cảnh báo đầu tiên không bị cooldown chặn, kể cả khi đồng hồ bắt đầu từ 0 (phát lại)
+        self.last_sound_time = float("-inf")
+        self.last_email_time = float("-inf")
+        self.active_alert_types = set()  # Các loại cảnh báo đang bật (để đếm metrics theo sườn lên)
+        self.frame_alert_types = set()
+        # Gật gù + không nhìn đường (dùng góc đầu có sẵn mỗi frame)
+        self.head_motion = HeadMotionDetector(self.config_yaw_limit_deg, self.config_pitch_limit_deg)
+        # PERCLOS + chớp mắt (cửa sổ trượt 60s, O(1)/frame)
+        self.eye_metrics = EyeMetrics()
+        # Biến lưu góc lệch của đầu (Calibration). Nếu chưa calibrate thì lấy roll thô khi nhìn thẳng camera
+        if not hasattr(self, 'roll_offset'):
+            self.roll_offset = FRONTAL_ROLL_DEG
+
+    def calibrate_head_pose(self):
+        """Lấy góc nghiêng hiện tại làm mốc 0. Trả về offset mới, hoặc None nếu chưa thấy mặt"""
+        if not hasattr(self, 'current_raw_roll'):
+            return None
+        self.roll_offset = self.current_raw_roll
+        self.head_motion.calibrate(*head_angles(self.current_raw_pitch, self.current_raw_roll, self.roll_offset))
+        self._save_profile(roll_offset=self.roll_offset)
+        return self.roll_offset
+
+    # --- Ngưỡng theo tài xế ---
+    def load_profile(self):
+        """Nạp ngưỡng + roll_offset đã lưu. Chưa có ngưỡng -> bắt đầu học (nếu bật)"""
+        profile = {}
+        if self.profile_store is not None and self.driver_id:
+            profile = self.profile_store.get(self.driver_id)
+        if "roll_offset" in profile:
+            self.roll_offset = profile["roll_offset"]
+        if not self.config_adaptive_thresholds:
+            self.INTERNAL_EAR_THRESHOLD = self.DEFAULT_EAR_THRESHOLD
+            self.INTERNAL_MAR_THRESHOLD = self.DEFAULT_MAR_THRESHOLD
+            self.baseline = None
+        elif "ear_threshold" in profile and "mar_threshold" in profile:
+            self.INTERNAL_EAR_THRESHOLD = profile["ear_threshold"]
+            self.INTERNAL_MAR_THRESHOLD = profile["mar_threshold"]
+            self.baseline = None
+        else:
+            self.baseline = BaselineLearner()
+        return profile
+
+    def relearn_thresholds(self):
+        """Bỏ ngưỡng cũ, học lại từ đầu (VD: đổi tài xế, đổi vị trí camera)"""
+        self.INTERNAL_EAR_THRESHOLD = self.DEFAULT_EAR_THRESHOLD
+        self.INTERNAL_MAR_THRESHOLD = self.DEFAULT_MAR_THRESHOLD
+        self.baseline = BaselineLearner() if self.config_adaptive_thresholds else None
+
+    def _learn_baseline(self, current_time, ear, mar):
+        if not self.baseline.add(current_time, ear, mar):
+            return
+        ear_threshold, mar_threshold = self.baseline.thresholds()
+        self.INTERNAL_EAR_THRESHOLD = ear_threshold
+        self.INTERNAL_MAR_THRESHOLD = mar_threshold
+        self._save_profile(
+            ear_threshold=round(ear_threshold, 4),
+            mar_threshold=round(mar_threshold, 4),
+            ear_baseline=round(self.baseline.ear_p50.value(), 4),
+            mar_baseline=round(self.baseline.mar_p90.value(), 4),
+            baseline_samples=self.baseline.samples,
+        )
+        print(f"🎯 Đã học ngưỡng cá nhân: EAR < {ear_threshold:.3f}, MAR > {mar_threshold:.3f}")
+        self.baseline = None
+
+    def _save_profile(self, **fields):
+        if self.profile_store is not None and self.driver_id:
+            self.profile_store.update(self.driver_id, **fields)
+
+    # --- Phát âm thanh cảnh báo ---
+    def trigger_warning_sound(self, sound_file, cooldown=3.0, loop=False, trace=None):
+        """Phát âm thanh cụ thể. trace (AlertTrace): frame gây ra cảnh báo, để đo độ trễ"""
+        if self.config_audio_alert == "Tắt âm thanh":
+            return
+        current_time = self.clock.now()
+        # Nếu chưa đủ thời gian chờ từ lần phát trước -> Bỏ qua
+        # Nếu đang báo động nguy hiểm (loop=True) thì bỏ qua cooldown
+        if not loop and (current_time - self.last_sound_time < cooldown):
+            return
+
+        # Cập nhật thời gian phát mới
+        self.last_sound_time = current_time
+        if self.sink is not None:
+            self.sink.play_sound(sound_file, loop, trace)
+
+    def trigger_alert_email(self, subject, message, trace=None):
+        """Gửi email cảnh báo đến người thân. trace (AlertTrace): frame gây ra cảnh báo"""
+
+        # 1. Kiểm tra xem đã nhập email người nhận chưa
+        if not self.config_recipient_email:
+            print("⚠️ Chưa nhập email người thân trong Cài đặt -> Không gửi mail.")
+            return
+
+        current_time = self.clock.now()
+
+        # 2. Chặn Spam
+        if current_time - self.last_email_time < EMAIL_COOLDOWN:
+            return
+
+        self.last_email_time = current_time
+        if self.sink is not None:
+            self.sink.send_email(self.config_recipient_email, subject, message, trace)
+
+    # --- Xử lý 1 frame ---
+    def evaluate(self, data):
+        """
+        Cập nhật trạng thái theo dữ liệu nhận diện của 1 frame.
+        Trả về (status_text, severity) để hiển thị; (None, None) = giữ nguyên hiển thị cũ.
+        """
+        self.frame_alert_types = set()
+        try:
+            return self._evaluate(data)
+        finally:
+            started = self.frame_alert_types - self.active_alert_types
+            for alert_type in started:
+                metrics.ALERTS.labels(type=alert_type).inc()
+            if started and self.alert_listeners:
+                now = self.clock.now()
+                for alert_type in sorted(started):
+                    for listener in self.alert_listeners:
+                        listener(alert_type, now, data)
+            self.active_alert_types = self.frame_alert_types
+
+    def _evaluate(self, data):
+        current_time = self.clock.now()
+        # Thời điểm chụp frame này (nếu không có thì lấy thời điểm hiện tại)
+        frame_ts = data.get("timestamp")
+        if frame_ts is None:
+            frame_ts = time.perf_counter()
+        self.rules.maybe_reload()
+
+        # === 1. Tính các chỉ số dẫn xuất (luật cảnh báo đọc thẳng từ `data`) ===
+        if data["face_found"]:
+            self._update_face_metrics(data, current_time)
+        else:
+            self.eye_metrics.face_lost()
+            self.head_motion.face_lost()
+            if self.baseline is not None:
+                self.baseline.face_lost()
+            self.is_yawning_state = False
+            self.is_tilted_state = False
+        # Số sự kiện trong cửa sổ + điểm mệt mỏi (giảm dần theo thời gian, kể cả khi không thấy mặt)
+        data.update(self.fatigue.update(current_time))
+        metrics.FATIGUE_SCORE.set(data["fatigue_score"])
+
+        # === 2. 1 vòng qua mọi luật (config/alert_rules.json) ===
+        active = self.rules.step(data, current_time, frame_ts)
+        if not active:
+            if not data["face_found"]:
+                return None, None  # Vừa mất mặt (chưa đủ lâu) -> giữ nguyên hiển thị cũ
+            return "Trạng thái: Đang theo dõi... (An toàn)", SEVERITY_SAFE
+
+        # === 3. Thực hiện hành động của các luật đang bật (theo thứ tự ưu tiên) ===
+        messages = []
+        severity = SEVERITY_WARNING
+        for rule, duration, onset_ts, started in active:
+            self.frame_alert_types.add(rule.id)
+            messages.append(format_message(rule.message, data, duration))
+            if rule.severity == SEVERITY_DANGER:
+                severity = SEVERITY_DANGER
+            trace = AlertTrace(rule.id, onset_ts, frame_ts)
+            sound = rule.sound
+            if sound and (started or sound.get("repeat", True)):
+                self.trigger_warning_sound(
+                    sound["file"], cooldown=sound.get("cooldown", 3.0),
+                    loop=sound.get("loop", False), trace=trace
+                )
+            if rule.email:
+                self.trigger_alert_email(
+                    subject=format_message(rule.email["subject"], data, duration),
+                    message=format_message(rule.email["message"], data, duration),
+                    trace=trace
+                )
+
+        # === 4. Kết quả cho Status Bar ===
+        if active[0].rule.exclusive:
+            return messages[0], severity
+        return "⚠️ " + " | ".join(messages), severity
+
+    def _update_face_metrics(self, data, current_time):
+        ear = data["ear"]
+        mar = data["mar"]
+        raw_roll = data["roll"]
+        # Lưu góc thô để dùng cho nút Cân bằng
+        self.current_raw_roll = raw_roll
+        self.current_raw_pitch = data.get("pitch", 0.0)
+        # Roll thực tế sau khi trừ đi góc lệch (offset); roll thô nhảy -180 <-> 180 quanh tư thế nhìn thẳng
+        data["roll_adjusted"] = wrap_deg(raw_roll - self.roll_offset)
+
+        # Đầu ca: học ngưỡng EAR/MAR riêng (vẫn cảnh báo bằng ngưỡng mặc định trong lúc học)
+        if self.baseline is not None:
+            self._learn_baseline(current_time, ear, mar)
+
+        # PERCLOS + chớp mắt
+        eye_stats = self.eye_metrics.update(current_time, ear, self.INTERNAL_EAR_THRESHOLD)
+        data.update(eye_stats)
+        metrics.PERCLOS.set(eye_stats["perclos"])
+        metrics.BLINK_RATE.set(eye_stats["blink_rate"])
+
+        fatigue = self.fatigue
+        fatigue.weights = self.config_fatigue_weights
+        fatigue.half_life_sec = self.config_fatigue_half_life_sec
+        if self.eye_metrics.microsleep_detected:
+            fatigue.add_event("microsleep", current_time)
+
+        # Ngáp: mỗi lần mở miệng quá ngưỡng = 1 sự kiện
+        if mar > self.INTERNAL_MAR_THRESHOLD:
+            if not self.is_yawning_state:
+                self.is_yawning_state = True
+                fatigue.add_event("yawn", current_time)
+        else:
+            self.is_yawning_state = False
+
+        # Nghiêng đầu: mỗi lần vượt ngưỡng = 1 sự kiện
+        if abs(data["roll_adjusted"]) > self.config_head_angle_deg:
+            if not self.is_tilted_state:
+                self.is_tilted_state = True
+                fatigue.add_event("tilt", current_time)
+        else:
+            self.is_tilted_state = False
+
+        # Gật gù + không nhìn đường
+        self.head_motion.yaw_limit_deg = self.config_yaw_limit_deg
+        self.head_motion.pitch_limit_deg = self.config_pitch_limit_deg
+        head_pitch, head_yaw = head_angles(self.current_raw_pitch, raw_roll, self.roll_offset)
+        data["head_pitch"] = head_pitch
+        data["head_yaw"] = head_yaw
+        nod, off_road_sec = self.head_motion.update(current_time, head_pitch, head_yaw)
+        if nod:
+            fatigue.add_event("nod", current_time)
+        last_nod = self.head_motion.last_nod_time
+        data["nod_recent"] = last_nod is not None and current_time - last_nod <= self.NOD_DISPLAY_SEC
+        data["off_road"] = off_road_sec > 0
+        data["off_road_sec"] = off_road_sec
@@ -0,0 +1,207 @@
+"""
+alert_rules.py – Luật cảnh báo khai báo trong file cấu hình (config/alert_rules.json)
+
+Mỗi luật:
+    {
+      "id": "drowsy",                       # Loại cảnh báo (metrics, telemetry, độ trễ)
+      "when": [["ear", "<", {"config": "INTERNAL_EAR_THRESHOLD"}]],   # Các điều kiện (AND)
+      "requires_face": true,                # Mặc định true: chỉ xét khi thấy mặt
+      "for_sec": {"config": "config_eye_time_sec"},   # Điều kiện phải đúng liên tục > N giây
+      "severity": "warning",                # "warning" / "danger"
+      "message": "Buồn ngủ ({duration:.1f}s)",        # Định dạng theo dữ liệu frame + duration
+      "sound": {"file": "warning_eye.mp3", "cooldown": 3.0, "loop": false, "repeat": true},
+      "email": {"subject": "...", "message": "..."},
+      "exclusive": false,                   # true: khi bật thì CHE mọi luật khác trong frame
+      "suppresses": ["..."]                 # Che các luật có id trong danh sách khi bật
+    }
+Giá trị {"config": "<tên thuộc tính>"} được đọc từ AlertEngine mỗi frame (ngưỡng từ Cài đặt/tự học).
+
+File được biên dịch 1 lần thành danh sách luật phẳng (hàm so sánh + hàm lấy giá trị dựng sẵn);
+mỗi frame chỉ 1 vòng qua các luật để cập nhật mọi bộ đếm thời gian.
+Sửa file khi đang chạy -> tự nạp lại (giữ bộ đếm của các luật cùng id), lỗi cú pháp -> giữ luật cũ.
+Dùng chung cho giao diện và phát lại video (replay.py).
+"""
+
+import json
+import operator
+import os
+import time
+from collections import namedtuple
+
+DEFAULT_RULES_PATH = os.path.join("config", "alert_rules.json")
+
+SEVERITY_RANK = {"safe": 0, "warning": 1, "danger": 2}
+
+_OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "in": lambda a, b: a in b,
+    "not_in": lambda a, b: a not in b,
+    "abs>": lambda a, b: abs(a) > b,
+    "abs<": lambda a, b: abs(a) < b,
+}
+# Thiếu chỉ số trong frame -> điều kiện sai, trừ các phép "khác"
+_TRUE_WHEN_MISSING = {"!=", "not_in"}
+
+CompiledRule = namedtuple(
+    "CompiledRule",
+    "id conditions requires_face for_sec severity message sound email exclusive suppresses"
+)
+# Luật đang bật trong frame hiện tại
+ActiveRule = namedtuple("ActiveRule", "rule duration onset_ts started")
+
+
+class RuleError(ValueError):
+    pass
+
+
+def _value_getter(value, context):
+    """Hằng số -> trả về luôn; {"config": name} -> đọc thuộc tính của context mỗi lần gọi"""
+    if isinstance(value, dict) and "config" in value:
+        name = value["config"]
+        if not hasattr(context, name):
+            raise RuleError(f"Không có cấu hình '{name}'")
+        return lambda: getattr(context, name)
+    return lambda: value
+
+
+def compile_rules(specs, context):
+    """specs: list dict (nội dung file JSON) -> tuple CompiledRule"""
+    compiled = []
+    seen = set()
+    for spec in specs:
+        rule_id = spec.get("id")
+        if not rule_id or rule_id in seen:
+            raise RuleError(f"Luật thiếu id hoặc trùng id: {rule_id!r}")
+        seen.add(rule_id)
+        conditions = []
+        for metric, op, value in spec.get("when", []):
+            if op not in _OPERATORS:
+                raise RuleError(f"[{rule_id}] Toán tử không hỗ trợ: {op}")
+            conditions.append((metric, op, _OPERATORS[op], _value_getter(value, context)))
+        severity = spec.get("severity", "warning")
+        if severity not in SEVERITY_RANK:
+            raise RuleError(f"[{rule_id}] Mức độ không hợp lệ: {severity}")
+        compiled.append(CompiledRule(
+            id=rule_id,
+            conditions=tuple(conditions),
+            requires_face=spec.get("requires_face", True),
+            for_sec=_value_getter(spec.get("for_sec", 0), context),
+            severity=severity,
+            message=spec.get("message", rule_id),
+            sound=spec.get("sound"),
+            email=spec.get("email"),
+            exclusive=spec.get("exclusive", False),
+            suppresses=frozenset(spec.get("suppresses", ())),
+        ))
+    return tuple(compiled)
+
+
+def format_message(template, data, duration):
+    try:
+        return template.format(duration=duration, **data)
+    except (KeyError, ValueError, TypeError, IndexError):
+        return template
+
+
+class RuleEngine:
+    """Luật đã biên dịch + bộ đếm thời gian của từng luật"""
+
+    RELOAD_CHECK_SEC = 1.0  # Kiểm tra file thay đổi tối đa 1 lần/giây (giờ thật)
+
+    def __init__(self, context, path=DEFAULT_RULES_PATH):
+        self.context = context
+        self.path = path
+        self.rules = ()
+        self._since = {}   # id -> (thời điểm bắt đầu đúng, frame_ts lúc đó)
+        self._active = set()
+        self._mtime = None
+        self._next_check = 0.0
+        self.load()
+
+    def load(self):
+        with open(self.path, encoding="utf-8") as f:
+            specs = json.load(f)
+        self.rules = compile_rules(specs.get("rules", specs) if isinstance(specs, dict) else specs, self.context)
+        self._mtime = os.stat(self.path).st_mtime
+        ids = {rule.id for rule in self.rules}
+        self._since = {k: v for k, v in self._since.items() if k in ids}
+        self._active &= ids
+
+    def maybe_reload(self):
+        """Nạp lại nếu file đã đổi. Trả về True nếu vừa nạp lại."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.RELOAD_CHECK_SEC
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        try:
+            self.load()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self._mtime = mtime  # Không thử lại liên tục với file lỗi
+            print(f"⚠️ Lỗi file luật cảnh báo, giữ luật cũ: {e}")
+            return False
+        print(f"🔁 Đã nạp lại {len(self.rules)} luật cảnh báo từ {self.path}")
+        return True
+
+    def reset(self):
+        self._since.clear()
+        self._active.clear()
+
+    def step(self, data, now, frame_ts):
+        """
+        1 vòng qua mọi luật: cập nhật bộ đếm, trả về list ActiveRule đang bật
+        (đã áp dụng exclusive/suppresses, giữ thứ tự trong file = thứ tự ưu tiên).
+        """
+        face_found = data.get("face_found", False)
+        since = self._since
+        active = []
+        for rule in self.rules:
+            ok = face_found or not rule.requires_face
+            if ok:
+                for metric, op_name, op, get_value in rule.conditions:
+                    value = data.get(metric)
+                    if value is None:
+                        ok = op_name in _TRUE_WHEN_MISSING
+                    else:
+                        ok = op(value, get_value())
+                    if not ok:
+                        break
+            if not ok:
+                since.pop(rule.id, None)
+                continue
+            start = since.get(rule.id)
+            if start is None:
+                start = since[rule.id] = (now, frame_ts)
+            duration = now - start[0]
+            for_sec = rule.for_sec()
+            if duration > for_sec or (for_sec <= 0 and duration >= 0):
+                active.append((rule, duration, start[1]))
+
+        # Exclusive: luật exclusive đầu tiên thắng; suppresses: che theo id
+        for rule, duration, onset_ts in active:
+            if rule.exclusive:
+                active = [(rule, duration, onset_ts)]
+                break
+        suppressed = set()
+        for rule, _, _ in active:
+            suppressed |= rule.suppresses
+        result = []
+        previous = self._active
+        current = set()
+        for rule, duration, onset_ts in active:
+            if rule.id in suppressed:
+                continue
+            current.add(rule.id)
+            result.append(ActiveRule(rule, duration, onset_ts, rule.id not in previous))
+        self._active = current
+        return result
@@ -0,0 +1,213 @@
+"""
+backend_benchmark.py – Đo nhanh các backend suy luận trên máy hiện tại và chọn backend phù hợp
+
+Mỗi backend dùng được chạy qua đúng FaceProcessor.process_frame trên cùng 1 tập frame mẫu:
+- Tốc độ: trung vị ms/frame (sau vài frame làm nóng)
+- Độ chính xác: so với backend chuẩn (MediaPipe) – tỉ lệ khớp "thấy mặt" + sai số tuyệt đối trung bình
+  của EAR / MAR / góc đầu. Backend vượt ngưỡng sai số bị loại dù nhanh hơn.
+Chọn backend NHANH NHẤT trong số đạt độ chính xác, lưu theo loại máy (CPU) vào config/inference_backend.json
+-> đội xe nhiều loại CPU: mỗi loại tự chọn 1 lần, xe cùng loại dùng chung kết quả.
+
+Lúc khởi động, ProcessorLoader gọi ensure_device_choice(): máy chưa có lựa chọn + có clip mẫu
+(data/benchmark_clip.mp4) thì đo ngay trên luồng nền; không có clip thì dùng mặc định.
+    python -m modules.backend_benchmark --video clip.mp4
+    python -m modules.backend_benchmark --video clip.mp4 --save
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from modules.inference_backends import (
+    BACKENDS, DEFAULT_BACKEND, BackendChoiceStore, create_backend, device_key,
+)
+
+DEFAULT_BENCHMARK_CLIP = os.path.join("data", "benchmark_clip.mp4")
+
+# Sai số tối đa so với backend chuẩn
+DEFAULT_TOLERANCES = {
+    "detection_agreement": 0.9,  # Tỉ lệ frame cùng kết luận thấy/không thấy mặt (tối thiểu)
+    "ear": 0.03,
+    "mar": 0.08,
+    "roll": 5.0,                 # độ
+    "pitch": 8.0,
+    "yaw": 8.0,
+}
+_COMPARED_FIELDS = ("ear", "mar", "roll", "pitch", "yaw")
+
+
+def load_frames(path, count=60):
+    """Lấy `count` frame rải đều trong video"""
+    import cv2
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Không mở được video: {path}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    step = max(total // count, 1) if total else 1
+    frames = []
+    index = 0
+    try:
+        while len(frames) < count:
+            if index % step:
+                if not cap.grab():
+                    break
+            else:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frames.append(frame)
+            index += 1
+    finally:
+        cap.release()
+    return frames
+
+
+def measure(processor, frames, warmup=3):
+    """Chạy frames qua processor -> (list DetectionRecord, list giây/frame)"""
+    for frame in frames[:warmup]:
+        processor.process_frame(frame, annotate=False)
+    records, seconds = [], []
+    for frame in frames:
+        started = time.perf_counter()
+        _, data = processor.process_frame(frame, annotate=False)
+        seconds.append(time.perf_counter() - started)
+        records.append(data)
+    return records, seconds
+
+
+def compare(records, reference):
+    """Độ khớp với kết quả của backend chuẩn (cùng thứ tự frame)"""
+    agree = sum(1 for a, b in zip(records, reference) if a["face_found"] == b["face_found"])
+    both = [(a, b) for a, b in zip(records, reference) if a["face_found"] and b["face_found"]]
+    result = {"detection_agreement": agree / max(len(reference), 1)}
+    for name in _COMPARED_FIELDS:
+        result[name] = statistics.fmean(abs(a[name] - b[name]) for a, b in both) if both else None
+    return result
+
+
+def meets(accuracy, tolerances=DEFAULT_TOLERANCES):
+    if accuracy["detection_agreement"] < tolerances["detection_agreement"]:
+        return False
+    return all(accuracy[name] is None or accuracy[name] <= tolerances[name] for name in _COMPARED_FIELDS)
+
+
+def run_benchmark(frames, names=None, reference=DEFAULT_BACKEND, tolerances=DEFAULT_TOLERANCES):
+    """
+    Đo mọi backend (hoặc `names`). Trả về list dict:
+        name, available, reason, ms (trung vị), fps, accuracy, eligible
+    """
+    from modules.face_processor import FaceProcessor
+
+    names = list(names or BACKENDS)
+    if reference in names:
+        names.remove(reference)
+        names.insert(0, reference)  # Đo backend chuẩn trước để có kết quả so sánh
+    reference_records = None
+    results = []
+    for name in names:
+        entry = {"name": name, "available": False, "reason": "", "ms": None, "fps": None,
+                 "accuracy": None, "eligible": False}
+        results.append(entry)
+        ok, reason = BACKENDS[name].available()
+        if not ok:
+            entry["reason"] = reason
+            continue
+        processor = None
+        try:
+            processor = FaceProcessor(backend=create_backend(name))
+            records, seconds = measure(processor, frames)
+        except Exception as e:  # Mô hình hỏng / không tương thích -> bỏ qua backend này
+            entry["reason"] = f"lỗi khi chạy: {e}"
+            continue
+        finally:
+            if processor is not None:
+                processor.close()
+        ms = statistics.median(seconds) * 1000.0
+        entry.update(available=True, ms=round(ms, 2), fps=round(1000.0 / ms, 1) if ms else None)
+        if name == reference:
+            reference_records = records
+            entry["eligible"] = True
+        elif reference_records is None:
+            # Không có backend chuẩn để so -> không kiểm chứng được độ chính xác
+            entry["reason"] = "chưa kiểm tra độ chính xác (thiếu backend chuẩn)"
+            entry["eligible"] = True
+        else:
+            entry["accuracy"] = compare(records, reference_records)
+            entry["eligible"] = meets(entry["accuracy"], tolerances)
+            if not entry["eligible"]:
+                entry["reason"] = "sai số vượt ngưỡng"
+    return results
+
+
+def select_backend(results):
+    """Backend nhanh nhất trong số đạt độ chính xác (không có -> mặc định)"""
+    eligible = [r for r in results if r["eligible"] and r["ms"] is not None]
+    if not eligible:
+        return DEFAULT_BACKEND
+    return min(eligible, key=lambda r: r["ms"])["name"]
+
+
+def ensure_device_choice(clip=DEFAULT_BENCHMARK_CLIP, store=None, force=False):
+    """Tên backend cho máy này; chưa chọn và có clip mẫu -> đo + lưu (chạy 1 lần cho mỗi loại máy)"""
+    store = store or BackendChoiceStore()
+    key = device_key()
+    entry = store.get(key)
+    if entry.get("backend") and not force:
+        return entry["backend"]
+    if not os.path.exists(clip):
+        return store.default
+    try:
+        frames = load_frames(clip)
+    except (IOError, ImportError) as e:
+        print(f"⚠️ Không đọc được clip đo backend: {e}")
+        return store.default
+    results = run_benchmark(frames)
+    name = select_backend(results)
+    store.update(key, backend=name, frames=len(frames), results=results)
+    timings = ", ".join(f"{r['name']} {r['ms']} ms" for r in results if r["ms"] is not None)
+    print(f"⚙️ [BACKEND] Máy '{key}': chọn '{name}' ({timings})")
+    return name
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo và chọn backend suy luận cho máy hiện tại")
+    parser.add_argument("--video", default=DEFAULT_BENCHMARK_CLIP, help="Clip mẫu có mặt tài xế")
+    parser.add_argument("--frames", type=int, default=60, help="Số frame đo")
+    parser.add_argument("--backends", default="", help="Chỉ đo các backend này (phân cách bởi dấu phẩy)")
+    parser.add_argument("--save", action="store_true", help="Lưu lựa chọn cho loại máy này")
+    args = parser.parse_args(argv)
+
+    frames = load_frames(args.video, args.frames)
+    if not frames:
+        print(f"Không có frame nào trong {args.video}")
+        return 1
+    names = [n.strip() for n in args.backends.split(",") if n.strip()] or None
+    results = run_benchmark(frames, names)
+
+    print(f"Máy: {device_key()} – {len(frames)} frame")
+    print(f"{'backend':12} {'ms/frame':>9} {'FPS':>7} {'khớp mặt':>9} {'ΔEAR':>7} {'ΔMAR':>7} {'Δroll':>7}  ")
+    for r in results:
+        if not r["available"]:
+            print(f"{r['name']:12} {'—':>9}  không dùng được: {r['reason']}")
+            continue
+        acc = r["accuracy"] or {}
+
+        def fmt(name, spec=".3f"):
+            value = acc.get(name)
+            return "—" if value is None else format(value, spec)
+        mark = "✅" if r["eligible"] else "❌"
+        print(f"{r['name']:12} {r['ms']:9.2f} {r['fps']:7.1f} {fmt('detection_agreement', '.0%'):>9} "
+              f"{fmt('ear'):>7} {fmt('mar'):>7} {fmt('roll', '.1f'):>7}  {mark} {r['reason']}")
+
+    name = select_backend(results)
+    print(f"\n=> Chọn: {name}")
+    if args.save:
+        BackendChoiceStore().update(device_key(), backend=name, frames=len(frames), results=results)
+        print("Đã lưu vào config/inference_backend.json")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
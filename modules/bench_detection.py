@@ -0,0 +1,149 @@
+"""
+bench_detection.py – So sánh dict vs DetectionRecord cho dữ liệu nhận diện mỗi frame
+
+Đo trên đúng đường đi của 1 frame: tạo bản ghi -> FaceProcessor điền chỉ số -> AlertEngine thêm
+chỉ số dẫn xuất -> telemetry ghi JSON. Kèm chi phí phát Signal(dict) vs Signal(object) nếu có PySide6.
+    python -m modules.bench_detection
+    python -m modules.bench_detection --frames 200000
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+from modules.detection import DetectionRecord
+
+_GAZE = {"gaze_yaw": 4.2, "gaze_pitch": -3.1, "gaze_vector": (0.07, -0.05, 0.99), "gaze_zone": "road"}
+_ENGINE = {
+    "perclos": 0.04, "blink_rate": 17.0, "blink_duration_ms": 160.0, "microsleeps": 0,
+    "perclos_coverage": 1.0, "yawn_count": 0, "microsleep_count": 0, "nod_count": 0,
+    "tilt_count": 0, "fatigue_score": 12.5, "head_pitch": -1.5, "head_yaw": 4.0,
+}
+
+
+def make_dict(seq):
+    data = {
+        "face_found": False, "ear": 0.0, "mar": 0.0, "roll": 0.0, "pitch": 0.0, "yaw": 0.0,
+        "gaze_yaw": None, "gaze_pitch": None, "gaze_vector": None, "gaze_zone": None,
+        "timestamp": 1234.5, "camera_state": "ok",
+    }
+    data["face_found"] = True
+    data["ear"] = 0.28
+    data["mar"] = 0.31
+    data["roll"] = 2.0
+    data["pitch"] = -4.0
+    data["yaw"] = 6.0
+    data.update(_GAZE)
+    data["frame_seq"] = seq
+    data["roll_adjusted"] = 1.5
+    data.update(_ENGINE)
+    data["nod_recent"] = False
+    data["off_road"] = False
+    data["off_road_sec"] = 0.0
+    return data
+
+
+def make_record(seq):
+    # FaceProcessor ghi thẳng thuộc tính; AlertEngine vẫn dùng giao diện kiểu dict
+    record = DetectionRecord(timestamp=1234.5, camera_state="ok")
+    record.face_found = True
+    record.ear = 0.28
+    record.mar = 0.31
+    record.roll = 2.0
+    record.pitch = -4.0
+    record.yaw = 6.0
+    record.update(_GAZE)
+    record.frame_seq = seq
+    record["roll_adjusted"] = 1.5
+    record.update(_ENGINE)
+    record["nod_recent"] = False
+    record["off_road"] = False
+    record["off_road_sec"] = 0.0
+    return record
+
+
+def _time_per_frame(func, frames):
+    start = time.perf_counter()
+    for seq in range(frames):
+        func(seq)
+    return (time.perf_counter() - start) / frames * 1e6
+
+
+def _bytes_per_frame(make, keep=1000):
+    """Bộ nhớ trung bình của 1 bản ghi còn sống (giữ `keep` bản ghi để đo)"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    alive = [make(seq) for seq in range(keep)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del alive
+    return size / keep
+
+
+def _signal_cost(frames):
+    """µs/lần phát Signal(dict) và Signal(object) qua hàng đợi Qt (QueuedConnection), None nếu thiếu Qt"""
+    try:
+        from PySide6.QtCore import QCoreApplication, QObject, Qt, Signal
+    except ImportError:
+        return None
+
+    class Emitter(QObject):
+        as_dict = Signal(dict)
+        as_object = Signal(object)
+
+    class Receiver(QObject):
+        count = 0
+
+        def on_data(self, data):
+            self.count += 1
+
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+    emitter, receiver = Emitter(), Receiver()
+    emitter.as_dict.connect(receiver.on_data, Qt.QueuedConnection)
+    emitter.as_object.connect(receiver.on_data, Qt.QueuedConnection)
+    results = {}
+    for name, signal, make in (("Signal(dict)", emitter.as_dict, make_dict),
+                               ("Signal(object)", emitter.as_object, make_record)):
+        payload = make(0)
+        receiver.count = 0
+        start = time.perf_counter()
+        for _ in range(frames):
+            signal.emit(payload)
+        while receiver.count < frames:
+            app.processEvents()
+        results[name] = (time.perf_counter() - start) / frames * 1e6
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="So sánh dict vs DetectionRecord (thời gian, bộ nhớ, Qt signal)")
+    parser.add_argument("--frames", type=int, default=100000, help="Số frame giả lập")
+    args = parser.parse_args(argv)
+
+    rows = [
+        ("dict", make_dict, lambda seq: json.dumps(make_dict(seq), ensure_ascii=False)),
+        ("DetectionRecord", make_record, lambda seq: make_record(seq).to_json()),
+    ]
+    print(f"{'':16} {'µs/frame':>10} {'+JSON µs':>10} {'byte/bản ghi':>13}")
+    for name, make, make_json in rows:
+        per_frame = _time_per_frame(make, args.frames)
+        with_json = _time_per_frame(make_json, args.frames // 4 or 1)
+        print(f"{name:16} {per_frame:10.2f} {with_json:10.2f} {_bytes_per_frame(make):13.0f}")
+
+    record = make_record(0)
+    print(f"\nBản ghi nhị phân: {len(record.to_bytes())} byte/frame, JSON: {len(record.to_json().encode())} byte/frame")
+
+    signal_cost = _signal_cost(min(args.frames, 20000))
+    if signal_cost is None:
+        print("(Bỏ qua đo Qt signal: chưa cài PySide6)")
+    else:
+        for name, us in signal_cost.items():
+            print(f"{name:16} {us:10.2f} µs/lần phát")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
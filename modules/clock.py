@@ -0,0 +1,33 @@
+"""
+clock.py – Đồng hồ có thể thay thế (inject) cho logic cảnh báo
+- SystemClock: thời gian thực (chạy trực tiếp với camera)
+- ManualClock: thời gian do bên ngoài đặt (phát lại video theo CAP_PROP_POS_MSEC, kiểm thử)
+Logic cảnh báo chỉ gọi clock.now(), nên có thể chạy nhanh hơn thời gian thực mà quyết định không đổi.
+"""
+
+import time
+
+
+class SystemClock:
+    """Đồng hồ hệ thống (giây, dạng time.time())"""
+
+    def now(self):
+        return time.time()
+
+
+class ManualClock:
+    """Đồng hồ được đặt thủ công. Không bao giờ chạy lùi (timestamp video đôi khi bị nhiễu)."""
+
+    def __init__(self, start=0.0):
+        self._now = float(start)
+
+    def now(self):
+        return self._now
+
+    def set(self, timestamp):
+        if timestamp > self._now:
+            self._now = float(timestamp)
+
+    def advance(self, seconds):
+        if seconds > 0:
+            self._now += seconds
@@ -0,0 +1,159 @@
+"""
+credential_cache.py – Bộ nhớ đệm đăng nhập cục bộ (offline-first)
+- Mật khẩu KHÔNG lưu dạng rõ: chỉ lưu salt + PBKDF2-SHA256
+- Phiên "Ghi nhớ đăng nhập": token ngẫu nhiên lưu ở file riêng (quyền 600),
+  file thông tin chỉ giữ SHA-256 của token + hạn dùng
+- Refresh token Firebase (lần đăng nhập trực tuyến gần nhất): file riêng quyền 600,
+  dùng để lấy idToken cho việc tải telemetry lên (firebase_config.IdTokenProvider)
+- uid Firebase của từng tài khoản (lần đăng nhập trực tuyến gần nhất) -> cửa sổ giám sát dùng làm mã tài xế
+=> Đăng nhập tức thì và vẫn dùng được khi không có mạng.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join("data", "credentials.json")
+DEFAULT_TOKEN_PATH = os.path.join("data", "session_token")
+DEFAULT_REFRESH_TOKEN_PATH = os.path.join("data", "firebase_refresh_token")
+
+PBKDF2_ITERATIONS = 120_000
+SESSION_TTL_SEC = 30 * 24 * 3600  # 30 ngày
+
+
+def _hash_password(password, salt, iterations=PBKDF2_ITERATIONS):
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations).hex()
+
+
+def _hash_token(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _normalize_email(email):
+    return email.strip().lower()
+
+
+class CredentialCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, token_path=DEFAULT_TOKEN_PATH,
+                 refresh_token_path=DEFAULT_REFRESH_TOKEN_PATH):
+        self.path = path
+        self.token_path = token_path
+        self.refresh_token_path = refresh_token_path
+        self._lock = threading.Lock()
+        self._data = self._load()
+
+    # --- Đọc/ghi file ---
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data.setdefault("users", {})
+        data.setdefault("session", None)
+        return data
+
+    def _save(self):
+        """Ghi an toàn: ghi file tạm rồi đổi tên (không bao giờ để file hỏng dở dang)"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    # --- Mật khẩu ---
+    def has_user(self, email):
+        return _normalize_email(email) in self._data["users"]
+
+    def get_name(self, email):
+        user = self._data["users"].get(_normalize_email(email))
+        return user.get("name", "") if user else ""
+
+    def set_password(self, email, password, name="", uid=None):
+        salt = secrets.token_bytes(16)
+        with self._lock:
+            previous = self._data["users"].get(_normalize_email(email), {})
+            self._data["users"][_normalize_email(email)] = {
+                "name": name or previous.get("name", ""),
+                "uid": uid or previous.get("uid"),
+                "salt": salt.hex(),
+                "iterations": PBKDF2_ITERATIONS,
+                "hash": _hash_password(password, salt),
+                "updated_at": time.time(),
+            }
+            self._save()
+
+    def get_uid(self, email):
+        """uid Firebase của tài khoản, None nếu chưa từng đăng nhập trực tuyến trên máy này"""
+        user = self._data["users"].get(_normalize_email(email))
+        return user.get("uid") if user else None
+
+    def verify(self, email, password):
+        user = self._data["users"].get(_normalize_email(email))
+        if not user:
+            return False
+        expected = user["hash"]
+        actual = _hash_password(password, bytes.fromhex(user["salt"]), user.get("iterations", PBKDF2_ITERATIONS))
+        return hmac.compare_digest(expected, actual)
+
+    # --- Phiên đăng nhập (Ghi nhớ đăng nhập) ---
+    def issue_session(self, email, ttl_sec=SESSION_TTL_SEC):
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._data["session"] = {
+                "email": _normalize_email(email),
+                "token_hash": _hash_token(token),
+                "expires_at": time.time() + ttl_sec,
+            }
+            self._save()
+            os.makedirs(os.path.dirname(self.token_path) or ".", exist_ok=True)
+            fd = os.open(self.token_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(token)
+        return token
+
+    def load_session(self):
+        """Trả về email nếu còn phiên hợp lệ, ngược lại None"""
+        session = self._data.get("session")
+        if not session or session.get("expires_at", 0) < time.time():
+            return None
+        try:
+            with open(self.token_path, encoding="utf-8") as f:
+                token = f.read().strip()
+        except OSError:
+            return None
+        if not hmac.compare_digest(session["token_hash"], _hash_token(token)):
+            return None
+        return session["email"]
+
+    def clear_session(self):
+        with self._lock:
+            self._data["session"] = None
+            self._save()
+            try:
+                os.remove(self.token_path)
+            except OSError:
+                pass
+
+    # --- Refresh token Firebase ---
+    def set_refresh_token(self, email, refresh_token, uid=None):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.refresh_token_path) or ".", exist_ok=True)
+            fd = os.open(self.refresh_token_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"email": _normalize_email(email), "uid": uid, "refresh_token": refresh_token}, f)
+
+    def load_refresh_token(self, uid=None):
+        """Refresh token của lần đăng nhập trực tuyến gần nhất (uid: chỉ khi là của tài khoản này), hoặc None"""
+        try:
+            with open(self.refresh_token_path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if uid is not None and saved.get("uid") != uid:
+            return None
+        return saved.get("refresh_token") or None
@@ -0,0 +1,145 @@
+"""
+detection.py – Bản ghi kết quả nhận diện 1 frame, bố cục cố định (__slots__)
+
+Thay cho dict tạo mới mỗi frame:
+- Không có __dict__ -> nhỏ hơn, tạo nhanh hơn, sai tên trường là báo lỗi ngay
+- Vẫn dùng được như dict ở những chỗ cũ: data["ear"], data.get(...), data.update(...), "perclos" in data,
+  str.format(**data) (luật cảnh báo) -> các module khác không phải đổi
+- Ghi thẳng ra JSON (telemetry) hoặc bytes cố định (struct, truyền qua mạng) không qua dict trung gian
+  (lợi về BỘ NHỚ: ~1/3 so với dict; thời gian tạo + ghi JSON vẫn chậm hơn dict – xem bench_detection.py)
+- Phát qua Signal(object): Qt chỉ chuyển tham chiếu, không chuyển đổi sang QVariantMap mỗi frame
+
+Trường chưa có giá trị = None (coi như "không có" với `in`, get() và luật cảnh báo).
+"""
+
+import json
+import math
+import operator
+import struct
+from json.encoder import encode_basestring
+
+# Trường do FaceProcessor điền
+PROCESSOR_FIELDS = (
+    "face_found", "ear", "mar",              # Eye / Mouth Aspect Ratio
+    "roll", "pitch", "yaw",                  # Góc đầu (độ)
+    "timestamp", "frame_seq",                # Thời điểm chụp (đo độ trễ cảnh báo), số thứ tự frame
+    "camera_state",                          # "ok" / "blocked" / "dark" / "blurred"
+    "gaze_yaw", "gaze_pitch", "gaze_vector", "gaze_zone",  # Hướng nhìn (mống mắt + góc đầu)
+    "identity_match", "identity_id", "identity_distance",  # Xác minh tài xế (identity.py)
+)
+# Trường dẫn xuất do AlertEngine điền
+ENGINE_FIELDS = (
+    "perclos", "blink_rate", "blink_duration_ms", "microsleeps", "perclos_coverage",
+    "roll_adjusted", "head_pitch", "head_yaw",  # Góc đầu đã cân bằng, đúng trục gật / quay (head_motion.py)
+    "nod_recent", "off_road", "off_road_sec",
+    "fatigue_score", "yawn_count", "microsleep_count", "nod_count", "tilt_count",
+)
+# Kết quả mô hình phụ (detector_scheduler.py), None = chưa chạy / kết quả đã cũ
+SECONDARY_FIELDS = ("phone_use", "hands_off_wheel", "seatbelt_off")
+FIELDS = PROCESSOR_FIELDS + ENGINE_FIELDS + SECONDARY_FIELDS
+
+# Định dạng nhị phân (little-endian): cờ, seq, timestamp, 5 số thực chính, PERCLOS, điểm mệt mỏi
+WIRE_STRUCT = struct.Struct("<BIdffffffff")
+_WIRE_FLOAT_FIELDS = ("ear", "mar", "roll", "pitch", "yaw", "perclos", "fatigue_score")
+
+_DEFAULTS = {"face_found": False, "ear": 0.0, "mar": 0.0, "roll": 0.0, "pitch": 0.0, "yaw": 0.0}
+
+
+def _make_init():
+    """__init__ gán thẳng từng trường (như dataclasses) – nhanh hơn nhiều so với vòng setattr"""
+    args = ", ".join(f"{name}={_DEFAULTS.get(name)!r}" for name in FIELDS)
+    body = "".join(f"    self.{name} = {name}\n" for name in FIELDS)
+    namespace = {}
+    exec(f"def __init__(self, *, {args}):\n{body}", namespace)
+    return namespace["__init__"]
+
+
+_get_all = operator.attrgetter(*FIELDS)
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+_JSON_KEYS = tuple(f"{encode_basestring(name)}:" for name in FIELDS)
+
+
+def _json_value(value, _float_repr=float.__repr__, _isfinite=math.isfinite):
+    """1 giá trị -> JSON (kiểu thường gặp không qua JSONEncoder)"""
+    kind = type(value)
+    if kind is float:
+        return _float_repr(value) if _isfinite(value) else _encoder.encode(value)
+    if kind is bool:
+        return "true" if value else "false"
+    if kind is str:
+        return encode_basestring(value)
+    if kind is int:
+        return int.__repr__(value)
+    return _encoder.encode(value)  # tuple (gaze_vector), NaN / vô cực...
+
+
+class DetectionRecord:
+    __slots__ = FIELDS
+
+    __init__ = _make_init()
+
+    # --- Giao diện kiểu dict (tương thích code cũ) ---
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, key, value)
+        except (AttributeError, TypeError):
+            raise KeyError(f"DetectionRecord không có trường '{key}'") from None
+
+    def __contains__(self, key):
+        return getattr(self, key, None) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def update(self, values):
+        try:
+            for key, value in values.items():
+                setattr(self, key, value)
+        except AttributeError:
+            raise KeyError(f"DetectionRecord không có trường '{key}'") from None
+
+    def keys(self):
+        return [name for name, value in zip(FIELDS, _get_all(self)) if value is not None]
+
+    def items(self):
+        return [(name, value) for name, value in zip(FIELDS, _get_all(self)) if value is not None]
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in self.items())
+        return f"DetectionRecord({fields})"
+
+    # --- Tuần tự hóa ---
+    def to_json(self):
+        """Chuỗi JSON các trường có giá trị (ghi log/telemetry), ghép thẳng từ các slot"""
+        return "{" + ",".join([key + _json_value(value) for key, value in zip(_JSON_KEYS, _get_all(self))
+                               if value is not None]) + "}"
+
+    def to_bytes(self, timestamp=None):
+        """
+        Bản ghi nhị phân cố định WIRE_STRUCT.size byte (các trường số chính).
+        timestamp: ghi thời điểm này thay cho self.timestamp (VD: theo đồng hồ của AlertEngine)
+        """
+        flags = (1 if self.face_found else 0) | (2 if self.off_road else 0) | (4 if self.nod_recent else 0)
+        if timestamp is None:
+            timestamp = self.timestamp
+        return WIRE_STRUCT.pack(
+            flags, (self.frame_seq or 0) & 0xFFFFFFFF, timestamp or 0.0,
+            *[float(getattr(self, name) or 0.0) for name in _WIRE_FLOAT_FIELDS],
+            float(self.off_road_sec or 0.0),
+        )
+
+    @classmethod
+    def from_bytes(cls, payload):
+        flags, seq, ts, *floats = WIRE_STRUCT.unpack(payload)
+        record = cls(face_found=bool(flags & 1), off_road=bool(flags & 2), nod_recent=bool(flags & 4),
+                     frame_seq=seq, timestamp=ts)
+        for name, value in zip(_WIRE_FLOAT_FIELDS + ("off_road_sec",), floats):
+            record[name] = value
+        return record
@@ -0,0 +1,283 @@
+"""
+detector_scheduler.py – Lập lịch nhiều mô hình phụ (dùng điện thoại, tay rời vô-lăng, dây an toàn ...)
+chạy ở tần số thấp hơn FaceMesh, mỗi mô hình 1 tần số / độ ưu tiên / ngân sách CPU riêng
+
+- Mô hình phụ chạy trên 1 luồng worker riêng: luồng video chỉ trao tham chiếu frame khi có mô hình
+  tới hạn VÀ worker đang rảnh (không xếp hàng, không copy) -> FPS của pipeline khuôn mặt không giảm.
+- Mỗi lần chỉ chạy 1 mô hình: các mô hình tới hạn được rải lần lượt qua các frame
+  (ưu tiên cao trước, cùng ưu tiên thì mô hình trễ hạn lâu hơn trước).
+- Ngân sách CPU: chu kỳ thực = max(1 / rate_hz, thời gian chạy trung bình / cpu_budget)
+  -> mô hình chậm hơn dự tính tự giãn tần số, không ăn hết CPU.
+- Kết quả mới nhất được gộp vào `data` mỗi frame (trường cố định trong DetectionRecord);
+  kết quả cũ hơn STALE_PERIODS chu kỳ THỰC (đã giãn theo ngân sách CPU) coi như không có (None)
+  -> luật cảnh báo bỏ qua. Không tính theo rate_hz danh nghĩa: mô hình bị giãn chu kỳ vẫn giữ kết quả
+  liên tục giữa 2 lần chạy, luật có for_sec dài hơn chu kỳ vẫn kích hoạt được.
+- synchronous=True (phát lại video): chạy ngay trên luồng gọi, kết quả xác định theo timestamp video.
+
+Mô hình khai báo trong config/detectors.json; thiếu thư viện / file mô hình thì bỏ qua mô hình đó.
+"""
+
+import json
+import os
+import threading
+import time
+
+from modules import metrics
+from modules.detection import SECONDARY_FIELDS
+
+DEFAULT_DETECTORS_PATH = os.path.join("config", "detectors.json")
+
+# Kết quả còn hạn trong bấy nhiêu chu kỳ chạy (bỏ lỡ 1-2 lần vì worker bận vẫn chưa mất kết quả)
+STALE_PERIODS = 3.0
+
+DETECTOR_RUNS = metrics.Counter("dms_detector_runs_total", "Số lần chạy mô hình phụ", ["detector"])
+DETECTOR_SKIPPED = metrics.Counter(
+    "dms_detector_skipped_total", "Số lần mô hình phụ tới hạn nhưng worker đang bận", ["detector"]
+)
+
+
+class SecondaryDetector:
+    """Giao diện 1 mô hình phụ: run(frame BGR) -> giá trị cho trường `field` (bool/float) hoặc None"""
+    name = "base"
+    field = None
+
+    def __init__(self, rate_hz=2.0, priority=0, cpu_budget=0.1, max_age=None):
+        self.rate_hz = rate_hz
+        self.priority = priority
+        self.cpu_budget = cpu_budget
+        # Hạn tối thiểu của kết quả (giây); None = chỉ theo chu kỳ thực (_Slot.max_age)
+        self.max_age = max_age
+
+    def run(self, frame):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class OnnxFrameClassifier(SecondaryDetector):
+    """
+    Phân loại cả khung hình bằng mô hình ONNX (CPU). Cấu hình (1 phần tử trong config/detectors.json):
+        {"name": "phone_use", "type": "onnx_classifier", "model": "models/phone_use.onnx",
+         "field": "phone_use", "input_size": [224, 224], "layout": "NCHW", "scale": 0.00392157,
+         "mean": [0, 0, 0], "labels": ["none", "phone"], "positive": "phone", "threshold": 0.6,
+         "rate_hz": 2, "priority": 2, "cpu_budget": 0.15}
+    Kết quả: True nếu xác suất nhãn `positive` >= threshold.
+    """
+
+    @staticmethod
+    def available(spec):
+        try:
+            import onnxruntime  # noqa: F401
+            import cv2  # noqa: F401
+        except ImportError as e:
+            return False, str(e)
+        if not os.path.exists(spec["model"]):
+            return False, f"thiếu file mô hình {spec['model']}"
+        return True, ""
+
+    def __init__(self, spec):
+        super().__init__(spec.get("rate_hz", 2.0), spec.get("priority", 0), spec.get("cpu_budget", 0.1),
+                         spec.get("max_age"))
+        import onnxruntime as ort
+        self.name = spec["name"]
+        self.field = spec["field"]
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = int(spec.get("threads", 1))
+        self.session = ort.InferenceSession(spec["model"], sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_size = tuple(spec.get("input_size", (224, 224)))
+        self.layout = spec.get("layout", "NCHW")
+        self.scale = float(spec.get("scale", 1.0 / 255.0))
+        self.mean = spec.get("mean", (0.0, 0.0, 0.0))
+        labels = spec.get("labels", ["negative", "positive"])
+        self.positive_index = labels.index(spec.get("positive", labels[-1]))
+        self.threshold = float(spec.get("threshold", 0.5))
+
+    def run(self, frame):
+        import cv2
+        import numpy as np
+        rgb = cv2.cvtColor(cv2.resize(frame, self.input_size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+        tensor = (rgb.astype(np.float32) - np.asarray(self.mean, dtype=np.float32)) * self.scale
+        if self.layout == "NCHW":
+            tensor = tensor.transpose(2, 0, 1)
+        scores = self.session.run(None, {self.input_name: tensor[None]})[0].reshape(-1)
+        if scores.min() < 0 or scores.max() > 1 or abs(scores.sum() - 1.0) > 1e-3:
+            exp = np.exp(scores - scores.max())  # logits -> softmax
+            scores = exp / exp.sum()
+        return bool(scores[self.positive_index] >= self.threshold)
+
+
+DETECTOR_TYPES = {
+    "onnx_classifier": OnnxFrameClassifier,
+}
+
+
+def load_detectors(path=DEFAULT_DETECTORS_PATH):
+    """Tạo các mô hình phụ đang bật trong file cấu hình (bỏ qua mô hình thiếu thư viện / file)"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            specs = json.load(f)
+    except (OSError, ValueError):
+        return []
+    detectors = []
+    for spec in specs.get("detectors", specs) if isinstance(specs, dict) else specs:
+        if not spec.get("enabled", True):
+            continue
+        name = spec.get("name", "?")
+        cls = DETECTOR_TYPES.get(spec.get("type"))
+        if cls is None or spec.get("field") not in SECONDARY_FIELDS:
+            print(f"⚠️ Mô hình phụ '{name}': loại hoặc trường không hỗ trợ, bỏ qua")
+            continue
+        ok, reason = cls.available(spec)
+        if not ok:
+            print(f"⚠️ Mô hình phụ '{name}' không dùng được ({reason}), bỏ qua")
+            continue
+        try:
+            detectors.append(cls(spec))
+        except Exception as e:  # Mô hình hỏng -> không làm hỏng cả pipeline
+            print(f"⚠️ Lỗi khi nạp mô hình phụ '{name}': {e}")
+    return detectors
+
+
+class _Slot:
+    __slots__ = ("detector", "next_due", "cost", "value", "value_time", "hist", "runs", "skipped")
+
+    def __init__(self, detector):
+        self.detector = detector
+        self.next_due = 0.0
+        self.cost = None          # Thời gian chạy trung bình (giây, EMA)
+        self.value = None
+        self.value_time = None
+        self.hist = metrics.STAGE_LATENCY.labels(stage=f"detector_{detector.name}")
+        self.runs = DETECTOR_RUNS.labels(detector=detector.name)
+        self.skipped = DETECTOR_SKIPPED.labels(detector=detector.name)
+
+    def period(self):
+        detector = self.detector
+        period = 1.0 / detector.rate_hz
+        if self.cost is not None and detector.cpu_budget > 0:
+            period = max(period, self.cost / detector.cpu_budget)
+        return period
+
+    def max_age(self):
+        """Kết quả quá cũ (VD: worker bị nghẽn) -> không dùng"""
+        return max(self.detector.max_age or 0.0, STALE_PERIODS * self.period())
+
+
+class DetectorScheduler:
+    COST_ALPHA = 0.2
+
+    def __init__(self, detectors=None, config_path=DEFAULT_DETECTORS_PATH, synchronous=False):
+        """detectors: list SecondaryDetector; None = nạp từ config_path (trên worker nếu chạy nền)"""
+        self.config_path = config_path
+        self.synchronous = synchronous
+        self._slots = []
+        self._lock = threading.Lock()
+        self._job = None
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+        if detectors is not None or synchronous:
+            self._set_detectors(detectors if detectors is not None else load_detectors(config_path))
+
+    def _set_detectors(self, detectors):
+        with self._lock:
+            self._slots = [_Slot(d) for d in detectors]
+
+    @property
+    def detectors(self):
+        return [slot.detector for slot in self._slots]
+
+    # --- Luồng worker ---
+    def start(self):
+        if self.synchronous or self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._worker, name="secondary-detectors", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        for slot in self._slots:
+            slot.detector.close()
+        self._slots = []
+
+    def _worker(self):
+        if not self._slots:
+            # Nạp mô hình trên worker: không chặn giao diện / luồng video
+            self._set_detectors(load_detectors(self.config_path))
+            if not self._slots:
+                return  # Không có mô hình phụ nào được bật
+        while self._running:
+            self._wake.wait()
+            self._wake.clear()
+            job = self._job
+            if job is None:
+                continue
+            slot, frame, now = job
+            self._run(slot, frame, now)
+            self._job = None
+
+    # --- Gọi từ luồng video mỗi frame ---
+    def _pick(self, now):
+        best = None
+        for slot in self._slots:
+            if now < slot.next_due:
+                continue
+            key = (slot.detector.priority, now - slot.next_due)
+            if best is None or key > best[0]:
+                best = (key, slot)
+        return best[1] if best else None
+
+    def submit(self, frame, now):
+        """Trao frame cho mô hình phụ tới hạn (nếu có). Không bao giờ chờ mô hình chạy xong (trừ synchronous)."""
+        if not self._slots:
+            return
+        slot = self._pick(now)
+        if slot is None:
+            return
+        if self.synchronous:
+            self._run(slot, frame, now)
+            return
+        if self._job is not None:
+            slot.skipped.inc()
+            return
+        # Đặt hạn kế tiếp ngay để frame sau không chọn lại mô hình đang chạy
+        slot.next_due = now + slot.period()
+        self._job = (slot, frame, now)
+        self._wake.set()
+
+    def _run(self, slot, frame, now):
+        started = time.perf_counter()
+        try:
+            value = slot.detector.run(frame)
+        except Exception as e:
+            print(f"⚠️ Mô hình phụ '{slot.detector.name}' lỗi: {e}")
+            value = None
+        cost = time.perf_counter() - started
+        slot.hist.observe(cost)
+        slot.runs.inc()
+        slot.cost = cost if slot.cost is None else slot.cost + self.COST_ALPHA * (cost - slot.cost)
+        slot.value, slot.value_time = value, now
+        slot.next_due = now + slot.period()
+
+    def apply(self, data, now):
+        """Gộp kết quả mới nhất (còn hạn) của mọi mô hình phụ vào `data`"""
+        for slot in self._slots:
+            value_time = slot.value_time
+            fresh = value_time is not None and now - value_time <= slot.max_age()
+            data[slot.detector.field] = slot.value if fresh else None
+
+    def reset(self):
+        for slot in self._slots:
+            slot.value = slot.value_time = None
+            slot.next_due = 0.0
@@ -0,0 +1,172 @@
+"""
+driver_profile.py – Ngưỡng cảnh báo riêng cho từng tài xế (tự học đầu ca) + lưu hồ sơ
+
+- P2Quantile: ước lượng phân vị trực tuyến (thuật toán P² – Jain & Chlamtac 1985),
+  bộ nhớ cố định 5 điểm mốc, O(1) mỗi mẫu -> không cần lưu lại chuỗi EAR/MAR
+- BaselineLearner: trong vài phút đầu ca, học phân bố EAR khi mở mắt và MAR khi ngậm miệng,
+  rồi suy ra ngưỡng nhắm mắt / ngáp cho riêng tài xế đó
+- DriverProfileStore: lưu ngưỡng + roll_offset theo tài xế (data/driver_profiles.json)
+  -> ca sau mở lên là đã hiệu chỉnh sẵn, không phải học lại
+"""
+
+import json
+import os
+import threading
+import time
+
+DEFAULT_PROFILE_PATH = os.path.join("data", "driver_profiles.json")
+
+
+class P2Quantile:
+    """Ước lượng phân vị `q` (0..1) của một luồng số, không lưu mẫu"""
+
+    def __init__(self, q):
+        self.q = q
+        self.count = 0
+        self._initial = []                       # 5 mẫu đầu tiên
+        self._heights = []                       # Giá trị tại 5 điểm mốc
+        self._positions = [1, 2, 3, 4, 5]        # Vị trí thực của các mốc
+        self._desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self._increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def add(self, x):
+        self.count += 1
+        if self.count <= 5:
+            self._initial.append(x)
+            if self.count == 5:
+                self._heights = sorted(self._initial)
+            return
+
+        h = self._heights
+        # 1. Tìm ô chứa x, nới rộng 2 đầu nếu cần
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= h[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            self._positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # 2. Điều chỉnh 3 mốc giữa về vị trí mong muốn (nội suy parabol, lỗi thì tuyến tính)
+        n = self._positions
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = self._parabolic(i, step)
+                if not h[i - 1] < candidate < h[i + 1]:
+                    candidate = h[i] + step * (h[i + step] - h[i]) / (n[i + step] - n[i])
+                h[i] = candidate
+                n[i] += step
+
+    def _parabolic(self, i, step):
+        h, n = self._heights, self._positions
+        return h[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        """Phân vị hiện tại (None nếu chưa có mẫu)"""
+        if self.count == 0:
+            return None
+        if self.count < 5:
+            ordered = sorted(self._initial)
+            return ordered[min(len(ordered) - 1, int(round(self.q * (len(ordered) - 1))))]
+        return self._heights[2]
+
+
+class BaselineLearner:
+    """
+    Học ngưỡng cá nhân từ `learn_sec` giây đầu có mặt trong khung hình.
+    - EAR: trung vị (p50) ~ mắt mở bình thường (chớp mắt chỉ chiếm vài % thời gian);
+      ngưỡng nhắm = p50 * EAR_RATIO
+    - MAR: p90 ~ miệng ngậm/nói chuyện; ngưỡng ngáp = p90 * MAR_RATIO
+    Kết quả được kẹp trong khoảng hợp lý để 1 ca học lỗi không làm tắt hẳn cảnh báo.
+    """
+
+    EAR_RATIO = 0.75
+    MAR_RATIO = 1.6
+    EAR_LIMITS = (0.12, 0.30)
+    MAR_LIMITS = (0.35, 0.80)
+    MAX_FRAME_GAP_SEC = 0.5
+
+    def __init__(self, learn_sec=120.0, min_samples=300):
+        self.learn_sec = learn_sec
+        self.min_samples = min_samples
+        self.ear_p50 = P2Quantile(0.5)
+        self.mar_p90 = P2Quantile(0.9)
+        self.observed_sec = 0.0
+        self._last_time = None
+
+    @property
+    def samples(self):
+        return self.ear_p50.count
+
+    @property
+    def progress(self):
+        return min(1.0, self.observed_sec / self.learn_sec)
+
+    def add(self, now, ear, mar):
+        """Thêm 1 frame có mặt. Trả về True khi vừa đủ dữ liệu."""
+        if self._last_time is not None:
+            dt = now - self._last_time
+            if 0 < dt <= self.MAX_FRAME_GAP_SEC:
+                self.observed_sec += dt
+        self._last_time = now
+        self.ear_p50.add(ear)
+        self.mar_p90.add(mar)
+        return self.done
+
+    def face_lost(self):
+        self._last_time = None
+
+    @property
+    def done(self):
+        return self.observed_sec >= self.learn_sec and self.samples >= self.min_samples
+
+    def thresholds(self):
+        """(ngưỡng EAR, ngưỡng MAR) cho tài xế này"""
+        ear = _clamp(self.ear_p50.value() * self.EAR_RATIO, *self.EAR_LIMITS)
+        mar = _clamp(self.mar_p90.value() * self.MAR_RATIO, *self.MAR_LIMITS)
+        return ear, mar
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+class DriverProfileStore:
+    """Hồ sơ hiệu chỉnh theo tài xế: {driver_id: {ear_threshold, mar_threshold, roll_offset, ...}}"""
+
+    def __init__(self, path=DEFAULT_PROFILE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                self._profiles = json.load(f)
+        except (OSError, ValueError):
+            self._profiles = {}
+
+    def get(self, driver_id):
+        return dict(self._profiles.get(driver_id) or {})
+
+    def update(self, driver_id, **fields):
+        """Gộp các trường mới vào hồ sơ rồi ghi file (ghi file tạm rồi đổi tên)"""
+        with self._lock:
+            profile = self._profiles.setdefault(driver_id, {})
+            profile.update(fields)
+            profile["updated_at"] = time.time()
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._profiles, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+            return dict(profile)
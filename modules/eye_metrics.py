@@ -0,0 +1,140 @@
+"""
+eye_metrics.py – PERCLOS và tần suất/thời lượng chớp mắt, tính dần theo từng frame
+
+- PERCLOS: % thời gian mắt nhắm trong cửa sổ trượt (mặc định 60 giây) – chỉ số mệt mỏi chuẩn
+- Chớp mắt: EAR xuống dưới ngưỡng rồi mở lại trong 50–500 ms
+  (nhắm lâu hơn = "micro-sleep", được đếm riêng)
+
+Cửa sổ trượt dùng vòng đệm (ring buffer) chia theo khoảng thời gian cố định + tổng chạy:
+mỗi frame O(1) (khấu hao), bộ nhớ cố định theo số ô, KHÔNG phụ thuộc FPS hay độ dài cửa sổ.
+Mọi thời gian lấy từ tham số `now` -> dùng được khi phát lại video (đồng hồ theo timestamp video).
+"""
+
+
+class BucketedWindow:
+    """
+    Cửa sổ trượt theo thời gian: `buckets` ô, mỗi ô rộng window_sec / buckets giây.
+    Mỗi ô giữ tổng (sum) và trọng số (weight); tổng toàn cửa sổ được cập nhật dần.
+    """
+
+    def __init__(self, window_sec=60.0, buckets=60):
+        self.window_sec = float(window_sec)
+        self.buckets = buckets
+        self.bucket_width = self.window_sec / buckets
+        self._sums = [0.0] * buckets
+        self._weights = [0.0] * buckets
+        self._current = None  # Chỉ số ô tuyệt đối (theo thời gian) mới nhất
+        self.total = 0.0
+        self.total_weight = 0.0
+
+    def _advance(self, now):
+        index = int(now // self.bucket_width)
+        if self._current is None:
+            self._current = index
+            return
+        if index <= self._current:
+            return
+        # Xóa các ô đã trượt ra khỏi cửa sổ (tối đa `buckets` ô -> O(1) khấu hao)
+        steps = min(index - self._current, self.buckets)
+        for i in range(1, steps + 1):
+            slot = (self._current + i) % self.buckets
+            self.total -= self._sums[slot]
+            self.total_weight -= self._weights[slot]
+            self._sums[slot] = 0.0
+            self._weights[slot] = 0.0
+        self._current = index
+        # Tránh sai số dấu phẩy động tích lũy khi cửa sổ trống
+        if self.total_weight <= 1e-9:
+            self.total = 0.0
+            self.total_weight = 0.0
+
+    def add(self, now, value, weight=1.0):
+        self._advance(now)
+        slot = self._current % self.buckets
+        self._sums[slot] += value
+        self._weights[slot] += weight
+        self.total += value
+        self.total_weight += weight
+
+    def expire(self, now):
+        """Trượt cửa sổ tới `now` mà không thêm dữ liệu"""
+        self._advance(now)
+
+    def mean(self):
+        return self.total / self.total_weight if self.total_weight > 0 else 0.0
+
+    def reset(self):
+        self.__init__(self.window_sec, self.buckets)
+
+
+class EyeMetrics:
+    """Theo dõi PERCLOS + chớp mắt từ chuỗi EAR"""
+
+    # Dải thời lượng (giây) được coi là 1 lần chớp mắt
+    BLINK_MIN_SEC = 0.05
+    BLINK_MAX_SEC = 0.5
+    # Bỏ qua khoảng trống lớn (mất mặt, giật hình) khi cộng thời gian
+    MAX_FRAME_GAP_SEC = 0.5
+
+    def __init__(self, window_sec=60.0, buckets=60):
+        self.window_sec = window_sec
+        self.closed_time = BucketedWindow(window_sec, buckets)  # sum = thời gian nhắm, weight = thời gian quan sát
+        self.blinks = BucketedWindow(window_sec, buckets)       # sum = tổng thời lượng chớp, weight = số lần chớp
+        self.microsleeps = BucketedWindow(window_sec, buckets)
+        self._last_time = None
+        self._closed_since = None
+        self.microsleep_detected = False  # True đúng ở frame vừa kết thúc 1 micro-sleep
+
+    def reset(self):
+        self.__init__(self.window_sec, self.closed_time.buckets)
+
+    def update(self, now, ear, threshold):
+        """Gọi mỗi frame có mặt. Trả về dict các chỉ số hiện tại."""
+        closed = ear < threshold
+
+        # 1. PERCLOS: cộng thời lượng frame (khác nhau theo FPS) vào cửa sổ
+        if self._last_time is not None:
+            dt = now - self._last_time
+            if 0 < dt <= self.MAX_FRAME_GAP_SEC:
+                self.closed_time.add(now, dt if closed else 0.0, dt)
+        self._last_time = now
+
+        # 2. Chớp mắt: phát hiện chuyển trạng thái nhắm -> mở
+        self.microsleep_detected = False
+        if closed:
+            if self._closed_since is None:
+                self._closed_since = now
+        elif self._closed_since is not None:
+            duration = now - self._closed_since
+            self._closed_since = None
+            if self.BLINK_MIN_SEC <= duration <= self.BLINK_MAX_SEC:
+                self.blinks.add(now, duration, 1.0)
+            elif duration > self.BLINK_MAX_SEC:
+                self.microsleeps.add(now, duration, 1.0)
+                self.microsleep_detected = True
+
+        self.blinks.expire(now)
+        self.microsleeps.expire(now)
+        return self.snapshot()
+
+    def face_lost(self):
+        """Mất mặt: không tính khoảng này vào PERCLOS, hủy lần chớp đang dở"""
+        self._last_time = None
+        self._closed_since = None
+
+    @property
+    def coverage(self):
+        """Tỉ lệ cửa sổ đã có dữ liệu (0..1) – PERCLOS chỉ đáng tin khi đủ lớn"""
+        return min(1.0, self.closed_time.total_weight / self.window_sec)
+
+    def snapshot(self):
+        blink_count = self.blinks.total_weight
+        # Quy đổi ra "lần/phút" theo thời gian đã quan sát (khi chưa đủ 1 cửa sổ)
+        observed_min = max(self.closed_time.total_weight, 1e-9) / 60.0
+        return {
+            "perclos": self.closed_time.mean(),
+            "blink_rate": blink_count / observed_min if self.closed_time.total_weight >= 5.0 else 0.0,
+            "blink_duration_ms": (self.blinks.total / blink_count * 1000.0) if blink_count else 0.0,
+            "microsleeps": int(round(self.microsleeps.total_weight)),
+            "perclos_coverage": self.coverage,
+        }
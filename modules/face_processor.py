@@ -1,13 +1,32 @@
 """
 Module Xử lý Khuôn mặt
-Sử dụng MediaPipe Face Mesh để phát hiện landmarks
+Dùng 1 backend suy luận landmark (mặc định MediaPipe Face Mesh – xem inference_backends.py)
 và tính toán các chỉ số (EAR, MAR, Head Pose).
 """
 
-import cv2
-import mediapipe as mp
-import numpy as np
 import math
+import threading
+import time
+
+import numpy as np
+
+from modules import metrics
+from modules.detection import DetectionRecord
+from modules.gaze import GazeEstimator
+from modules.head_motion import head_angles
+from modules.image_quality import ImageQualityGate, STATE_OK
+from modules.inference_backends import create_backend, load_device_choice
+
+# cv2 (và backend suy luận) rất nặng (hàng trăm ms) -> chỉ import khi thực sự tạo FaceProcessor
+cv2 = None
+
+
+def _import_backends():
+    """Import trễ cv2 (gọi nhiều lần không tốn gì)"""
+    global cv2
+    if cv2 is None:
+        import cv2 as _cv2
+        cv2 = _cv2
 
 # --- Định nghĩa các chỉ số landmark quan trọng (lấy từ sơ đồ của MediaPipe) ---
 
@@ -32,32 +51,53 @@ POSE_LANDMARKS = [
     291  # khóe miệng phải (của người dùng)
 ]
 
+# Tọa độ 3D tương ứng (mô hình chung, không cần chính xác tuyệt đối; y hướng lên, z hướng ra trước mặt)
+POSE_MODEL_POINTS = np.array([
+    (0.0, 0.0, 0.0),             # Chóp mũi
+    (0.0, -330.0, -65.0),        # Cằm
+    (-225.0, 170.0, -135.0),     # Khóe mắt trái
+    (225.0, 170.0, -135.0),      # Khóe mắt phải
+    (-150.0, -150.0, -125.0),    # Khóe miệng trái
+    (150.0, -150.0, -125.0)      # Khóe miệng phải
+])
+
 class FaceProcessor:
-    def __init__(self):
-        """Khởi tạo MediaPipe Face Mesh"""
-        self.mp_drawing = mp.solutions.drawing_utils
-        self.mp_face_mesh = mp.solutions.face_mesh
-
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            max_num_faces=1,            # Chỉ xử lý 1 khuôn mặt (người lái xe)
-            refine_landmarks=True,      # Bật để lấy landmark chi tiết cho mắt/môi
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
-        
-        # Thông số vẽ lưới (màu xám mờ)
-        self.mesh_drawing_spec = self.mp_drawing.DrawingSpec(
-            color=(200, 200, 200), 
-            thickness=1, 
-            circle_radius=1
-        )
+    def __init__(self, gaze_zones=None, backend=None):
+        """
+        gaze_zones: vùng nhìn của xe (None = data/gaze_zones.json)
+        backend: tên hoặc đối tượng InferenceBackend (None = backend đã chọn cho máy này, mặc định MediaPipe)
+        """
+        _import_backends()
+
+        # Các "núm" chất lượng (QualityGovernor điều chỉnh qua configure())
+        self.inference_width = None  # None = suy luận trên ảnh gốc
+        self.overlay = "mesh"        # "mesh" / "text" / "none"
+        self.refine = True
+        if backend is None or isinstance(backend, str):
+            backend = create_backend(backend or load_device_choice(), refine=self.refine)
+        self.backend = backend
+        # Hướng nhìn: dùng lại điểm mống mắt mà refine_landmarks đã tính sẵn
+        self.gaze = GazeEstimator(gaze_zones)
+        # Cổng chất lượng ảnh: che ống kính / mờ / quá tối -> bỏ qua suy luận
+        self.quality_gate = ImageQualityGate()
+        self._gate_hist = metrics.STAGE_LATENCY.labels(stage="quality_gate")
+        # Xác minh tài xế từ landmark sẵn có (IdentityVerifier, None = tắt)
+        self.identity = None
+
+    def configure(self, inference_width=None, overlay="mesh", refine=True):
+        """Đổi mức chất lượng. Gọi trên cùng luồng với process_frame()."""
+        self.inference_width = inference_width
+        self.overlay = overlay
+        if refine != self.refine:
+            self.backend.configure(refine)
+            self.refine = refine
 
-    def _get_landmark_coords(self, frame, face_landmarks, indices):
-        """Helper: Lấy toạ độ (x, y) pixel từ list các chỉ số (indices)"""
+    def _get_landmark_coords(self, frame, landmarks, indices):
+        """Helper: Lấy toạ độ (x, y) pixel từ list các chỉ số (indices, theo đánh số MediaPipe)"""
         h, w, _ = frame.shape
         coords = []
         for idx in indices:
-            lm = face_landmarks.landmark[idx]
+            lm = landmarks[idx]
             x = int(lm.x * w)
             y = int(lm.y * h)
             coords.append((x, y))
@@ -100,28 +140,23 @@ class FaceProcessor:
         mar = vertical_dist / horizontal_dist
         return mar
 
-    def _get_head_pose(self, frame, face_landmarks):
+    def _get_head_pose(self, frame, landmarks):
         """
         Ước tính góc quay 3D của đầu (Pitch, Yaw, Roll)
         sử dụng cv2.solvePnP.
+        Lưu ý: đây là góc Euler THÔ – gật/ngẩng nằm ở roll (quanh ±180), quay trái/phải ở pitch;
+        dùng head_motion.head_angles() để đổi sang đúng nghĩa.
         """
         h, w, _ = frame.shape
         
         # 1. Lấy tọa độ 2D của các điểm POSE_LANDMARKS
         image_points = np.array(
-            self._get_landmark_coords(frame, face_landmarks, POSE_LANDMARKS), 
+            self._get_landmark_coords(frame, landmarks, POSE_LANDMARKS), 
             dtype="double"
         )
         
         # 2. Tọa độ 3D (mô hình chung, không cần chính xác tuyệt đối)
-        model_points = np.array([
-            (0.0, 0.0, 0.0),             # Chóp mũi
-            (0.0, -330.0, -65.0),        # Cằm
-            (-225.0, 170.0, -135.0),     # Khóe mắt trái
-            (225.0, 170.0, -135.0),      # Khóe mắt phải
-            (-150.0, -150.0, -125.0),    # Khóe miệng trái
-            (150.0, -150.0, -125.0)      # Khóe miệng phải
-        ])
+        model_points = POSE_MODEL_POINTS
         
         # 3. Thông số camera (ước tính)
         focal_length = w
@@ -155,83 +190,178 @@ class FaceProcessor:
             return 0.0, 0.0, 0.0
 
 
-    def process_frame(self, frame):
+    def process_frame(self, frame, timestamp=None, annotate=True):
         """
         Hàm xử lý chính.
         Input: frame (ảnh BGR từ OpenCV)
+               timestamp: thời điểm chụp frame (time.perf_counter), được chuyển nguyên vào kết quả
+               annotate: False = không vẽ lưới/chữ (chạy nền, phát lại) -> nhanh hơn
         Output: (annotated_image, detection_data)
             - annotated_image: ảnh đã vẽ các landmarks (BGR)
-            - detection_data: dict chứa các chỉ số
+            - detection_data: DetectionRecord chứa các chỉ số (dùng được như dict)
         """
         
+        # 0. Cổng chất lượng ảnh (trên ảnh thu nhỏ, rẻ hơn nhiều so với FaceMesh)
+        t_gate = time.perf_counter()
+        quality = self.quality_gate.assess(frame)
+        self._gate_hist.observe(time.perf_counter() - t_gate)
+
         # 1. Chuẩn bị ảnh
-        annotated_image = frame.copy()
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        annotated_image = frame.copy() if annotate else frame
+
+        # Khởi tạo dict kết quả
+        # (face_found=False, ear/mar/roll/pitch/yaw = 0.0, các trường khác None – xem detection.py)
+        detection_data = DetectionRecord(
+            timestamp=timestamp,  # Thời điểm chụp frame (để đo độ trễ cảnh báo)
+            camera_state=quality.state,  # "ok" / "blocked" / "dark" / "blurred"
+        )
+
+        if quality.state != STATE_OK:
+            # Ảnh không dùng được -> không chạy FaceMesh
+            metrics.FRAMES_DROPPED.labels(reason=f"quality_{quality.state}").inc()
+            if annotate:
+                cv2.putText(annotated_image, f"CAMERA: {quality.state.upper()}", (10, 30),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            return annotated_image, detection_data
+
+        # 2. Chạy nhận diện (ảnh tối/nhạt -> tăng tương phản trước)
+        source = self.quality_gate.enhance(frame, quality) if quality.enhance else frame
+        h, w = source.shape[:2]
+        if self.inference_width and w > self.inference_width:
+            # Landmark trả về dạng tỉ lệ (0..1) nên các phép tính sau vẫn dùng kích thước ảnh gốc
+            source = cv2.resize(
+                source, (self.inference_width, int(h * self.inference_width / w)),
+                interpolation=cv2.INTER_AREA
+            )
+        rgb_frame = cv2.cvtColor(source, cv2.COLOR_BGR2RGB)
         rgb_frame.flags.writeable = False # Tối ưu hóa
-        
-        # 2. Chạy nhận diện
-        results = self.face_mesh.process(rgb_frame)
-        
-        # 3. Khởi tạo dict kết quả
-        detection_data = {
-            "face_found": False,
-            "ear": 0.0,  # Eye Aspect Ratio
-            "mar": 0.0,  # Mouth Aspect Ratio
-            "roll": 0.0, # Góc nghiêng (trái/phải)
-            "pitch": 0.0, # Góc gật gù (lên/xuống)
-            "yaw": 0.0   # Góc quay (trái/phải)
-        }
-
-        # 4. Xử lý kết quả nếu tìm thấy khuôn mặt
-        if results.multi_face_landmarks:
-            detection_data["face_found"] = True
-            face_landmarks = results.multi_face_landmarks[0] # Lấy mặt đầu tiên
+        landmarks = self.backend.process(rgb_frame)
+
+        # 3. Xử lý kết quả nếu tìm thấy khuôn mặt
+        if landmarks is not None:
+            detection_data.face_found = True
             
             # Vẽ lưới khuôn mặt lên ảnh
-            self.mp_drawing.draw_landmarks(
-                image=annotated_image,
-                landmark_list=face_landmarks,
-                connections=self.mp_face_mesh.FACEMESH_TESSELATION,
-                landmark_drawing_spec=None,
-                connection_drawing_spec=self.mesh_drawing_spec
-            )
+            if annotate and self.overlay == "mesh":
+                self.backend.draw(annotated_image, landmarks)
             
             # --- A. Tính toán EAR (Nhắm mắt) ---
-            right_eye_coords = self._get_landmark_coords(frame, face_landmarks, RIGHT_EYE_EAR_POINTS)
-            left_eye_coords = self._get_landmark_coords(frame, face_landmarks, LEFT_EYE_EAR_POINTS)
+            right_eye_coords = self._get_landmark_coords(frame, landmarks, RIGHT_EYE_EAR_POINTS)
+            left_eye_coords = self._get_landmark_coords(frame, landmarks, LEFT_EYE_EAR_POINTS)
             
             ear_right = self._calculate_ear(right_eye_coords)
             ear_left = self._calculate_ear(left_eye_coords)
             
             # Lấy trung bình EAR của 2 mắt
             avg_ear = (ear_right + ear_left) / 2.0
-            detection_data["ear"] = avg_ear
+            detection_data.ear = avg_ear
 
             # --- B. Tính toán MAR (Ngáp) ---
-            mouth_coords = self._get_landmark_coords(frame, face_landmarks, MOUTH_MAR_POINTS)
+            mouth_coords = self._get_landmark_coords(frame, landmarks, MOUTH_MAR_POINTS)
             mar = self._calculate_mar(mouth_coords)
-            detection_data["mar"] = mar
+            detection_data.mar = mar
 
             # --- C. Tính toán Head Pose (Nghiêng đầu) ---
-            pitch, yaw, roll = self._get_head_pose(frame, face_landmarks)
-            detection_data["roll"] = roll
-            detection_data["pitch"] = pitch
-            detection_data["yaw"] = yaw
+            pitch, yaw, roll = self._get_head_pose(frame, landmarks)
+            detection_data.roll = roll
+            detection_data.pitch = pitch
+            detection_data.yaw = yaw
+
+            # --- C2. Hướng nhìn (mống mắt + góc đầu đã đổi sang đúng trục gật / quay) ---
+            head_pitch, head_yaw = head_angles(pitch, roll)
+            detection_data.update(self.gaze.estimate(landmarks, head_pitch, head_yaw))
+
+            # --- C3. Xác minh tài xế (chỉ tính chữ ký khi tới hạn xác minh lại) ---
+            identity = self.identity
+            if identity is not None:
+                identity.observe(timestamp if timestamp is not None else time.perf_counter(),
+                                 landmarks, head_pitch, head_yaw)
+                identity.fill(detection_data)
             
             # --- D. (Tùy chọn) Vẽ thông tin lên màn hình để debug ---
-            cv2.putText(annotated_image, f"EAR: {avg_ear:.2f}", (10, 30), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            cv2.putText(annotated_image, f"MAR: {mar:.2f}", (10, 60), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            cv2.putText(annotated_image, f"ROLL: {roll:.1f}", (10, 90), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            if annotate and self.overlay != "none":
+                cv2.putText(annotated_image, f"EAR: {avg_ear:.2f}", (10, 30), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                cv2.putText(annotated_image, f"MAR: {mar:.2f}", (10, 60), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                cv2.putText(annotated_image, f"ROLL: {roll:.1f}", (10, 90), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                if detection_data.gaze_zone is not None:
+                    cv2.putText(annotated_image, f"GAZE: {detection_data.gaze_zone}", (10, 120),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
                 
-        # 5. Trả về ảnh đã vẽ và dữ liệu
+        # 4. Trả về ảnh đã vẽ và dữ liệu
         return annotated_image, detection_data
 
+    def warm_up(self, width=640, height=480):
+        """Chạy thử 1 frame đen để backend (MediaPipe...) khởi tạo graph/bộ nhớ trước khi có frame thật"""
+        dummy = np.zeros((height, width, 3), dtype=np.uint8)
+        # Gọi thẳng backend: frame đen sẽ bị cổng chất lượng chặn ("blocked")
+        self.backend.process(cv2.cvtColor(dummy, cv2.COLOR_BGR2RGB))
+        self.quality_gate.assess(dummy)
+        self.quality_gate = ImageQualityGate()
+
     def close(self):
         """Giải phóng tài nguyên khi đóng ứng dụng"""
-        self.face_mesh.close()
+        self.backend.close()
+
+
+def _default_factory():
+    """Backend đã chọn cho loại máy này (lần đầu trên máy mới: đo nhanh nếu có clip mẫu)"""
+    from modules.backend_benchmark import ensure_device_choice
+    return FaceProcessor(backend=ensure_device_choice())
+
+
+class ProcessorLoader:
+    """
+    Tạo và làm nóng FaceProcessor trên luồng nền (khi cửa sổ đang hiển thị),
+    rồi DÙNG LẠI cho mọi lần Bắt đầu/Dừng thay vì tạo mới mỗi lần.
+    """
+
+    def __init__(self, factory=None):
+        self._factory = factory or _default_factory
+        self._ready = threading.Event()
+        self._processor = None
+        self._error = None
+        self._thread = None
+        self.load_seconds = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._load, daemon=True)
+        self._thread.start()
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            processor = self._factory()
+            processor.warm_up()
+            self._processor = processor
+        except Exception as e:
+            self._error = e
+            print(f"Lỗi khi khởi tạo FaceProcessor: {e}")
+        finally:
+            self.load_seconds = time.perf_counter() - started
+            self._ready.set()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def get(self, timeout=None):
+        """Chờ (trên luồng gọi) tới khi processor sẵn sàng. Trả về None nếu lỗi/hết giờ."""
+        self.start()
+        if not self._ready.wait(timeout):
+            return None
+        return self._processor
+
+    def close(self):
+        if self._thread is not None:
+            self._ready.wait(5)
+        if self._processor is not None:
+            self._processor.close()
+            self._processor = None
 
 
 # --- Khối main để chạy test file này độc lập ---
@@ -240,6 +370,7 @@ if __name__ == "__main__":
     # Dùng để kiểm tra nhanh module
     
     print("Đang chạy kiểm tra FaceProcessor với MediaPipe...")
+    _import_backends()
     cap = cv2.VideoCapture(0) # Mở webcam
     
     if not cap.isOpened():
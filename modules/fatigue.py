@@ -0,0 +1,82 @@
+"""
+fatigue.py – Đếm sự kiện theo cửa sổ thời gian trượt + điểm mệt mỏi tổng hợp
+
+- EventWindow: deque các mốc thời gian; sự kiện cũ hơn cửa sổ bị bỏ ở đầu deque
+  (mỗi sự kiện vào/ra đúng 1 lần -> O(1) khấu hao), VD "ngáp 3 lần trong 60 giây"
+- FatigueTracker: gộp ngáp / micro-sleep / gật gù / nghiêng đầu thành 1 điểm mệt mỏi 0..100.
+  Mỗi sự kiện cộng thêm trọng số; điểm giảm dần theo hàm mũ (chu kỳ bán rã cấu hình được)
+  -> cập nhật O(1) mỗi frame, không cần lưu lịch sử.
+"""
+
+import math
+from collections import deque
+
+EVENT_KINDS = ("yawn", "microsleep", "nod", "tilt")
+
+DEFAULT_WEIGHTS = {
+    "yawn": 10.0,
+    "microsleep": 25.0,
+    "nod": 15.0,
+    "tilt": 5.0,
+}
+
+
+class EventWindow:
+    """Số sự kiện trong `window_sec` giây gần nhất"""
+
+    def __init__(self, window_sec=60.0):
+        self.window_sec = window_sec
+        self._times = deque()
+
+    def add(self, now):
+        self._times.append(now)
+        self.expire(now)
+
+    def expire(self, now):
+        times = self._times
+        cutoff = now - self.window_sec
+        while times and times[0] <= cutoff:
+            times.popleft()
+
+    def count(self, now=None):
+        if now is not None:
+            self.expire(now)
+        return len(self._times)
+
+    def clear(self):
+        self._times.clear()
+
+
+class FatigueTracker:
+    MAX_SCORE = 100.0
+
+    def __init__(self, window_sec=60.0, weights=None, half_life_sec=300.0):
+        self.window_sec = window_sec
+        self.weights = dict(DEFAULT_WEIGHTS if weights is None else weights)
+        self.half_life_sec = half_life_sec
+        self.windows = {kind: EventWindow(window_sec) for kind in EVENT_KINDS}
+        self.score = 0.0
+        self._last_time = None
+
+    def _decay_to(self, now):
+        if self._last_time is not None and now > self._last_time and self.score > 0:
+            self.score *= math.exp(-math.log(2) * (now - self._last_time) / self.half_life_sec)
+            if self.score < 1e-3:
+                self.score = 0.0
+        if self._last_time is None or now > self._last_time:
+            self._last_time = now
+
+    def add_event(self, kind, now):
+        self._decay_to(now)
+        self.windows[kind].add(now)
+        self.score = min(self.MAX_SCORE, self.score + self.weights.get(kind, 0.0))
+
+    def update(self, now):
+        """Gọi mỗi frame: giảm điểm theo thời gian, bỏ sự kiện cũ. Trả về dict cho `data`."""
+        self._decay_to(now)
+        result = {f"{kind}_count": window.count(now) for kind, window in self.windows.items()}
+        result["fatigue_score"] = self.score
+        return result
+
+    def reset(self):
+        self.__init__(self.window_sec, self.weights, self.half_life_sec)
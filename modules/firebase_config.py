@@ -1,5 +1,11 @@
-import pyrebase
-import logging 
+"""
+firebase_config.py – Kết nối Firebase (Authentication + Realtime Database)
+Khởi tạo TRỄ: pyrebase chỉ được import và kết nối ở lần gọi get_auth()/get_db() đầu tiên,
+nên việc import module này không tốn thời gian và không cần mạng.
+"""
+import logging
+import threading
+import time
 
 auth = None
 db = None
@@ -12,18 +18,86 @@ config = {
     "databaseURL": "https://lithe-catbird-476301-p4-default-rtdb.asia-southeast1.firebasedatabase.app"
 }
 
-try:
-    # 1. Khởi tạo ứng dụng Firebase
-    firebase = pyrebase.initialize_app(config)
-    
-    # 2. Lấy dịch vụ Authentication (Đăng nhập)
-    auth = firebase.auth()
-    
-    # 3. Lấy dịch vụ REALTIME DATABASE (không phải firestore)
-    db = firebase.database()
-    
-    logging.warning("Firebase Config: Khởi tạo thành công! (auth và db đã sẵn sàng)")
-
-except Exception as e:
-    logging.error(f"Firebase Config: LỖI KHI KHỞI TẠO: {e}")
-    logging.error("Vui lòng kiểm tra lại 'databaseURL' trong config và đảm bảo đã 'pip install pyrebase4'")
\ No newline at end of file
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def init_firebase():
+    """Khởi tạo Firebase (1 lần). Trả về True nếu auth và db đã sẵn sàng."""
+    global auth, db, _initialized
+    with _init_lock:
+        if _initialized:
+            return auth is not None
+        _initialized = True
+        try:
+            import pyrebase
+
+            # 1. Khởi tạo ứng dụng Firebase
+            firebase = pyrebase.initialize_app(config)
+
+            # 2. Lấy dịch vụ Authentication (Đăng nhập)
+            auth = firebase.auth()
+
+            # 3. Lấy dịch vụ REALTIME DATABASE (không phải firestore)
+            db = firebase.database()
+
+            logging.warning("Firebase Config: Khởi tạo thành công! (auth và db đã sẵn sàng)")
+
+        except Exception as e:
+            # Cho phép thử lại ở lần gọi sau (VD: lúc đó mới có mạng)
+            _initialized = False
+            auth = None
+            db = None
+            logging.error(f"Firebase Config: LỖI KHI KHỞI TẠO: {e}")
+            logging.error("Vui lòng kiểm tra lại 'databaseURL' trong config và đảm bảo đã 'pip install pyrebase4'")
+        return auth is not None
+
+
+def get_auth():
+    """Dịch vụ Authentication, hoặc None nếu không khởi tạo được"""
+    init_firebase()
+    return auth
+
+
+def get_db():
+    """Dịch vụ Realtime Database, hoặc None nếu không khởi tạo được"""
+    init_firebase()
+    return db
+
+
+class IdTokenProvider:
+    """
+    Callable trả về idToken Firebase (hoặc None) cho OutboxUploader(auth_token_provider=...).
+    idToken hết hạn sau 1 giờ -> làm mới từ refresh token (lưu lúc đăng nhập) khi gần hết hạn.
+    Chạy trên luồng tải lên (có thể gọi mạng).
+    """
+    ID_TOKEN_TTL_SEC = 3600
+    REFRESH_MARGIN_SEC = 300
+
+    def __init__(self, refresh_token_loader):
+        self.refresh_token_loader = refresh_token_loader
+        self._lock = threading.Lock()
+        self._id_token = None
+        self._expires_at = 0.0
+
+    def __call__(self):
+        with self._lock:
+            if self._id_token and time.time() < self._expires_at - self.REFRESH_MARGIN_SEC:
+                return self._id_token
+            refresh_token = self.refresh_token_loader()
+            auth = get_auth() if refresh_token else None
+            if auth is None:
+                return None
+            try:
+                user = auth.refresh(refresh_token)
+            except Exception as e:  # Mất mạng / refresh token bị thu hồi
+                logging.error(f"Firebase Config: không làm mới được idToken: {e}")
+                return None
+            self._id_token = user.get("idToken")
+            self._expires_at = time.time() + self.ID_TOKEN_TTL_SEC
+            return self._id_token
+
+    def invalidate(self):
+        """Server từ chối token (401/403) -> lần gọi sau làm mới"""
+        with self._lock:
+            self._id_token = None
@@ -0,0 +1,378 @@
+"""
+fleet_report.py – Tổng hợp nhiều chuyến đi (cả đội xe) theo tài xế, theo xe và theo giờ trong ngày
+
+1. Quét cây thư mục tìm các chuyến (thư mục có frames.bin – xem trip_log.py)
+2. Chuyến đã tính và file không đổi (kích thước + mtime) -> lấy tóm tắt từ cache, KHÔNG đọc lại file.
+   File đổi mtime -> băm lại (blake2b); nội dung y hệt (VD: chép lại, touch) thì vẫn dùng cache.
+3. Chuyến mới / đã đổi: tóm tắt song song trên nhiều tiến trình (ProcessPoolExecutor),
+   mỗi chuyến đọc theo khối bằng trip_report.load_trip
+4. Gộp (reduce) các tóm tắt thành bảng theo tài xế, theo xe, theo giờ trong ngày (0..23 giờ địa phương)
+Cache: SQLite data/fleet_cache.sqlite3 (chỉ tiến trình chính ghi). Chạy lại sau 1 ngày tải lên thêm:
+chỉ tính các chuyến mới, phần còn lại là stat() + 1 câu SELECT.
+
+    python -m modules.fleet_report data/trips
+    python -m modules.fleet_report /mnt/fleet --workers 8 --since 2025-01-01 --out-dir data/fleet
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from modules.trip_log import EVENTS_FILE, FRAMES_FILE, META_FILE, ROLLUP_FILE, STATE_DANGER, trip_is_active
+
+DEFAULT_CACHE_PATH = os.path.join("data", "fleet_cache.sqlite3")
+# Đổi khi thay đổi nội dung tóm tắt -> mọi chuyến được tính lại 1 lần
+SUMMARY_VERSION = 1
+TRIP_FILES = (FRAMES_FILE, EVENTS_FILE, META_FILE, ROLLUP_FILE)
+HOURLY_FIELDS = ("duration_sec", "frames", "face_frames", "closed_frames", "blinks", "long_closures", "yawns",
+                 "alerts", "danger_sec")
+
+
+# --- Quét + nhận dạng thay đổi ---
+def find_trips(root):
+    """Mọi thư mục chuyến bên dưới root (đệ quy), kể cả chuyến đã gộp (rollup.npz)"""
+    for directory, dirnames, filenames in os.walk(root):
+        if FRAMES_FILE in filenames or ROLLUP_FILE in filenames:
+            dirnames[:] = []  # Không có chuyến lồng trong chuyến
+            yield directory
+
+
+def file_signature(trip_dir):
+    """(kích thước, mtime_ns) của các file trong chuyến – so sánh rẻ, không đọc nội dung"""
+    signature = []
+    for name in TRIP_FILES:
+        try:
+            st = os.stat(os.path.join(trip_dir, name))
+            signature.append([name, st.st_size, st.st_mtime_ns])
+        except OSError:
+            signature.append([name, None, None])
+    return signature
+
+
+def content_digest(trip_dir, block_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    for name in TRIP_FILES:
+        digest.update(name.encode())
+        try:
+            with open(os.path.join(trip_dir, name), "rb") as f:
+                while True:
+                    block = f.read(block_size)
+                    if not block:
+                        break
+                    digest.update(block)
+        except OSError:
+            digest.update(b"\0missing")
+    return digest.hexdigest()
+
+
+# --- Tóm tắt 1 chuyến (chạy trong tiến trình con) ---
+def summarize_trip(trip_dir, known_digest=None):
+    """
+    -> {"digest", "summary"}; summary = None nếu nội dung trùng known_digest (dùng lại cache)
+    hoặc chuyến không có dữ liệu.
+    """
+    digest = content_digest(trip_dir)
+    if digest == known_digest:
+        return {"digest": digest, "summary": None, "unchanged": True}
+
+    from modules.trip_report import load_trip
+    try:
+        trip = load_trip(trip_dir)
+    except ValueError:
+        return {"digest": digest, "summary": None, "unchanged": False}
+    meta, acc, t0, bin_sec = trip["meta"], trip["acc"], trip["t0"], trip["bin_sec"]
+    started_at = meta.get("started_at") or t0
+
+    # Giờ trong ngày (địa phương) của từng khoảng (1 phút)
+    hour_of_bin = [time.localtime(started_at + i * bin_sec).tm_hour for i in range(len(acc["frames"]))]
+    hourly = {name: [0.0] * 24 for name in HOURLY_FIELDS}
+
+    def add_hourly(name, values):
+        target = hourly[name]
+        for hour, value in zip(hour_of_bin, values.tolist()):
+            target[hour] += value
+
+    fps = trip["total"] / (trip["t_end"] - t0) if trip["t_end"] > t0 else 0.0
+    add_hourly("frames", acc["frames"])
+    add_hourly("duration_sec", acc["frames"] / fps if fps else acc["frames"] * 0.0)
+    add_hourly("face_frames", acc["face"])
+    add_hourly("closed_frames", acc["closed"])
+    add_hourly("blinks", acc["blinks"])
+    add_hourly("long_closures", acc["long_closures"])
+    add_hourly("yawns", acc["yawns"])
+
+    def hour_at(t):
+        return time.localtime(started_at + (t - t0)).tm_hour
+
+    alerts_by_type = {}
+    for alert_type, alert in trip["alerts"].items():
+        alerts_by_type[alert_type] = len(alert["intervals"])
+        for start, _ in alert["intervals"]:
+            hourly["alerts"][hour_at(start)] += 1
+    for start, end, state in trip["state_intervals"]:
+        if state == STATE_DANGER:
+            hourly["danger_sec"][hour_at(start)] += end - start
+
+    summary = {
+        "trip": os.path.basename(os.path.normpath(trip_dir)),
+        "driver": meta.get("user_id") or "unknown",
+        "vehicle": meta.get("vehicle_id") or "unknown",
+        "started_at": started_at,
+        "duration_sec": trip["t_end"] - t0,
+        "frames": trip["total"],
+        "face_frames": float(acc["face"].sum()),
+        "closed_frames": float(acc["closed"].sum()),
+        "blinks": float(acc["blinks"].sum()),
+        "long_closures": float(acc["long_closures"].sum()),
+        "yawns": float(acc["yawns"].sum()),
+        "alerts": sum(alerts_by_type.values()),
+        "alerts_by_type": alerts_by_type,
+        "state_sec": trip["state_time"],
+        "fatigue_max": float(acc["fatigue_max"].max()),
+        "hourly": hourly,
+    }
+    return {"digest": digest, "summary": summary, "unchanged": False}
+
+
+# --- Cache ---
+class SummaryCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS trips (
+                path TEXT PRIMARY KEY,
+                signature TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                summary TEXT
+            )
+        """)
+
+    def load(self):
+        """{path: (signature, digest, summary)} của các bản ghi đúng phiên bản tóm tắt hiện tại"""
+        rows = self._conn.execute("SELECT path, signature, digest, summary FROM trips WHERE version = ?",
+                                  (SUMMARY_VERSION,))
+        return {path: (json.loads(sig), digest, json.loads(summary) if summary else None)
+                for path, sig, digest, summary in rows}
+
+    def store(self, path, signature, digest, summary):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO trips (path, signature, digest, version, summary) VALUES (?, ?, ?, ?, ?)",
+            (path, json.dumps(signature), digest, SUMMARY_VERSION,
+             json.dumps(summary, ensure_ascii=False) if summary is not None else None),
+        )
+
+    def prune(self, root, seen):
+        """Xóa bản ghi của chuyến đã bị xóa khỏi đĩa (chỉ trong cây thư mục vừa quét)"""
+        prefix = os.path.join(root, "")
+        stale = [path for (path,) in self._conn.execute("SELECT path FROM trips")
+                 if path.startswith(prefix) and path not in seen]
+        self._conn.executemany("DELETE FROM trips WHERE path = ?", [(p,) for p in stale])
+        return len(stale)
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+
+def collect(root, cache, workers=None, include_active=False, on_progress=None):
+    """Tóm tắt mọi chuyến dưới root (dùng cache). -> (list summary, thống kê)"""
+    root = os.path.abspath(root)
+    cached = cache.load()
+    summaries, pending, seen = [], [], set()
+    stats = {"trips": 0, "cached": 0, "rehashed": 0, "computed": 0, "skipped_active": 0, "empty": 0, "removed": 0}
+    for trip_dir in find_trips(root):
+        seen.add(trip_dir)
+        stats["trips"] += 1
+        signature = file_signature(trip_dir)
+        entry = cached.get(trip_dir)
+        if entry is not None and entry[0] == signature:
+            if entry[2] is not None:
+                summaries.append(entry[2])
+            else:
+                stats["empty"] += 1
+            stats["cached"] += 1
+            continue
+        if not include_active and trip_is_active(trip_dir):
+            stats["skipped_active"] += 1
+            continue
+        pending.append((trip_dir, signature, entry))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(summarize_trip, trip_dir, entry[1] if entry else None): (trip_dir, signature, entry)
+                       for trip_dir, signature, entry in pending}
+            for done, future in enumerate(as_completed(futures), start=1):
+                trip_dir, signature, entry = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:  # 1 chuyến hỏng không làm hỏng cả báo cáo
+                    print(f"⚠️ Lỗi khi đọc chuyến {trip_dir}: {e}")
+                    continue
+                summary = entry[2] if result["unchanged"] else result["summary"]
+                stats["rehashed" if result["unchanged"] else "computed"] += 1
+                cache.store(trip_dir, signature, result["digest"], summary)
+                if summary is not None:
+                    summaries.append(summary)
+                else:
+                    stats["empty"] += 1
+                if on_progress is not None:
+                    on_progress(done, len(pending))
+    stats["removed"] = cache.prune(root, seen)
+    cache.commit()
+    return summaries, stats
+
+
+# --- Gộp ---
+def _new_group():
+    return {"trips": 0, "duration_sec": 0.0, "frames": 0, "face_frames": 0.0, "closed_frames": 0.0, "blinks": 0.0,
+            "long_closures": 0.0, "yawns": 0.0, "alerts": 0, "danger_sec": 0.0, "fatigue_max": 0.0,
+            "alerts_by_type": {}}
+
+
+def _add(group, summary):
+    group["trips"] += 1
+    for name in ("duration_sec", "frames", "face_frames", "closed_frames", "blinks", "long_closures", "yawns",
+                 "alerts"):
+        group[name] += summary[name]
+    group["danger_sec"] += summary["state_sec"].get(STATE_DANGER, 0.0)
+    group["fatigue_max"] = max(group["fatigue_max"], summary["fatigue_max"])
+    for alert_type, count in summary["alerts_by_type"].items():
+        group["alerts_by_type"][alert_type] = group["alerts_by_type"].get(alert_type, 0) + count
+
+
+def _finish(group):
+    """Tổng -> tỉ lệ dễ so sánh giữa các nhóm (chuẩn hóa theo giờ lái)"""
+    hours = group["duration_sec"] / 3600.0
+    face = group["face_frames"]
+    row = {
+        "trips": group["trips"],
+        "hours": round(hours, 2),
+        "face_ratio": round(face / group["frames"], 4) if group["frames"] else None,
+        "perclos": round(group["closed_frames"] / face, 4) if face else None,
+        "blinks_per_min": round(group["blinks"] / (hours * 60), 2) if hours else None,
+        "long_closures_per_hour": round(group["long_closures"] / hours, 2) if hours else None,
+        "yawns_per_hour": round(group["yawns"] / hours, 2) if hours else None,
+        "alerts_per_hour": round(group["alerts"] / hours, 2) if hours else None,
+        "danger_ratio": round(group["danger_sec"] / group["duration_sec"], 4) if group["duration_sec"] else None,
+    }
+    if "fatigue_max" in group:
+        row["fatigue_max"] = round(group["fatigue_max"], 1)
+    if group.get("alerts_by_type"):
+        row["top_alert"] = max(group["alerts_by_type"].items(), key=lambda item: item[1])[0]
+    return row
+
+
+def reduce_summaries(summaries, since=None):
+    """-> {"drivers": {...}, "vehicles": {...}, "hours": [24 hàng], "totals": {...}}"""
+    drivers, vehicles, totals = {}, {}, _new_group()
+    hourly = {name: [0.0] * 24 for name in HOURLY_FIELDS}
+    for summary in summaries:
+        if since is not None and summary["started_at"] < since:
+            continue
+        _add(drivers.setdefault(summary["driver"], _new_group()), summary)
+        _add(vehicles.setdefault(summary["vehicle"], _new_group()), summary)
+        _add(totals, summary)
+        for name in HOURLY_FIELDS:
+            target, values = hourly[name], summary["hourly"][name]
+            for hour in range(24):
+                target[hour] += values[hour]
+    hours = []
+    for hour in range(24):
+        group = {name: hourly[name][hour] for name in HOURLY_FIELDS}
+        group["trips"] = None
+        row = _finish(group)
+        del row["trips"]
+        hours.append({"hour": hour, **row})
+    return {
+        "drivers": {key: _finish(group) for key, group in sorted(drivers.items())},
+        "vehicles": {key: _finish(group) for key, group in sorted(vehicles.items())},
+        "hours": hours,
+        "totals": _finish(totals),
+    }
+
+
+def write_tables(tables, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    paths = [os.path.join(out_dir, "fleet_report.json")]
+    with open(paths[0], "w", encoding="utf-8") as f:
+        json.dump(tables, f, ensure_ascii=False, indent=2)
+    for name, key in (("drivers", "driver"), ("vehicles", "vehicle")):
+        rows = [{key: k, **v} for k, v in tables[name].items()]
+        paths.append(_write_csv(os.path.join(out_dir, f"fleet_{name}.csv"), rows))
+    paths.append(_write_csv(os.path.join(out_dir, "fleet_hours.csv"), tables["hours"]))
+    return paths
+
+
+def _write_csv(path, rows):
+    fieldnames = []
+    for row in rows:
+        fieldnames.extend(k for k in row if k not in fieldnames)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def _print_table(title, key_name, rows):
+    print(f"\n{title}")
+    print(f"{key_name:24} {'chuyến':>6} {'giờ':>8} {'PERCLOS':>8} {'ngáp/h':>7} {'nhắm/h':>7} "
+          f"{'c.báo/h':>8} {'nguy hiểm':>9}")
+
+    def fmt(value, spec):
+        return "—" if value is None else format(value, spec)
+    for key, row in rows:
+        print(f"{str(key)[:24]:24} {fmt(row.get('trips'), 'd'):>6} {row['hours']:8.1f} {fmt(row['perclos'], '.1%'):>8} "
+              f"{fmt(row['yawns_per_hour'], '.1f'):>7} {fmt(row['long_closures_per_hour'], '.1f'):>7} "
+              f"{fmt(row['alerts_per_hour'], '.1f'):>8} {fmt(row['danger_ratio'], '.1%'):>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tổng hợp nhiều chuyến đi theo tài xế / xe / giờ trong ngày")
+    parser.add_argument("root", nargs="?", default=os.path.join("data", "trips"), help="Thư mục gốc chứa các chuyến")
+    parser.add_argument("--workers", type=int, default=None, help="Số tiến trình (mặc định = số lõi CPU)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="File cache tóm tắt (SQLite)")
+    parser.add_argument("--since", help="Chỉ tính chuyến bắt đầu từ ngày này (YYYY-MM-DD)")
+    parser.add_argument("--include-active", action="store_true", help="Tính cả chuyến có thể đang ghi dở")
+    parser.add_argument("--out-dir", default=os.path.join("data", "fleet"), help="Thư mục ghi bảng kết quả")
+    args = parser.parse_args(argv)
+
+    since = time.mktime(time.strptime(args.since, "%Y-%m-%d")) if args.since else None
+    started = time.perf_counter()
+    cache = SummaryCache(args.cache)
+    try:
+        summaries, stats = collect(
+            args.root, cache, workers=args.workers, include_active=args.include_active,
+            on_progress=lambda done, total: print(f"\r⏳ {done}/{total} chuyến mới/đã đổi", end="", flush=True),
+        )
+    finally:
+        cache.close()
+    tables = reduce_summaries(summaries, since=since)
+    paths = write_tables(tables, args.out_dir)
+
+    print(f"\n{stats['trips']} chuyến: {stats['cached']} từ cache, {stats['computed']} tính mới, "
+          f"{stats['rehashed']} đổi mtime nhưng cùng nội dung, {stats['skipped_active']} đang ghi dở, "
+          f"{stats['removed']} đã xóa khỏi đĩa | {time.perf_counter() - started:.1f}s")
+    _print_table("Theo tài xế", "tài xế", tables["drivers"].items())
+    _print_table("Theo xe", "xe", tables["vehicles"].items())
+    _print_table("Theo giờ trong ngày", "giờ", [(f"{row['hour']:02d}h", row) for row in tables["hours"]
+                                                 if row["hours"]])
+    for path in paths:
+        print(f"📝 {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+gaze.py – Ước lượng hướng nhìn từ mống mắt (iris) + góc đầu, phân vùng nhìn theo xe
+
+FaceMesh(refine_landmarks=True) đã tính sẵn 10 điểm mống mắt (468–477) mỗi frame;
+ở đây chỉ lấy 14 điểm cần thiết vào 1 mảng numpy và tính cho CẢ 2 MẮT cùng lúc (vector hóa),
+nên chi phí gần như bằng 0 so với 1 lần suy luận.
+
+- Vị trí mống mắt so với 2 khóe mắt (ngang) và 2 mí (dọc) -> độ lệch [-1, 1]
+- Góc nhìn = góc đầu (yaw/pitch) + độ lệch mắt * biên độ xoay của nhãn cầu
+- Vùng nhìn: "road" / "mirror_left" / "mirror_right" / "mirror_rear" / "phone" / "other",
+  cấu hình theo từng xe trong data/gaze_zones.json (thiếu file -> dùng mặc định bên dưới)
+"""
+
+import json
+import math
+import os
+
+import numpy as np
+
+DEFAULT_ZONES_PATH = os.path.join("data", "gaze_zones.json")
+
+# Thứ tự điểm: [khóe ngoài, khóe trong, mí trên, mí dưới, tâm mống mắt] cho mắt phải rồi mắt trái
+RIGHT_EYE_GAZE_POINTS = [33, 133, 159, 145, 468]
+LEFT_EYE_GAZE_POINTS = [263, 362, 386, 374, 473]
+GAZE_POINTS = np.array([RIGHT_EYE_GAZE_POINTS, LEFT_EYE_GAZE_POINTS])  # (2 mắt, 5 điểm)
+REFINED_LANDMARK_COUNT = 478  # Có điểm mống mắt chỉ khi refine_landmarks=True
+
+# Biên độ xoay của nhãn cầu khi mống mắt chạm khóe/mí (độ)
+EYE_YAW_RANGE_DEG = 35.0
+EYE_PITCH_RANGE_DEG = 25.0
+
+# Vùng nhìn mặc định (góc nhìn tuyệt đối, độ). Xét theo thứ tự, vùng đầu tiên khớp được chọn.
+DEFAULT_GAZE_ZONES = [
+    {"name": "road", "yaw": [-20, 20], "pitch": [-12, 15]},
+    {"name": "mirror_rear", "yaw": [-5, 30], "pitch": [15, 35]},
+    {"name": "mirror_left", "yaw": [-70, -20], "pitch": [-15, 15]},
+    {"name": "mirror_right", "yaw": [20, 70], "pitch": [-15, 15]},
+    {"name": "phone", "yaw": [-40, 40], "pitch": [-70, -12]},
+]
+
+
+def load_zones(path=DEFAULT_ZONES_PATH):
+    """Đọc vùng nhìn của xe: list {"name", "yaw": [min, max], "pitch": [min, max]}"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            zones = json.load(f)
+    except (OSError, ValueError):
+        return list(DEFAULT_GAZE_ZONES)
+    return zones.get("zones", zones) if isinstance(zones, dict) else zones
+
+
+def classify_zone(gaze_yaw, gaze_pitch, zones):
+    for zone in zones:
+        yaw_min, yaw_max = zone["yaw"]
+        pitch_min, pitch_max = zone["pitch"]
+        if yaw_min <= gaze_yaw <= yaw_max and pitch_min <= gaze_pitch <= pitch_max:
+            return zone["name"]
+    return "other"
+
+
+class GazeEstimator:
+    def __init__(self, zones=None):
+        self.zones = zones if zones is not None else load_zones()
+
+    def iris_offsets(self, landmarks):
+        """
+        Độ lệch mống mắt (ngang, dọc) trung bình 2 mắt, mỗi giá trị trong [-1, 1].
+        landmarks: danh sách landmark của FaceMesh (có .x, .y). None nếu không có điểm mống mắt.
+        """
+        if len(landmarks) < REFINED_LANDMARK_COUNT:
+            return None
+        # (2, 5, 2): 2 mắt x 5 điểm x (x, y) – chỉ 10 lần truy cập thuộc tính Python
+        pts = np.array([[(landmarks[i].x, landmarks[i].y) for i in eye] for eye in GAZE_POINTS])
+        outer, inner, upper, lower, iris = (pts[:, k] for k in range(5))
+
+        # Chiếu tâm mống mắt lên trục khóe ngoài -> khóe trong (0 = khóe ngoài, 1 = khóe trong)
+        axis = inner - outer
+        axis_len2 = np.einsum("ij,ij->i", axis, axis)
+        horizontal = np.einsum("ij,ij->i", iris - outer, axis) / np.maximum(axis_len2, 1e-12)
+        # Mí trên -> mí dưới (0 = sát mí trên, 1 = sát mí dưới)
+        lid = lower - upper
+        lid_len2 = np.einsum("ij,ij->i", lid, lid)
+        vertical = np.einsum("ij,ij->i", iris - upper, lid) / np.maximum(lid_len2, 1e-12)
+
+        # Hai mắt đối xứng: khóe ngoài mắt phải ở bên trái ảnh và ngược lại -> đổi dấu mắt trái
+        h = (horizontal - 0.5) * 2.0
+        h_offset = float(np.clip((h[0] - h[1]) / 2.0, -1.0, 1.0))
+        v_offset = float(np.clip(np.mean(vertical - 0.5) * 2.0, -1.0, 1.0))
+        return h_offset, v_offset
+
+    def estimate(self, landmarks, head_pitch, head_yaw):
+        """
+        Trả về dict gaze_yaw, gaze_pitch (độ), gaze_vector (x, y, z đơn vị), gaze_zone
+        head_pitch / head_yaw: góc đầu theo đúng nghĩa (head_motion.head_angles), không phải góc thô của solvePnP
+        """
+        offsets = self.iris_offsets(landmarks)
+        if offsets is None:
+            return {"gaze_yaw": None, "gaze_pitch": None, "gaze_vector": None, "gaze_zone": None}
+        h_offset, v_offset = offsets
+        gaze_yaw = head_yaw + h_offset * EYE_YAW_RANGE_DEG
+        # Ảnh: y hướng xuống -> mống mắt thấp (v > 0) = nhìn xuống (pitch âm)
+        gaze_pitch = head_pitch - v_offset * EYE_PITCH_RANGE_DEG
+
+        yaw_rad = math.radians(gaze_yaw)
+        pitch_rad = math.radians(gaze_pitch)
+        vector = (
+            math.sin(yaw_rad) * math.cos(pitch_rad),
+            math.sin(pitch_rad),
+            math.cos(yaw_rad) * math.cos(pitch_rad),
+        )
+        return {
+            "gaze_yaw": gaze_yaw,
+            "gaze_pitch": gaze_pitch,
+            "gaze_vector": vector,
+            "gaze_zone": classify_zone(gaze_yaw, gaze_pitch, self.zones),
+        }
@@ -0,0 +1,120 @@
+"""
+head_motion.py – Gật gù (ngủ gật) và mất tập trung (không nhìn đường) từ góc đầu
+
+Dùng lại góc đầu mà FaceProcessor đã tính mỗi frame -> KHÔNG tốn thêm suy luận.
+Góc Euler thô của FaceProcessor._get_head_pose KHÔNG khớp tên trục (mô hình 3D có y hướng lên,
+ảnh có y hướng xuống nên mặt nhìn thẳng camera đã là phép xoay 180 độ quanh trục x):
+- "roll" thô  = gật / ngẩng, quanh ±180 khi nhìn thẳng (nhảy -180 <-> 180)
+- "pitch" thô = quay trái / phải
+- "yaw" thô   = nghiêng đầu trong mặt phẳng ảnh
+-> head_angles() đổi sang (pitch, yaw) theo đúng nghĩa trước khi dùng.
+Xử lý tín hiệu tăng dần, O(1) mỗi frame:
+- Tư thế trung tính: trung bình mũ (EMA) chậm của pitch/yaw, chỉ cập nhật khi đầu đang ở gần
+  tư thế đó -> tự thích nghi với vị trí gắn camera, có thể đặt lại bằng nút "Cân bằng"
+- Gật gù: pitch giảm nhanh quá NOD_DEPTH_DEG rồi hồi lại trong NOD_MAX_SEC
+- Không nhìn đường: |yaw| hoặc |pitch| lệch quá giới hạn liên tục (thời lượng do AlertEngine xét)
+Chỉ phát hiện từng lần gật; đếm số lần gật trong cửa sổ thời gian do FatigueTracker (fatigue.py) đảm nhận.
+"""
+
+# "roll" thô khi nhìn thẳng camera (mốc khi chưa bấm "Cân bằng")
+FRONTAL_ROLL_DEG = 180.0
+
+
+def wrap_deg(angle):
+    """Đưa góc (độ) về [-180, 180)"""
+    return (angle + 180.0) % 360.0 - 180.0
+
+
+def head_angles(raw_pitch, raw_roll, roll_offset=FRONTAL_ROLL_DEG):
+    """
+    Góc thô của FaceProcessor -> (pitch, yaw) theo đúng nghĩa, độ; nhìn thẳng (lúc cân bằng) = (0, 0).
+    pitch: gật / ngẩng = roll thô trừ mốc đã cân bằng, bỏ bước nhảy ±180; nhìn xuống = âm
+    yaw: quay trái / phải = pitch thô đổi dấu; quay về bên phải ảnh = dương (cùng chiều độ lệch mống mắt)
+    """
+    return -wrap_deg(raw_roll - roll_offset), -raw_pitch
+
+
+class HeadMotionDetector:
+    # Gật gù: lệch xuống >= 12 độ trong <= 0.6s, hồi về trong vòng 2s tính từ lúc bắt đầu
+    NOD_DEPTH_DEG = 12.0
+    NOD_RECOVER_DEG = 5.0
+    NOD_DROP_MAX_SEC = 0.6
+    NOD_MAX_SEC = 2.0
+    # Hằng số thời gian (giây) của EMA tư thế trung tính
+    NEUTRAL_TAU_SEC = 20.0
+    MAX_FRAME_GAP_SEC = 0.5
+
+    def __init__(self, yaw_limit_deg=30.0, pitch_limit_deg=20.0):
+        self.yaw_limit_deg = yaw_limit_deg
+        self.pitch_limit_deg = pitch_limit_deg
+        self.neutral_pitch = None
+        self.neutral_yaw = None
+        self.last_nod_time = None
+        self.off_road_since = None
+        self._last_time = None
+        self._drop_start = None   # Lúc pitch bắt đầu rời vùng trung tính (đi xuống)
+        self._nod_bottom = None   # Lúc pitch chạm đáy NOD_DEPTH_DEG (chờ hồi lại)
+
+    def reset(self):
+        self.__init__(self.yaw_limit_deg, self.pitch_limit_deg)
+
+    def calibrate(self, pitch, yaw):
+        """Lấy tư thế hiện tại làm trung tính"""
+        self.neutral_pitch = pitch
+        self.neutral_yaw = yaw
+
+    def face_lost(self):
+        self._last_time = None
+        self._drop_start = None
+        self._nod_bottom = None
+        self.off_road_since = None
+
+    def update(self, now, pitch, yaw):
+        """Gọi mỗi frame có mặt. Trả về (nod: bool – vừa phát hiện 1 lần gật, off_road_sec)"""
+        if self.neutral_pitch is None:
+            self.calibrate(pitch, yaw)
+        dt = 0.0 if self._last_time is None else now - self._last_time
+        self._last_time = now
+
+        d_pitch = pitch - self.neutral_pitch
+        d_yaw = yaw - self.neutral_yaw
+
+        # 1. Gật gù
+        nod = False
+        if self._nod_bottom is None:
+            if d_pitch > -self.NOD_RECOVER_DEG:
+                self._drop_start = None
+            elif self._drop_start is None:
+                self._drop_start = now
+            # Cúi đầu chậm (nhìn xuống) thì _drop_start đã quá cũ -> không tính là gật
+            if (self._drop_start is not None and d_pitch <= -self.NOD_DEPTH_DEG
+                    and now - self._drop_start <= self.NOD_DROP_MAX_SEC):
+                self._nod_bottom = self._drop_start
+        elif d_pitch > -self.NOD_RECOVER_DEG:
+            if now - self._nod_bottom <= self.NOD_MAX_SEC:
+                nod = True
+                self.last_nod_time = now
+            self._nod_bottom = None
+            self._drop_start = None
+        elif now - self._nod_bottom > self.NOD_MAX_SEC:
+            # Cúi lâu không ngẩng lên -> để phần "không nhìn đường" xử lý
+            # (giữ _drop_start cũ để không bị tính thành 1 lần gật mới)
+            self._nod_bottom = None
+
+        # 2. Không nhìn đường
+        off_road = abs(d_yaw) > self.yaw_limit_deg or abs(d_pitch) > self.pitch_limit_deg
+        if off_road:
+            if self.off_road_since is None:
+                self.off_road_since = now
+        else:
+            self.off_road_since = None
+        off_road_sec = now - self.off_road_since if self.off_road_since is not None else 0.0
+
+        # 3. Cập nhật tư thế trung tính (chỉ khi đầu đang ở gần tư thế đó)
+        if (0 < dt <= self.MAX_FRAME_GAP_SEC and abs(d_pitch) < self.NOD_RECOVER_DEG
+                and abs(d_yaw) < self.NOD_RECOVER_DEG):
+            alpha = dt / (self.NEUTRAL_TAU_SEC + dt)
+            self.neutral_pitch += alpha * d_pitch
+            self.neutral_yaw += alpha * d_yaw
+
+        return nod, off_road_sec
@@ -0,0 +1,186 @@
+"""
+head_pose_check.py – Kiểm tra hồi quy: góc đầu đúng trục trên các tư thế giả lập bằng solvePnP
+
+Chiếu mô hình 3D của FaceProcessor (POSE_MODEL_POINTS) qua camera ảo ở các tư thế đã biết
+(cúi / ngẩng, quay trái / phải, nghiêng, camera gắn lệch), chạy đúng FaceProcessor._get_head_pose
+rồi head_angles(): góc ra phải khớp tư thế đã tạo. Kèm HeadMotionDetector trên chuỗi tư thế
+(gật 1 lần, quay đầu lâu, nghiêng đầu) và vùng nhìn của GazeEstimator (chiếu cả khóe mắt / mí / mống mắt).
+Cần OpenCV, không cần camera / MediaPipe.
+    python -m modules.head_pose_check
+"""
+
+import argparse
+import math
+import sys
+
+import numpy as np
+
+from modules import face_processor
+from modules.face_processor import POSE_LANDMARKS, POSE_MODEL_POINTS, FaceProcessor
+from modules.gaze import DEFAULT_GAZE_ZONES, GAZE_POINTS, GazeEstimator
+from modules.head_motion import HeadMotionDetector, head_angles
+
+FRAME_W, FRAME_H = 640, 480
+FACE_DISTANCE = 1500.0   # Cùng đơn vị với POSE_MODEL_POINTS
+LANDMARK_COUNT = 478
+TOLERANCE_DEG = 2.5      # Landmark bị làm tròn về pixel trong _get_head_pose
+FPS = 30.0
+
+# Điểm mắt cho GazeEstimator (cùng hệ tọa độ với POSE_MODEL_POINTS), mống mắt ở giữa = nhìn theo hướng đầu.
+# Thứ tự như gaze.GAZE_POINTS: [khóe ngoài, khóe trong, mí trên, mí dưới, tâm mống mắt]; mắt 33 ở bên trái ảnh
+EYE_MODEL_POINTS = [
+    [(-225.0, 170.0, -135.0), (-75.0, 170.0, -135.0), (-150.0, 190.0, -125.0), (-150.0, 150.0, -125.0),
+     (-150.0, 170.0, -125.0)],
+    [(225.0, 170.0, -135.0), (75.0, 170.0, -135.0), (150.0, 190.0, -125.0), (150.0, 150.0, -125.0),
+     (150.0, 170.0, -125.0)],
+]
+
+
+class _Landmark:
+    __slots__ = ("x", "y")
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+def _rotation(axis, deg):
+    vector = np.zeros(3)
+    vector["xyz".index(axis)] = math.radians(deg)
+    return face_processor.cv2.Rodrigues(vector)[0]
+
+
+def project_pose(pitch=0.0, yaw=0.0, tilt=0.0, points=POSE_MODEL_POINTS):
+    """
+    Tọa độ ảnh (pixel) của `points` (hệ mô hình 3D) khi đầu ở tư thế cho trước (độ):
+    pitch > 0 = ngẩng, yaw > 0 = quay về bên phải ảnh, tilt = nghiêng trong mặt phẳng ảnh
+    """
+    cv2 = face_processor.cv2
+    # Mặt nhìn thẳng camera: y mô hình hướng lên, y ảnh hướng xuống -> xoay 180 độ quanh x
+    rotation = _rotation("x", 180.0) @ _rotation("y", yaw) @ _rotation("x", -pitch) @ _rotation("z", tilt)
+    camera_matrix = np.array([[FRAME_W, 0, FRAME_W / 2], [0, FRAME_W, FRAME_H / 2], [0, 0, 1]], dtype="double")
+    image_points, _ = cv2.projectPoints(
+        np.asarray(points, dtype="double"), cv2.Rodrigues(rotation)[0],
+        np.array([0.0, 0.0, FACE_DISTANCE]), camera_matrix, np.zeros((4, 1))
+    )
+    return image_points.reshape(-1, 2)
+
+
+def synthetic_landmarks(pitch=0.0, yaw=0.0, tilt=0.0):
+    """Danh sách landmark kiểu FaceMesh (x, y tỉ lệ 0..1), chỉ các điểm POSE_LANDMARKS + GAZE_POINTS là có nghĩa"""
+    landmarks = [_Landmark(0.5, 0.5) for _ in range(LANDMARK_COUNT)]
+    indices = list(POSE_LANDMARKS) + GAZE_POINTS.ravel().tolist()
+    points = np.vstack([POSE_MODEL_POINTS, np.reshape(EYE_MODEL_POINTS, (-1, 3))])
+    for index, (x, y) in zip(indices, project_pose(pitch, yaw, tilt, points)):
+        landmarks[index] = _Landmark(x / FRAME_W, y / FRAME_H)
+    return landmarks
+
+
+def _raw_pose(processor, frame, pitch=0.0, yaw=0.0, tilt=0.0):
+    return processor._get_head_pose(frame, synthetic_landmarks(pitch, yaw, tilt))
+
+
+def check_angles(processor, frame):
+    """[(tên, đạt?, chi tiết)] góc (pitch, yaw) sau head_angles() so với tư thế đã tạo"""
+    cases = [
+        ("nhìn thẳng", {}, (0.0, 0.0)),
+        ("cúi 20", {"pitch": -20.0}, (-20.0, 0.0)),
+        ("ngẩng 15", {"pitch": 15.0}, (15.0, 0.0)),
+        ("quay phải 30", {"yaw": 30.0}, (0.0, 30.0)),
+        ("quay trái 30", {"yaw": -30.0}, (0.0, -30.0)),
+        ("nghiêng 20", {"tilt": 20.0}, (0.0, 0.0)),
+        ("cúi 20 + quay phải 25", {"pitch": -20.0, "yaw": 25.0}, (-20.0, 25.0)),
+    ]
+    results = []
+    for name, pose, expected in cases:
+        raw_pitch, _, raw_roll = _raw_pose(processor, frame, **pose)
+        got = head_angles(raw_pitch, raw_roll)
+        ok = all(abs(g - e) <= TOLERANCE_DEG for g, e in zip(got, expected))
+        results.append((name, ok, f"pitch/yaw = {got[0]:.1f}/{got[1]:.1f}, mong đợi {expected[0]:.0f}/{expected[1]:.0f}"))
+
+    # Camera gắn thấp (nhìn thẳng đường = ngẩng 10 so với camera): cân bằng rồi cúi 20
+    raw_pitch, _, roll_offset = _raw_pose(processor, frame, pitch=10.0)
+    raw_pitch, _, raw_roll = _raw_pose(processor, frame, pitch=-10.0)
+    got = head_angles(raw_pitch, raw_roll, roll_offset)
+    results.append(("cân bằng ở ngẩng 10, cúi 20", abs(got[0] + 20.0) <= TOLERANCE_DEG,
+                    f"pitch = {got[0]:.1f}, mong đợi -20"))
+    return results
+
+
+def check_gaze(processor, frame):
+    """[(tên, đạt?, chi tiết)] vùng nhìn mặc định (DEFAULT_GAZE_ZONES) khi chỉ quay / cúi đầu"""
+    gaze = GazeEstimator(DEFAULT_GAZE_ZONES)
+    cases = [
+        ("nhìn đường", {}, "road"),
+        ("gương phải (quay phải 40)", {"yaw": 40.0}, "mirror_right"),
+        ("gương trái (quay trái 40)", {"yaw": -40.0}, "mirror_left"),
+        ("gương chiếu hậu (ngẩng 22, phải 10)", {"pitch": 22.0, "yaw": 10.0}, "mirror_rear"),
+        ("điện thoại (cúi 30)", {"pitch": -30.0}, "phone"),
+        ("nghiêng 20 vẫn là đường", {"tilt": 20.0}, "road"),
+    ]
+    results = []
+    for name, pose, expected in cases:
+        landmarks = synthetic_landmarks(**pose)
+        raw_pitch, _, raw_roll = processor._get_head_pose(frame, landmarks)
+        result = gaze.estimate(landmarks, *head_angles(raw_pitch, raw_roll))
+        results.append((name, result["gaze_zone"] == expected,
+                        f"{result['gaze_zone']} (yaw {result['gaze_yaw']:.1f}, pitch {result['gaze_pitch']:.1f})"))
+    return results
+
+
+def _run_motion(processor, frame, poses, detector=None):
+    """poses: [(giây, pitch, yaw, tilt)] nội suy tuyến tính -> (số lần gật, off_road_sec lớn nhất)"""
+    detector = detector or HeadMotionDetector()
+    nods, off_road_max = 0, 0.0
+    end = poses[-1][0]
+    for i in range(int(end * FPS) + 1):
+        t = i / FPS
+        k = next(k for k in range(1, len(poses)) if t <= poses[k][0])
+        (t0, *a), (t1, *b) = poses[k - 1], poses[k]
+        w = (t - t0) / (t1 - t0) if t1 > t0 else 1.0
+        pitch, yaw, tilt = (x + (y - x) * w for x, y in zip(a, b))
+        raw_pitch, _, raw_roll = _raw_pose(processor, frame, pitch, yaw, tilt)
+        nod, off_road_sec = detector.update(t, *head_angles(raw_pitch, raw_roll))
+        nods += nod
+        off_road_max = max(off_road_max, off_road_sec)
+    return nods, off_road_max
+
+
+def check_motion(processor, frame):
+    """[(tên, đạt?, chi tiết)] HeadMotionDetector trên chuỗi tư thế chiếu qua solvePnP"""
+    results = []
+    nods, off_road = _run_motion(processor, frame, [(0, 0, 0, 0), (2.0, 0, 0, 0), (2.3, -18, 0, 0),
+                                                    (2.6, 0, 0, 0), (4.0, 0, 0, 0)])
+    results.append(("gật 1 lần", nods == 1 and off_road == 0.0, f"{nods} lần gật, off_road {off_road:.1f}s"))
+    nods, off_road = _run_motion(processor, frame, [(0, 0, 0, 0), (2.0, 0, 0, 0), (2.3, 0, 40, 0),
+                                                    (4.5, 0, 40, 0)])
+    results.append(("quay phải 40 trong 2s", nods == 0 and off_road >= 1.8,
+                    f"{nods} lần gật, off_road {off_road:.1f}s"))
+    nods, off_road = _run_motion(processor, frame, [(0, 0, 0, 0), (2.0, 0, 0, 0), (2.3, 0, 0, 25),
+                                                    (4.0, 0, 0, 25), (4.3, 0, 0, 0)])
+    results.append(("nghiêng 25 (không phải gật / quay)", nods == 0 and off_road == 0.0,
+                    f"{nods} lần gật, off_road {off_road:.1f}s"))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kiểm tra trục góc đầu (solvePnP) trên tư thế giả lập")
+    parser.parse_args(argv)
+    try:
+        face_processor._import_backends()
+    except ImportError:
+        print("Cần OpenCV (pip install opencv-python)")
+        return 2
+    processor = FaceProcessor.__new__(FaceProcessor)  # Chỉ dùng _get_head_pose, không tạo backend
+    frame = np.zeros((FRAME_H, FRAME_W, 3), dtype=np.uint8)
+
+    failed = 0
+    for name, ok, detail in check_angles(processor, frame) + check_motion(processor, frame) + check_gaze(processor, frame):
+        failed += not ok
+        print(f"{'OK ' if ok else 'SAI'} {name:<36} {detail}")
+    print(f"\n{'Tất cả đạt' if not failed else f'{failed} kiểm tra SAI'}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
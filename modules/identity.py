@@ -0,0 +1,185 @@
+"""
+identity.py – Xác minh tài xế bằng "chữ ký" hình học từ landmark FaceMesh đã có sẵn
+
+Không chạy thêm mô hình nào: dùng lại landmark của frame hiện tại.
+- Chữ ký: khoảng cách 3D giữa từng cặp điểm CỨNG trên mặt (khóe mắt, sống mũi, cằm, gò má, chân mày...),
+  chia cho khoảng cách 2 khóe mắt ngoài -> không phụ thuộc vị trí / khoảng cách tới camera.
+  Bỏ các điểm mí mắt / môi (thay đổi theo biểu cảm). Trung bình nhiều frame nhìn thẳng để giảm nhiễu.
+- Chữ ký đã đăng ký được xếp sẵn thành 1 ma trận numpy (chỉ dựng lại khi có đăng ký mới)
+  -> tra láng giềng gần nhất = 1 phép tính vector hóa trên mọi chữ ký của mọi tài xế.
+- Chỉ xác minh lại mỗi `interval_sec` giây hoặc sau khi mất mặt lâu hơn `face_lost_gap_sec`
+  (đổi tài xế). Ngoài lúc đó chi phí mỗi frame chỉ là vài phép so sánh.
+"""
+
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+DEFAULT_IDENTITY_PATH = os.path.join("data", "identity_signatures.json")
+
+# Điểm ít bị ảnh hưởng bởi biểu cảm (đánh số MediaPipe Face Mesh)
+SIGNATURE_POINTS = (
+    33, 133, 362, 263,      # Khóe mắt (ngoài/trong, 2 bên)
+    168, 6, 197, 1, 4,      # Sống mũi -> chóp mũi
+    98, 327,                # Cánh mũi
+    10, 152,                # Trán, cằm
+    234, 454,               # 2 bên gò má
+    70, 300,                # Đầu chân mày
+    127, 356,               # Thái dương
+)
+_OUTER_EYE = (SIGNATURE_POINTS.index(33), SIGNATURE_POINTS.index(263))
+_PAIRS = np.triu_indices(len(SIGNATURE_POINTS), k=1)
+
+# Chỉ lấy mẫu khi gần nhìn thẳng (chữ ký ổn định hơn)
+FRONTAL_LIMIT_DEG = 15.0
+
+
+def signature(landmarks):
+    """Vector chữ ký của 1 frame, None nếu backend không có đủ điểm"""
+    try:
+        pts = np.array([(landmarks[i].x, landmarks[i].y, getattr(landmarks[i], "z", 0.0))
+                        for i in SIGNATURE_POINTS])
+    except (KeyError, IndexError):
+        return None
+    diff = pts[:, None, :] - pts[None, :, :]
+    dist = np.sqrt(np.einsum("ijk,ijk->ij", diff, diff))
+    scale = dist[_OUTER_EYE]
+    if scale <= 1e-9:
+        return None
+    return dist[_PAIRS] / scale
+
+
+class IdentityStore:
+    """Chữ ký đã đăng ký: {"points": [...], "drivers": {driver_id: [[...], ...]}}"""
+
+    def __init__(self, path=DEFAULT_IDENTITY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._drivers = {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            # Chữ ký tạo bằng bộ điểm khác -> không so sánh được, bỏ qua
+            if tuple(data.get("points", ())) == SIGNATURE_POINTS:
+                self._drivers = data.get("drivers", {})
+        except (OSError, ValueError):
+            pass
+        self._index = None
+
+    def enrolled(self, driver_id):
+        return bool(self._drivers.get(driver_id))
+
+    def add(self, driver_id, vector):
+        with self._lock:
+            self._drivers.setdefault(driver_id, []).append([round(float(v), 5) for v in vector])
+            self._index = None
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"points": SIGNATURE_POINTS, "drivers": self._drivers}, f)
+            os.replace(tmp_path, self.path)
+
+    def _build_index(self):
+        ids, rows = [], []
+        for driver_id, vectors in self._drivers.items():
+            for vector in vectors:
+                ids.append(driver_id)
+                rows.append(vector)
+        matrix = np.array(rows, dtype=np.float64) if rows else np.empty((0, len(_PAIRS[0])))
+        self._index = (ids, matrix)
+        return self._index
+
+    def nearest(self, vector):
+        """(driver_id, khoảng cách) của chữ ký gần nhất; (None, inf) nếu chưa có ai đăng ký"""
+        ids, matrix = self._index or self._build_index()
+        if not ids:
+            return None, math.inf
+        # Sai lệch tương đối trung bình trên mọi cặp điểm
+        distances = np.abs(matrix - vector).mean(axis=1) / np.abs(vector).mean()
+        best = int(distances.argmin())
+        return ids[best], float(distances[best])
+
+
+class IdentityVerifier:
+    def __init__(self, store, driver_id, interval_sec=300.0, face_lost_gap_sec=5.0,
+                 samples=15, threshold=0.05):
+        self.store = store
+        self.driver_id = driver_id
+        self.interval_sec = interval_sec
+        self.face_lost_gap_sec = face_lost_gap_sec
+        self.samples = samples
+        self.threshold = threshold
+
+        self.match = None        # True / False / None (chưa xác minh / chưa đăng ký)
+        self.matched_id = None
+        self.distance = None
+        self.enrolling = False
+        self._enroll_samples = 30
+        self._collected = []
+        self._next_check = 0.0
+        self._last_face_time = None
+
+    def start_enrollment(self, samples=30):
+        """Đăng ký chữ ký cho tài xế hiện tại từ `samples` frame nhìn thẳng tiếp theo"""
+        self._collected = []
+        self._enroll_samples = samples
+        self.enrolling = True
+
+    def reset(self):
+        self.match = self.matched_id = self.distance = None
+        self._collected = []
+        self._next_check = 0.0
+        self._last_face_time = None
+
+    def observe(self, now, landmarks, pitch=0.0, yaw=0.0):
+        """
+        Gọi mỗi frame (landmarks = None khi không thấy mặt)
+        pitch / yaw: góc đầu đúng trục gật / quay (head_motion.head_angles), không phải góc thô của solvePnP
+        """
+        if landmarks is None:
+            return
+        if self._last_face_time is not None and now - self._last_face_time > self.face_lost_gap_sec:
+            # Mất mặt lâu -> có thể đã đổi người lái: xác minh lại ngay
+            self.match = self.matched_id = self.distance = None
+            self._collected = []
+            self._next_check = now
+        self._last_face_time = now
+
+        if not self.enrolling and (now < self._next_check or not self.store.enrolled(self.driver_id)):
+            return
+        if abs(pitch) > FRONTAL_LIMIT_DEG or abs(yaw) > FRONTAL_LIMIT_DEG:
+            return
+        vector = signature(landmarks)
+        if vector is None:
+            self._next_check = now + self.interval_sec  # Backend không đủ điểm
+            return
+        self._collected.append(vector)
+
+        if self.enrolling:
+            if len(self._collected) >= self._enroll_samples:
+                self.store.add(self.driver_id, np.mean(self._collected, axis=0))
+                print(f"🪪 Đã đăng ký khuôn mặt cho tài xế {self.driver_id}")
+                self.enrolling = False
+                self._collected = []
+                self._next_check = now  # Xác minh ngay bằng chữ ký vừa đăng ký
+        elif len(self._collected) >= self.samples:
+            self._verify(np.mean(self._collected, axis=0))
+            self._collected = []
+            self._next_check = now + self.interval_sec
+
+    def _verify(self, vector):
+        if not self.store.enrolled(self.driver_id):
+            self.match, self.matched_id, self.distance = None, None, None
+            return
+        nearest_id, distance = self.store.nearest(vector)
+        self.matched_id = nearest_id
+        self.distance = distance
+        self.match = nearest_id == self.driver_id and distance <= self.threshold
+
+    def fill(self, data):
+        data["identity_match"] = self.match
+        data["identity_id"] = self.matched_id
+        data["identity_distance"] = self.distance
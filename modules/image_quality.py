@@ -0,0 +1,100 @@
+"""
+image_quality.py – Kiểm tra chất lượng ảnh TRƯỚC khi chạy FaceMesh (cổng tiền suy luận)
+
+Trên ảnh thu nhỏ (mặc định rộng 160px, xám) đo:
+- Độ sáng (trung bình), độ tương phản (độ lệch chuẩn), độ nét (phương sai Laplacian)
+Kết luận 1 trong các trạng thái:
+- "ok"       : dùng được
+- "blocked"  : ống kính bị che: ảnh gần như phẳng tuyệt đối (dù sáng hay tối — tay che ống kính
+               vẫn có độ sáng ~10-20), hoặc đủ sáng nhưng gần như đồng màu
+- "dark"     : cabin quá tối nhưng ảnh vẫn còn cấu trúc
+- "blurred"  : ống kính mờ/bẩn, mất nét
+Khi trạng thái không phải "ok" -> bỏ qua suy luận (không tốn FaceMesh, không báo nhầm "không thấy tài xế").
+Ảnh hơi tối/nhạt -> tăng tương phản thích nghi (CLAHE) chỉ khi cần, mức tăng theo độ thiếu tương phản.
+Chi phí: vài trăm micro-giây, chỉ là phần nhỏ của 1 lần suy luận.
+"""
+
+from collections import namedtuple
+
+QualityReport = namedtuple("QualityReport", "state brightness contrast sharpness enhance")
+
+STATE_OK = "ok"
+STATE_BLOCKED = "blocked"
+STATE_DARK = "dark"
+STATE_BLURRED = "blurred"
+
+
+class ImageQualityGate:
+    # Ngưỡng trên thang xám 0..255 (ảnh thu nhỏ)
+    BLOCKED_FLAT_CONTRAST = 2.0  # Phẳng tuyệt đối (chỉ còn nhiễu) -> bị che, kể cả khi tối
+    BLOCKED_CONTRAST = 6.0      # Ảnh đủ sáng mà gần như đồng màu -> bị che
+    DARK_BRIGHTNESS = 35.0
+    BLUR_SHARPNESS = 20.0       # Phương sai Laplacian
+    BLUR_MIN_CONTRAST = 20.0    # Chỉ xét mờ khi ảnh đủ tương phản (ảnh tối vốn "mờ")
+    # Cần tăng tương phản khi dưới các mức này
+    ENHANCE_BRIGHTNESS = 80.0
+    ENHANCE_CONTRAST = 40.0
+
+    def __init__(self, sample_width=160, min_bad_frames=3):
+        self.sample_width = sample_width
+        self.min_bad_frames = min_bad_frames  # Trạng thái xấu phải kéo dài N frame mới công nhận
+        self.state = STATE_OK
+        self._pending_state = STATE_OK
+        self._pending_count = 0
+        self._clahe_cache = {}
+
+    def _measure(self, frame):
+        import cv2
+        h, w = frame.shape[:2]
+        scale = self.sample_width / float(w)
+        small = cv2.resize(frame, (self.sample_width, max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        mean, std = cv2.meanStdDev(gray)
+        sharpness = cv2.Laplacian(gray, cv2.CV_32F).var()
+        return float(mean[0][0]), float(std[0][0]), float(sharpness)
+
+    def _classify(self, brightness, contrast, sharpness):
+        if contrast < self.BLOCKED_FLAT_CONTRAST:
+            return STATE_BLOCKED
+        # Cabin tối ban đêm vẫn còn chút cấu trúc (tương phản thấp) -> "tối", không phải "bị che"
+        if brightness < self.DARK_BRIGHTNESS:
+            return STATE_DARK
+        if contrast < self.BLOCKED_CONTRAST:
+            return STATE_BLOCKED
+        if contrast >= self.BLUR_MIN_CONTRAST and sharpness < self.BLUR_SHARPNESS:
+            return STATE_BLURRED
+        return STATE_OK
+
+    def assess(self, frame):
+        brightness, contrast, sharpness = self._measure(frame)
+        raw_state = self._classify(brightness, contrast, sharpness)
+
+        # Hết xấu -> công nhận ngay; xấu -> phải lặp lại min_bad_frames lần (tránh nhấp nháy)
+        if raw_state == STATE_OK:
+            self.state = self._pending_state = STATE_OK
+            self._pending_count = 0
+        else:
+            if raw_state != self._pending_state:
+                self._pending_state = raw_state
+                self._pending_count = 0
+            self._pending_count += 1
+            if self._pending_count >= self.min_bad_frames:
+                self.state = raw_state
+
+        enhance = self.state == STATE_OK and (
+            brightness < self.ENHANCE_BRIGHTNESS or contrast < self.ENHANCE_CONTRAST
+        )
+        return QualityReport(self.state, brightness, contrast, sharpness, enhance)
+
+    def enhance(self, frame, report):
+        """CLAHE trên kênh độ sáng (Y); ảnh càng nhạt thì clip limit càng cao"""
+        import cv2
+        lack = 1.0 - min(report.contrast / self.ENHANCE_CONTRAST, 1.0)
+        clip_limit = round(1.5 + 2.5 * lack, 1)
+        clahe = self._clahe_cache.get(clip_limit)
+        if clahe is None:
+            clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(8, 8))
+            self._clahe_cache[clip_limit] = clahe
+        ycrcb = cv2.cvtColor(frame, cv2.COLOR_BGR2YCrCb)
+        ycrcb[:, :, 0] = clahe.apply(ycrcb[:, :, 0])
+        return cv2.cvtColor(ycrcb, cv2.COLOR_YCrCb2BGR)
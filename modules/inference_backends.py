@@ -0,0 +1,379 @@
+"""
+inference_backends.py – Các backend suy luận landmark khuôn mặt (CPU) dùng chung 1 giao diện
+
+FaceProcessor chỉ cần: process(ảnh RGB) -> danh sách landmark đánh chỉ số THEO MediaPipe Face Mesh
+(phần tử có .x, .y chuẩn hóa 0..1), hoặc None nếu không thấy mặt. Nhờ vậy code tính EAR/MAR/góc đầu
+không phải đổi khi thay backend.
+- "mediapipe":  MediaPipe Face Mesh (468 điểm, +10 điểm mống mắt khi refine) – mặc định, chính xác nhất
+- "opencv_dnn": Bộ dò mặt SSD (cv2.dnn) + Facemark LBF 68 điểm (opencv-contrib), ánh xạ sang chỉ số MediaPipe
+- "onnx":       Bộ dò mặt SSD + mô hình landmark rút gọn chạy ONNX Runtime (CPU); file JSON đi kèm
+                khai báo kích thước đầu vào và ánh xạ điểm đầu ra -> chỉ số MediaPipe
+Backend thiếu thư viện / file mô hình thì available() trả về (False, lý do) và bị bỏ qua khi chọn.
+Chọn backend theo máy: xem backend_benchmark.py.
+"""
+
+import json
+import os
+import platform
+import threading
+import time
+from collections import namedtuple
+
+MODELS_DIR = "models"
+SSD_PROTOTXT = os.path.join(MODELS_DIR, "deploy.prototxt")
+SSD_WEIGHTS = os.path.join(MODELS_DIR, "res10_300x300_ssd_iter_140000.caffemodel")
+LBF_MODEL = os.path.join(MODELS_DIR, "lbfmodel.yaml")
+ONNX_CONFIG = os.path.join(MODELS_DIR, "face_landmarks.json")
+
+DEFAULT_BACKEND = "mediapipe"
+# Backend đã chọn theo từng loại máy (dùng chung cho cả đội xe, khóa theo CPU)
+DEFAULT_CHOICE_PATH = os.path.join("config", "inference_backend.json")
+
+LandmarkPoint = namedtuple("LandmarkPoint", "x y")
+
+# Chỉ số MediaPipe mà FaceProcessor dùng (EAR, MAR, góc đầu) -> điểm tương ứng trong bộ 68 điểm iBUG
+IBUG68_TO_MEDIAPIPE = {
+    # Mắt phải (của người dùng): khóe ngoài, khóe trong, 2 cặp mí trên/dưới
+    33: 36, 133: 39, 159: 38, 153: 40, 158: 37, 145: 41,
+    # Mắt trái
+    263: 45, 362: 42, 386: 43, 380: 47, 385: 44, 374: 46,
+    # Môi trong: trên, dưới, khóe trái, khóe phải
+    13: 62, 14: 66, 78: 60, 308: 64,
+    # Góc đầu: chóp mũi, cằm, khóe miệng ngoài
+    1: 30, 152: 8, 61: 48, 291: 54,
+}
+MESH_LANDMARK_COUNT = 468  # Không có điểm mống mắt -> GazeEstimator tự bỏ qua
+
+
+def _import_cv2():
+    import cv2
+    return cv2
+
+
+class SparseLandmarks:
+    """Chỉ chứa các điểm đã ánh xạ, truy cập theo chỉ số MediaPipe như landmark của Face Mesh"""
+    __slots__ = ("_points",)
+
+    def __init__(self, points):
+        self._points = points
+
+    def __getitem__(self, index):
+        return self._points[index]
+
+    def __len__(self):
+        return MESH_LANDMARK_COUNT
+
+    def values(self):
+        return self._points.values()
+
+
+class InferenceBackend:
+    name = "base"
+    has_iris = False  # True nếu có điểm mống mắt (gaze)
+
+    @classmethod
+    def available(cls):
+        """(True, "") hoặc (False, lý do)"""
+        return True, ""
+
+    def configure(self, refine):
+        """refine: bật/tắt điểm mống mắt (chỉ có tác dụng với backend hỗ trợ)"""
+
+    def process(self, rgb_frame):
+        raise NotImplementedError
+
+    def draw(self, image, landmarks):
+        """Vẽ landmark lên ảnh BGR (mặc định: chấm tròn tại các điểm đã ánh xạ)"""
+        cv2 = _import_cv2()
+        h, w = image.shape[:2]
+        for point in landmarks.values():
+            cv2.circle(image, (int(point.x * w), int(point.y * h)), 2, (200, 200, 200), -1)
+
+    def close(self):
+        pass
+
+
+class MediaPipeBackend(InferenceBackend):
+    name = "mediapipe"
+
+    @classmethod
+    def available(cls):
+        try:
+            import mediapipe  # noqa: F401
+        except ImportError as e:
+            return False, str(e)
+        return True, ""
+
+    def __init__(self, refine=True):
+        import mediapipe as mp
+        self.mp_drawing = mp.solutions.drawing_utils
+        self.mp_face_mesh = mp.solutions.face_mesh
+        # Thông số vẽ lưới (màu xám mờ)
+        self.mesh_drawing_spec = self.mp_drawing.DrawingSpec(color=(200, 200, 200), thickness=1, circle_radius=1)
+        self.refine = refine
+        self.face_mesh = self._create_face_mesh(refine)
+        self._last_face = None
+
+    @property
+    def has_iris(self):
+        return self.refine
+
+    def _create_face_mesh(self, refine):
+        return self.mp_face_mesh.FaceMesh(
+            max_num_faces=1,            # Chỉ xử lý 1 khuôn mặt (người lái xe)
+            refine_landmarks=refine,    # Bật để lấy landmark chi tiết cho mắt/môi (+ mống mắt)
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
+
+    def configure(self, refine):
+        if refine != self.refine:
+            # Tạo lại FaceMesh (tốn vài trăm ms) -> governor chỉ đổi khi thật cần
+            self.face_mesh.close()
+            self.face_mesh = self._create_face_mesh(refine)
+            self.refine = refine
+
+    def process(self, rgb_frame):
+        results = self.face_mesh.process(rgb_frame)
+        if not results.multi_face_landmarks:
+            self._last_face = None
+            return None
+        self._last_face = results.multi_face_landmarks[0]  # Lấy mặt đầu tiên
+        return self._last_face.landmark
+
+    def draw(self, image, landmarks):
+        if self._last_face is None:
+            return
+        self.mp_drawing.draw_landmarks(
+            image=image,
+            landmark_list=self._last_face,
+            connections=self.mp_face_mesh.FACEMESH_TESSELATION,
+            landmark_drawing_spec=None,
+            connection_drawing_spec=self.mesh_drawing_spec
+        )
+
+    def close(self):
+        self.face_mesh.close()
+
+
+class SsdFaceDetector:
+    """Bộ dò mặt ResNet-10 SSD của OpenCV (cv2.dnn). Trả về hộp (x, y, w, h) pixel của mặt tin cậy nhất."""
+
+    def __init__(self, min_confidence=0.5):
+        cv2 = _import_cv2()
+        self.net = cv2.dnn.readNetFromCaffe(SSD_PROTOTXT, SSD_WEIGHTS)
+        self.min_confidence = min_confidence
+
+    def detect(self, rgb_frame):
+        cv2 = _import_cv2()
+        h, w = rgb_frame.shape[:2]
+        blob = cv2.dnn.blobFromImage(
+            cv2.resize(rgb_frame, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0), swapRB=True
+        )
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]  # (N, 7): _, _, confidence, x1, y1, x2, y2
+        best = detections[:, 2].argmax() if len(detections) else None
+        if best is None or detections[best, 2] < self.min_confidence:
+            return None
+        x1, y1, x2, y2 = detections[best, 3:7]
+        x1, y1 = max(int(x1 * w), 0), max(int(y1 * h), 0)
+        x2, y2 = min(int(x2 * w), w), min(int(y2 * h), h)
+        if x2 - x1 < 8 or y2 - y1 < 8:
+            return None
+        return x1, y1, x2 - x1, y2 - y1
+
+
+class OpenCVDnnBackend(InferenceBackend):
+    name = "opencv_dnn"
+
+    @classmethod
+    def available(cls):
+        try:
+            cv2 = _import_cv2()
+        except ImportError as e:
+            return False, str(e)
+        if not hasattr(cv2, "face"):
+            return False, "cần opencv-contrib-python (cv2.face)"
+        missing = [p for p in (SSD_PROTOTXT, SSD_WEIGHTS, LBF_MODEL) if not os.path.exists(p)]
+        if missing:
+            return False, f"thiếu file mô hình: {', '.join(missing)}"
+        return True, ""
+
+    def __init__(self, refine=True):
+        cv2 = _import_cv2()
+        self.detector = SsdFaceDetector()
+        self.facemark = cv2.face.createFacemarkLBF()
+        self.facemark.loadModel(LBF_MODEL)
+
+    def process(self, rgb_frame):
+        import numpy as np
+        cv2 = _import_cv2()
+        box = self.detector.detect(rgb_frame)
+        if box is None:
+            return None
+        gray = cv2.cvtColor(rgb_frame, cv2.COLOR_RGB2GRAY)
+        ok, shapes = self.facemark.fit(gray, np.array([box], dtype=np.int32))
+        if not ok or not len(shapes):
+            return None
+        points = shapes[0][0]  # (68, 2) pixel
+        h, w = rgb_frame.shape[:2]
+        return SparseLandmarks({
+            mp_index: LandmarkPoint(float(points[i][0]) / w, float(points[i][1]) / h)
+            for mp_index, i in IBUG68_TO_MEDIAPIPE.items()
+        })
+
+
+class OnnxLandmarkBackend(InferenceBackend):
+    """
+    Mô hình landmark rút gọn (ONNX, CPU) chạy trên vùng mặt do SSD tìm được.
+    models/face_landmarks.json, VD:
+        {"model": "face_landmarks.onnx", "input_size": [112, 112], "layout": "NCHW",
+         "scale": 0.00392157, "mean": [0, 0, 0], "margin": 0.15, "threads": 1,
+         "landmarks": {"33": 0, "133": 1, ...}}   # chỉ số MediaPipe -> điểm thứ i của đầu ra
+    Đầu ra mô hình: (1, N*2) hoặc (1, N, 2), tọa độ chuẩn hóa 0..1 theo ảnh vùng mặt.
+    """
+    name = "onnx"
+
+    @classmethod
+    def available(cls):
+        try:
+            import onnxruntime  # noqa: F401
+            _import_cv2()
+        except ImportError as e:
+            return False, str(e)
+        try:
+            config = cls._load_config()
+        except (OSError, ValueError) as e:
+            return False, f"không đọc được {ONNX_CONFIG}: {e}"
+        missing = [p for p in (SSD_PROTOTXT, SSD_WEIGHTS, config["model_path"]) if not os.path.exists(p)]
+        if missing:
+            return False, f"thiếu file mô hình: {', '.join(missing)}"
+        return True, ""
+
+    @staticmethod
+    def _load_config():
+        with open(ONNX_CONFIG, encoding="utf-8") as f:
+            config = json.load(f)
+        config["model_path"] = os.path.join(os.path.dirname(ONNX_CONFIG), config["model"])
+        return config
+
+    def __init__(self, refine=True):
+        import onnxruntime as ort
+        config = self._load_config()
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = int(config.get("threads", 1))
+        self.session = ort.InferenceSession(
+            config["model_path"], sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_size = tuple(config.get("input_size", (112, 112)))
+        self.layout = config.get("layout", "NCHW")
+        self.scale = float(config.get("scale", 1.0 / 255.0))
+        self.mean = config.get("mean", (0.0, 0.0, 0.0))
+        self.margin = float(config.get("margin", 0.15))
+        self.mapping = {int(mp_index): int(i) for mp_index, i in config["landmarks"].items()}
+        self.detector = SsdFaceDetector()
+
+    def process(self, rgb_frame):
+        import numpy as np
+        cv2 = _import_cv2()
+        box = self.detector.detect(rgb_frame)
+        if box is None:
+            return None
+        h, w = rgb_frame.shape[:2]
+        x, y, bw, bh = box
+        # Nới rộng vùng mặt (mô hình thường được huấn luyện với lề quanh mặt)
+        mx, my = int(bw * self.margin), int(bh * self.margin)
+        x1, y1 = max(x - mx, 0), max(y - my, 0)
+        x2, y2 = min(x + bw + mx, w), min(y + bh + my, h)
+        crop = cv2.resize(rgb_frame[y1:y2, x1:x2], self.input_size, interpolation=cv2.INTER_LINEAR)
+        tensor = (crop.astype(np.float32) - np.asarray(self.mean, dtype=np.float32)) * self.scale
+        if self.layout == "NCHW":
+            tensor = tensor.transpose(2, 0, 1)
+        output = self.session.run(None, {self.input_name: tensor[None]})[0].reshape(-1, 2)
+        # Tọa độ vùng mặt (0..1) -> tọa độ chuẩn hóa của cả ảnh
+        xs = (x1 + output[:, 0] * (x2 - x1)) / w
+        ys = (y1 + output[:, 1] * (y2 - y1)) / h
+        return SparseLandmarks({
+            mp_index: LandmarkPoint(float(xs[i]), float(ys[i])) for mp_index, i in self.mapping.items()
+        })
+
+
+BACKENDS = {
+    MediaPipeBackend.name: MediaPipeBackend,
+    OpenCVDnnBackend.name: OpenCVDnnBackend,
+    OnnxLandmarkBackend.name: OnnxLandmarkBackend,
+}
+
+
+def available_backends():
+    """{tên: (True/False, lý do)} của mọi backend đã đăng ký"""
+    return {name: cls.available() for name, cls in BACKENDS.items()}
+
+
+def create_backend(name=DEFAULT_BACKEND, refine=True):
+    """Tạo backend theo tên; backend không dùng được trên máy này -> quay về MediaPipe"""
+    cls = BACKENDS.get(name)
+    if cls is None:
+        print(f"⚠️ Không có backend suy luận '{name}', dùng {DEFAULT_BACKEND}")
+        cls = BACKENDS[DEFAULT_BACKEND]
+    elif cls.name != DEFAULT_BACKEND:
+        ok, reason = cls.available()
+        if not ok:
+            print(f"⚠️ Backend '{name}' không dùng được ({reason}), dùng {DEFAULT_BACKEND}")
+            cls = BACKENDS[DEFAULT_BACKEND]
+    return cls(refine=refine)
+
+
+def device_key():
+    """Khóa loại máy: tên CPU + số nhân (xe cùng phần cứng dùng chung 1 lựa chọn)"""
+    model = ""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(("model name", "Hardware", "Model")):
+                    model = line.split(":", 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    model = model or platform.processor() or platform.machine()
+    return f"{model} x{os.cpu_count() or 1}"
+
+
+class BackendChoiceStore:
+    """config/inference_backend.json: {"default": tên, "devices": {khóa máy: {"backend": tên, ...kết quả đo}}}"""
+
+    def __init__(self, path=DEFAULT_CHOICE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                self._data = json.load(f)
+        except (OSError, ValueError):
+            self._data = {}
+
+    def get(self, key):
+        return dict(self._data.get("devices", {}).get(key) or {})
+
+    @property
+    def default(self):
+        return self._data.get("default", DEFAULT_BACKEND)
+
+    def update(self, key, **fields):
+        """Ghi kết quả chọn của 1 loại máy (ghi file tạm rồi đổi tên)"""
+        with self._lock:
+            entry = self._data.setdefault("devices", {}).setdefault(key, {})
+            entry.update(fields)
+            entry["updated_at"] = time.time()
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+            return dict(entry)
+
+
+def load_device_choice(path=DEFAULT_CHOICE_PATH):
+    """Tên backend đã chọn cho máy này (chưa đo -> mặc định của file / MediaPipe)"""
+    store = BackendChoiceStore(path)
+    return store.get(device_key()).get("backend") or store.default
@@ -0,0 +1,160 @@
+"""
+latency_trace.py – Đo độ trễ cảnh báo đầu-cuối (từ frame kích hoạt -> còi kêu / email gửi xong)
+
+Mỗi frame mang theo thời điểm chụp (time.perf_counter) qua process_frame và logic cảnh báo.
+Khi cảnh báo được phát, AlertTrace đi kèm tới SoundModule / email; lúc âm thanh BẮT ĐẦU phát
+hoặc email GỬI XONG, AlertLatencyTracer ghi lại:
+    - origin="trigger": từ frame làm điều kiện cảnh báo thỏa (độ trễ pipeline thuần)
+    - origin="onset"  : từ frame đầu tiên vượt ngưỡng (VD: mắt vừa nhắm), gồm cả thời gian chờ cấu hình
+
+Kết quả vào histogram Prometheus (modules.metrics) và file JSONL để làm báo cáo:
+    python -m modules.latency_trace data/alert_latency.jsonl
+    python -m modules.latency_trace data/alert_latency.jsonl --max-sound-p95-ms 150 --max-email-p95-ms 8000
+(Trả mã thoát 1 nếu p95 vượt ngưỡng -> dùng làm kiểm tra hồi quy.)
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from modules import metrics
+
+# alert_type: loại cảnh báo; onset_ts: frame đầu tiên vượt ngưỡng; trigger_ts: frame kích hoạt cảnh báo
+AlertTrace = namedtuple("AlertTrace", ["alert_type", "onset_ts", "trigger_ts"])
+
+ALERT_LATENCY = metrics.Histogram(
+    "dms_alert_latency_seconds",
+    "Độ trễ từ frame cảnh báo tới lúc còi kêu/email gửi xong",
+    ["event", "type", "origin"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+DEFAULT_LOG_PATH = os.path.join("data", "alert_latency.jsonl")
+
+
+class AlertLatencyTracer:
+    """Ghi nhận độ trễ cảnh báo. An toàn khi gọi từ luồng âm thanh/email."""
+
+    def __init__(self, log_path=DEFAULT_LOG_PATH):
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        # (event, alert_type) -> onset_ts đã ghi, tránh ghi lặp khi còi loop được gọi lại mỗi frame
+        self._recorded = {}
+
+    def record(self, event, trace, done_ts=None):
+        """event: "sound" hoặc "email". done_ts: time.perf_counter() lúc sự kiện xảy ra."""
+        if trace is None:
+            return
+        if done_ts is None:
+            done_ts = time.perf_counter()
+        key = (event, trace.alert_type)
+        with self._lock:
+            if self._recorded.get(key) == trace.onset_ts:
+                return
+            self._recorded[key] = trace.onset_ts
+
+        from_trigger = done_ts - trace.trigger_ts
+        from_onset = done_ts - trace.onset_ts
+        ALERT_LATENCY.labels(event=event, type=trace.alert_type, origin="trigger").observe(from_trigger)
+        ALERT_LATENCY.labels(event=event, type=trace.alert_type, origin="onset").observe(from_onset)
+
+        if not self.log_path:
+            return
+        line = json.dumps({
+            "wall_time": time.time(),
+            "event": event,
+            "type": trace.alert_type,
+            "trigger_ms": round(from_trigger * 1000, 3),
+            "onset_ms": round(from_onset * 1000, 3),
+        })
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            print(f"⚠️ [LATENCY] Không ghi được log độ trễ: {e}")
+
+    def sound_callback(self, trace):
+        """Trả về hàm để SoundModule gọi khi âm thanh bắt đầu phát"""
+        if trace is None:
+            return None
+        return lambda started_ts: self.record("sound", trace, started_ts)
+
+
+# --- Báo cáo ---
+def _percentile(sorted_values, q):
+    """Phân vị kiểu nearest-rank trên list đã sắp xếp"""
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, math.ceil(q / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(log_path, origin="trigger"):
+    """Đọc file JSONL -> {(event, type): {"count", "p50", "p95", "p99", "max"}} (ms)"""
+    groups = {}
+    with open(log_path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            groups.setdefault((row["event"], row["type"]), []).append(row[f"{origin}_ms"])
+            groups.setdefault((row["event"], "*"), []).append(row[f"{origin}_ms"])
+
+    summary = {}
+    for key, values in groups.items():
+        values.sort()
+        summary[key] = {
+            "count": len(values),
+            "p50": _percentile(values, 50),
+            "p95": _percentile(values, 95),
+            "p99": _percentile(values, 99),
+            "max": values[-1],
+        }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Báo cáo độ trễ cảnh báo đầu-cuối")
+    parser.add_argument("log", nargs="?", default=DEFAULT_LOG_PATH, help="File JSONL độ trễ")
+    parser.add_argument("--origin", choices=["trigger", "onset"], default="trigger",
+                        help="Tính từ frame kích hoạt (trigger) hay frame vượt ngưỡng đầu tiên (onset)")
+    parser.add_argument("--max-sound-p95-ms", type=float, default=None, help="Ngưỡng hồi quy p95 cho âm thanh")
+    parser.add_argument("--max-email-p95-ms", type=float, default=None, help="Ngưỡng hồi quy p95 cho email")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.log):
+        print(f"Không tìm thấy file: {args.log}")
+        return 2
+
+    summary = summarize(args.log, args.origin)
+    print(f"{'event':<6} {'type':<20} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}  (ms, từ {args.origin})")
+    for (event, alert_type), s in sorted(summary.items()):
+        print(f"{event:<6} {alert_type:<20} {s['count']:>6} {s['p50']:>9.1f} {s['p95']:>9.1f} "
+              f"{s['p99']:>9.1f} {s['max']:>9.1f}")
+
+    failed = False
+    for event, limit in (("sound", args.max_sound_p95_ms), ("email", args.max_email_p95_ms)):
+        if limit is None or (event, "*") not in summary:
+            continue
+        p95 = summary[(event, "*")]["p95"]
+        if p95 > limit:
+            print(f"❌ Hồi quy: p95 {event} = {p95:.1f} ms > ngưỡng {limit:.1f} ms")
+            failed = True
+        else:
+            print(f"✅ p95 {event} = {p95:.1f} ms <= {limit:.1f} ms")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
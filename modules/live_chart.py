@@ -0,0 +1,110 @@
+"""
+live_chart.py – Biểu đồ EAR / MAR / góc đầu theo thời gian thực cho trang Giám sát
+
+- Dữ liệu lấy từ MetricHistory (vòng đệm cố định), mỗi frame chỉ ghi vào vòng đệm
+- Vẽ lại theo QTimer riêng (mặc định 2 lần/giây), độc lập với FPS video, và chỉ khi có dữ liệu mới
+- Mỗi chuỗi được giảm mẫu LTTB xuống ~ số pixel chiều ngang trước khi vẽ
+- Đường ngưỡng (EAR, MAR, góc nghiêng) đọc qua hàm -> luôn khớp ngưỡng đang dùng (cài đặt / tự học)
+"""
+
+from PySide6.QtCore import QPointF, QRectF, Qt, QTimer
+from PySide6.QtGui import QColor, QFont, QPainter, QPen, QPolygonF
+from PySide6.QtWidgets import QSizePolicy, QWidget
+
+from modules.timeseries import lttb
+
+# Mất mặt lâu hơn khoảng này -> ngắt đường thay vì nối thẳng qua khoảng trống
+GAP_SEC = 0.5
+
+# (tiêu đề, [(chuỗi, màu)], (min, max) trục tung, tên ngưỡng)
+PANELS = (
+    ("EAR", (("ear", "#2ecc71"),), (0.0, 0.45), "ear"),
+    ("MAR", (("mar", "#3498db"),), (0.0, 1.0), "mar"),
+    ("Góc đầu (độ)", (("head_pitch", "#e67e22"), ("head_yaw", "#9b59b6")), (-45.0, 45.0), "head_pitch"),
+)
+
+
+class LiveChartWidget(QWidget):
+    def __init__(self, history, thresholds=None, window_sec=180.0, refresh_hz=2.0, parent=None):
+        """thresholds: hàm trả về dict {"ear": x, "mar": y, "head_pitch": (trên, dưới)} – số hoặc tuple mức cần vẽ"""
+        super().__init__(parent)
+        self.setObjectName("LiveChart")
+        self.history = history
+        self.thresholds = thresholds or (lambda: {})
+        self.window_sec = window_sec
+        self.setMinimumHeight(180)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
+        self._drawn_version = -1
+        self._font = QFont()
+        self._font.setPointSize(8)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(int(1000 / refresh_hz))
+        self.timer.timeout.connect(self._maybe_repaint)
+
+    def start(self):
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def _maybe_repaint(self):
+        if self.history.version != self._drawn_version and self.isVisible():
+            self.update()
+
+    def paintEvent(self, event):
+        self._drawn_version = self.history.version
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.setFont(self._font)
+        text_color = self.palette().color(self.foregroundRole())
+        grid_color = QColor(text_color)
+        grid_color.setAlpha(60)
+
+        end = self.history.last_time
+        thresholds = self.thresholds()
+        panel_h = self.height() / len(PANELS)
+        for index, (title, series, (y_min, y_max), threshold_name) in enumerate(PANELS):
+            rect = QRectF(36, index * panel_h + 4, self.width() - 44, panel_h - 8)
+            painter.setPen(QPen(grid_color, 1))
+            painter.drawRect(rect)
+            painter.setPen(text_color)
+            painter.drawText(QRectF(0, rect.top(), 34, 14), Qt.AlignmentFlag.AlignRight, f"{y_max:g}")
+            painter.drawText(QRectF(0, rect.bottom() - 14, 34, 14), Qt.AlignmentFlag.AlignRight, f"{y_min:g}")
+            painter.drawText(rect.adjusted(4, 2, 0, 0), Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop,
+                             title + ("   " + "  ".join(name for name, _ in series) if len(series) > 1 else ""))
+
+            scale_y = rect.height() / (y_max - y_min)
+
+            def to_y(value):
+                return rect.bottom() - (min(max(value, y_min), y_max) - y_min) * scale_y
+
+            threshold = thresholds.get(threshold_name)
+            if threshold is not None:
+                painter.setPen(QPen(QColor("#e74c3c"), 1, Qt.PenStyle.DashLine))
+                for level in threshold if isinstance(threshold, tuple) else (threshold,):
+                    y = to_y(level)
+                    painter.drawLine(QPointF(rect.left(), y), QPointF(rect.right(), y))
+
+            if end is None:
+                continue
+            start = end - self.window_sec
+            scale_x = rect.width() / self.window_sec
+            pixels = max(int(rect.width()), 3)
+            # Sau LTTB mỗi điểm cách nhau ~ window/pixels giây -> chỉ coi là mất mặt nếu cách xa hơn nhiều
+            gap_sec = max(GAP_SEC, 3.0 * self.window_sec / pixels)
+            for name, color in series:
+                times, values = self.history.series(name, since=start)
+                xs, ys = lttb(times, values, pixels)
+                painter.setPen(QPen(QColor(color), 1.5))
+                polyline = QPolygonF()
+                previous_t = None
+                for t, v in zip(xs, ys):
+                    if previous_t is not None and t - previous_t > gap_sec and polyline.size() > 0:
+                        painter.drawPolyline(polyline)
+                        polyline = QPolygonF()
+                    polyline.append(QPointF(rect.left() + (t - start) * scale_x, to_y(v)))
+                    previous_t = t
+                if polyline.size() > 1:
+                    painter.drawPolyline(polyline)
+        painter.end()
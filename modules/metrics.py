@@ -0,0 +1,316 @@
+"""
+metrics.py – Chỉ số hiệu năng của pipeline, xuất theo định dạng Prometheus (text)
+- Counter / Gauge / Histogram tối giản, không cần thư viện ngoài
+- Cập nhật KHÔNG dùng khóa (chỉ cộng số nguyên/float dưới GIL) -> gọi mỗi frame vẫn rẻ.
+  Chấp nhận sai lệch cực nhỏ nếu 2 luồng cùng ghi 1 chỉ số (đủ tốt cho giám sát).
+- MetricsServer: endpoint HTTP /metrics cho Prometheus scrape
+
+Dùng:
+    from modules import metrics
+    metrics.FRAMES_CAPTURED.inc()
+    metrics.STAGE_LATENCY.labels(stage="inference").observe(0.021)
+"""
+
+import os
+import sys
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bucket mặc định (giây) cho độ trễ: 1ms -> 10s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Lớp cha: quản lý tên, mô tả và các 'con' theo nhãn (labels)"""
+    type_name = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._children_lock = threading.Lock()  # Chỉ dùng khi TẠO nhãn mới (hiếm)
+        if registry is None:
+            registry = REGISTRY
+        if registry is not False:
+            registry.register(self)
+
+    def labels(self, **labels):
+        """Lấy (hoặc tạo) chỉ số con theo nhãn. Nên giữ lại kết quả để dùng mỗi frame."""
+        key = tuple((name, labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._children_lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._new_child()
+                    self._children[key] = child
+        return child
+
+    def _samples(self):
+        if not self.labelnames:
+            yield from self._child_samples((), self)
+            return
+        for key, child in list(self._children.items()):
+            yield from child._child_samples(key, child)
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for suffix, labels, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Bộ đếm chỉ tăng (VD: số frame, số cảnh báo)"""
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self._value = 0
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return Counter(self.name, self.documentation, registry=False)
+
+    def inc(self, amount=1):
+        self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def _child_samples(self, labels, child):
+        yield "", labels, child._value
+
+
+class Gauge(_Metric):
+    """Giá trị tức thời (VD: FPS). Có thể gắn hàm tính lúc scrape bằng set_function()."""
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self._value = 0.0
+        self._function = None
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return Gauge(self.name, self.documentation, registry=False)
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        self._value += amount
+
+    def dec(self, amount=1):
+        self._value -= amount
+
+    def set_function(self, func):
+        """Giá trị được tính lại mỗi lần scrape (VD: bộ nhớ tiến trình)"""
+        self._function = func
+
+    @property
+    def value(self):
+        if self._function is not None:
+            try:
+                return self._function()
+            except Exception:
+                return float("nan")
+        return self._value
+
+    def _child_samples(self, labels, child):
+        yield "", labels, child.value
+
+
+class Histogram(_Metric):
+    """Histogram độ trễ: mỗi observe() chỉ là 1 bisect + 2 phép cộng"""
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self._upper_bounds = tuple(sorted(buckets))
+        # +1 ô cho giá trị > bucket lớn nhất (+Inf)
+        self._counts = [0] * (len(self._upper_bounds) + 1)
+        self._sum = 0.0
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return Histogram(self.name, self.documentation, buckets=self._upper_bounds, registry=False)
+
+    def observe(self, value):
+        self._counts[bisect_left(self._upper_bounds, value)] += 1
+        self._sum += value
+
+    @property
+    def count(self):
+        return sum(self._counts)
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def snapshot(self):
+        """Trả về (upper_bounds, counts) – dùng cho báo cáo/ước lượng phân vị"""
+        return self._upper_bounds, list(self._counts)
+
+    def _child_samples(self, labels, child):
+        cumulative = 0
+        counts = list(child._counts)
+        for bound, count in zip(child._upper_bounds, counts):
+            cumulative += count
+            yield "_bucket", labels + (("le", _format_value(float(bound))),), cumulative
+        cumulative += counts[-1]
+        yield "_bucket", labels + (("le", "+Inf"),), cumulative
+        yield "_sum", labels, child._sum
+        yield "_count", labels, cumulative
+
+
+class Registry:
+    """Tập hợp các chỉ số để xuất ra /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# --- Bộ nhớ tiến trình ---
+def process_resident_memory_bytes():
+    """RSS hiện tại (byte). Linux: /proc/self/statm; nơi khác: đỉnh RSS từ resource"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS trả về byte, Linux trả về KB
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return float("nan")
+
+
+# --- Các chỉ số của ứng dụng ---
+FRAMES_CAPTURED = Counter("dms_frames_captured_total", "Số khung hình đọc được từ camera")
+FRAMES_PROCESSED = Counter("dms_frames_processed_total", "Số khung hình đã chạy nhận diện")
+FRAMES_DROPPED = Counter("dms_frames_dropped_total", "Số khung hình bị bỏ qua/lỗi", ["reason"])
+CAPTURE_FPS = Gauge("dms_capture_fps", "FPS đọc camera (trung bình ~1 giây)")
+INFERENCE_FPS = Gauge("dms_inference_fps", "FPS nhận diện (trung bình ~1 giây)")
+STAGE_LATENCY = Histogram("dms_stage_latency_seconds", "Thời gian xử lý theo từng công đoạn", ["stage"])
+ALERTS = Counter("dms_alerts_total", "Số lần cảnh báo được kích hoạt theo loại", ["type"])
+SOUND_DISPATCH_LATENCY = Histogram("dms_sound_dispatch_seconds", "Từ lúc yêu cầu phát tới lúc âm thanh bắt đầu")
+EMAIL_DISPATCH_LATENCY = Histogram(
+    "dms_email_dispatch_seconds", "Thời gian gửi email cảnh báo", ["result"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+PERCLOS = Gauge("dms_perclos_ratio", "PERCLOS: tỉ lệ thời gian nhắm mắt trong 60 giây gần nhất")
+BLINK_RATE = Gauge("dms_blink_rate_per_minute", "Số lần chớp mắt mỗi phút (cửa sổ 60 giây)")
+FATIGUE_SCORE = Gauge("dms_fatigue_score", "Điểm mệt mỏi tổng hợp (0..100)")
+PROCESS_MEMORY = Gauge("dms_process_resident_memory_bytes", "Bộ nhớ RSS của tiến trình")
+PROCESS_MEMORY.set_function(process_resident_memory_bytes)
+PROCESS_THREADS = Gauge("dms_process_threads", "Số luồng Python đang chạy")
+PROCESS_THREADS.set_function(threading.active_count)
+
+
+class RateMeter:
+    """Đo FPS: đếm sự kiện, mỗi `interval` giây ghi tốc độ vào 1 Gauge"""
+
+    def __init__(self, gauge, clock, interval=1.0):
+        self.gauge = gauge
+        self.clock = clock
+        self.interval = interval
+        self._count = 0
+        self._window_start = None
+
+    def tick(self):
+        now = self.clock()
+        if self._window_start is None:
+            self._window_start = now
+        self._count += 1
+        elapsed = now - self._window_start
+        if elapsed >= self.interval:
+            self.gauge.set(self._count / elapsed)
+            self._count = 0
+            self._window_start = now
+
+
+# --- Server HTTP /metrics ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer:
+    """Endpoint /metrics chạy nền (Prometheus scrape)"""
+
+    def __init__(self, host="0.0.0.0", port=9108, registry=None):
+        self.host = host
+        self.port = port
+        self.registry = registry or REGISTRY
+        self._httpd = None
+        self._thread = None
+
+    def start(self):
+        if self._httpd is not None:
+            return
+        handler = type("Handler", (_MetricsHandler,), {"registry": self.registry})
+        self._httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"📈 [METRICS] Endpoint tại http://{self.host}:{self.port}/metrics")
+
+    def stop(self):
+        if self._httpd is None:
+            return
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._httpd = None
+        print("📈 [METRICS] Đã dừng endpoint.")
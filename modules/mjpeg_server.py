@@ -0,0 +1,199 @@
+"""
+mjpeg_server.py – Server HTTP cục bộ phát luồng video đã vẽ (MJPEG)
+Mỗi khung hình chỉ được nén JPEG MỘT lần trên luồng nền, dù có bao nhiêu người xem.
+Người xem đọc từ bộ đệm chung và tự bỏ qua khung cũ -> client chậm không làm nghẽn pipeline.
+
+Xem bằng trình duyệt: http://<ip-máy>:<port>/stream
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BOUNDARY = "frame"
+
+
+class _SharedFrameBuffer:
+    """Bộ đệm chung: giữ khung JPEG mới nhất + số thứ tự (seq)"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._jpeg = None
+        self._seq = 0
+        self._closed = False
+
+    def put(self, jpeg_bytes):
+        with self._cond:
+            self._jpeg = jpeg_bytes
+            self._seq += 1
+            self._cond.notify_all()
+
+    def wait_newer(self, last_seq, timeout=1.0):
+        """Chờ khung có seq > last_seq. Trả về (seq, jpeg) hoặc (last_seq, None) nếu hết giờ"""
+        with self._cond:
+            if self._seq <= last_seq and not self._closed:
+                self._cond.wait(timeout)
+            if self._closed or self._seq <= last_seq:
+                return last_seq, None
+            return self._seq, self._jpeg
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class _MJPEGHandler(BaseHTTPRequestHandler):
+    # Gán bởi MJPEGServer khi tạo server
+    buffer = None
+    max_fps = 10
+
+    def log_message(self, format, *args):
+        # Tắt log mặc định của http.server (mỗi request 1 dòng, rất rối)
+        pass
+
+    def do_GET(self):
+        if self.path in ("/", "/index.html"):
+            body = b'<html><body style="margin:0;background:#000"><img src="/stream" style="width:100%"></body></html>'
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        if self.path.startswith("/snapshot"):
+            _, jpeg = self.buffer.wait_newer(0, timeout=2.0)
+            if jpeg is None:
+                self.send_error(503, "Chưa có khung hình")
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(jpeg)))
+            self.end_headers()
+            self.wfile.write(jpeg)
+            return
+
+        if not self.path.startswith("/stream"):
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Cache-Control", "no-cache, private")
+        self.send_header("Pragma", "no-cache")
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.end_headers()
+
+        min_interval = 1.0 / self.max_fps if self.max_fps > 0 else 0.0
+        last_seq = 0
+        last_sent = 0.0
+        try:
+            while not self.buffer.closed:
+                # Giới hạn FPS cho người xem: ngủ tới lượt gửi kế tiếp
+                wait = min_interval - (time.monotonic() - last_sent)
+                if wait > 0:
+                    time.sleep(wait)
+
+                # Lấy khung MỚI NHẤT (bỏ qua các khung ở giữa nếu client chậm)
+                seq, jpeg = self.buffer.wait_newer(last_seq)
+                if jpeg is None:
+                    continue
+                last_seq = seq
+                last_sent = time.monotonic()
+
+                self.wfile.write(
+                    f"--{BOUNDARY}\r\n"
+                    f"Content-Type: image/jpeg\r\n"
+                    f"Content-Length: {len(jpeg)}\r\n\r\n".encode("ascii")
+                )
+                self.wfile.write(jpeg)
+                self.wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Người xem đóng trình duyệt -> bình thường
+            pass
+
+
+class MJPEGServer:
+    """
+    Server MJPEG chạy nền.
+    - publish(frame): gọi từ VideoThread, KHÔNG BAO GIỜ chặn (chỉ giữ lại khung mới nhất)
+    - Luồng encoder nén JPEG 1 lần/khung và đẩy vào bộ đệm chung
+    """
+
+    def __init__(self, host="0.0.0.0", port=8080, max_fps=10, jpeg_quality=75):
+        self.host = host
+        self.port = port
+        self.max_fps = max_fps
+        self.jpeg_quality = jpeg_quality
+
+        self._buffer = _SharedFrameBuffer()
+        self._pending = None  # Khung BGR chờ nén (chỉ giữ 1 khung)
+        self._pending_lock = threading.Lock()
+        self._pending_event = threading.Event()
+        self._running = False
+        self._httpd = None
+        self._encoder_thread = None
+        self._server_thread = None
+
+    def start(self):
+        if self._running:
+            return
+        if self._buffer.closed:
+            self._buffer = _SharedFrameBuffer()
+        handler = type("Handler", (_MJPEGHandler,), {
+            "buffer": self._buffer,
+            "max_fps": self.max_fps,
+        })
+        self._httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        self._httpd.daemon_threads = True
+        # Cập nhật port thật (khi truyền port=0 để hệ điều hành tự chọn)
+        self.port = self._httpd.server_address[1]
+        self._running = True
+
+        self._encoder_thread = threading.Thread(target=self._encode_loop, daemon=True)
+        self._encoder_thread.start()
+        self._server_thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._server_thread.start()
+        print(f"📡 [MJPEG] Đang phát tại http://{self.host}:{self.port}/stream (tối đa {self.max_fps} FPS)")
+
+    def publish(self, frame):
+        """Nhận khung BGR đã vẽ. Ghi đè khung cũ chưa kịp nén (frame skipping)."""
+        if not self._running:
+            return
+        with self._pending_lock:
+            self._pending = frame
+        self._pending_event.set()
+
+    def _encode_loop(self):
+        import cv2  # Import trễ: chỉ cần khi server thực sự chạy
+        params = [int(cv2.IMWRITE_JPEG_QUALITY), int(self.jpeg_quality)]
+        while self._running:
+            if not self._pending_event.wait(0.5):
+                continue
+            with self._pending_lock:
+                frame = self._pending
+                self._pending = None
+                self._pending_event.clear()
+            if frame is None:
+                continue
+            ok, buf = cv2.imencode(".jpg", frame, params)
+            if ok:
+                self._buffer.put(buf.tobytes())
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self._pending_event.set()
+        self._buffer.close()
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+        if self._encoder_thread is not None:
+            self._encoder_thread.join(timeout=2)
+        print("📡 [MJPEG] Đã dừng server.")
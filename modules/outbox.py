@@ -0,0 +1,260 @@
+"""
+outbox.py – Hàng đợi gửi đi (outbox) cục bộ bằng SQLite + luồng tải lên Firebase theo lô
+
+- Outbox.put(): ghi sự kiện vào SQLite (WAL) – nhanh, không cần mạng, không mất dữ liệu khi tắt máy
+- OutboxUploader: luồng nền lấy từng lô, gửi 1 request PATCH (multi-path update)
+  lên Realtime Database REST API kèm idToken Firebase (?auth=...); lỗi thì thử lại với backoff tăng dần.
+  Body gửi KHÔNG nén mặc định (REST API của Firebase chưa được xác nhận nhận Content-Encoding: gzip);
+  compress=True chỉ dùng với server đã biết nhận gzip (VD: rtdb_standin.py).
+- Chưa có token / token hết hạn (401, 403) -> GIỮ NGUYÊN lô trong outbox và thử lại sau,
+  không tính là lỗi dữ liệu (không bị chuyển sang dead_letter)
+- Kiểm tra kết nối (reachability): mất mạng thì TẠM DỪNG, không tốn pin/CPU thử vô ích
+
+Có thể chạy với server giả lập cục bộ (modules/rtdb_standin.py) để kiểm thử:
+    python -m modules.rtdb_standin --port 9000
+    OutboxUploader(outbox, "http://127.0.0.1:9000", "telemetry/test")
+"""
+
+import gzip
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+DEFAULT_OUTBOX_PATH = "data/outbox.sqlite3"
+
+# Mã lỗi HTTP nên thử lại (còn lại 4xx coi là lỗi dữ liệu -> không thử mãi)
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+# Lỗi xác thực: dữ liệu không sai, chỉ cần token mới -> giữ lại, thử lại sau
+AUTH_STATUS = {401, 403}
+
+
+class AuthTokenUnavailable(Exception):
+    """auth_token_provider chưa trả được token (chưa đăng nhập / không làm mới được)"""
+
+
+class Outbox:
+    """Hàng đợi bền vững trên SQLite, an toàn đa luồng"""
+
+    def __init__(self, path=DEFAULT_OUTBOX_PATH, max_attempts=10):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        # Sự kiện bị từ chối quá nhiều lần -> cất riêng để kiểm tra, không chặn hàng đợi
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS dead_letter (
+                id INTEGER PRIMARY KEY,
+                key TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                payload TEXT NOT NULL,
+                error TEXT
+            )
+        """)
+
+    def put(self, kind, payload, created_at=None):
+        """Thêm 1 sự kiện. kind: "events" / "minutes" (nhánh con trên Firebase)"""
+        if created_at is None:
+            created_at = time.time()
+        key = f"{int(created_at * 1000):013d}-{uuid.uuid4().hex[:8]}"
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outbox (key, kind, created_at, payload) VALUES (?, ?, ?, ?)",
+                (key, kind, created_at, json.dumps(payload, ensure_ascii=False)),
+            )
+        return key
+
+    def peek(self, limit):
+        """Lấy lô cũ nhất: list (id, key, kind, payload_dict)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, key, kind, payload FROM outbox ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [(row_id, key, kind, json.loads(payload)) for row_id, key, kind, payload in rows]
+
+    def ack(self, ids):
+        """Xóa các sự kiện đã gửi thành công"""
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def nack(self, ids, error):
+        """Tăng số lần thử; quá max_attempts thì chuyển sang dead_letter"""
+        if not ids:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("UPDATE outbox SET attempts = attempts + 1 WHERE id = ?", [(i,) for i in ids])
+            self._conn.execute(
+                "INSERT INTO dead_letter (id, key, kind, created_at, payload, error) "
+                "SELECT id, key, kind, created_at, payload, ? FROM outbox WHERE attempts >= ?",
+                (str(error), self.max_attempts),
+            )
+            self._conn.execute("DELETE FROM outbox WHERE attempts >= ?", (self.max_attempts,))
+            self._conn.execute("COMMIT")
+
+    def pending(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def is_reachable(url, timeout=2.0):
+    """Kiểm tra nhanh: mở được kết nối TCP tới host của url hay không"""
+    parts = urllib.parse.urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    try:
+        with socket.create_connection((parts.hostname, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+class OutboxUploader:
+    """
+    Luồng nền tải outbox lên Realtime Database.
+    Mỗi lô = 1 request PATCH {base_url}/{root_path}.json với body {"<kind>/<key>": payload, ...}
+    (key cố định theo sự kiện -> gửi lại nhiều lần vẫn không bị trùng dữ liệu)
+    """
+
+    def __init__(self, outbox, base_url, root_path, batch_size=200, compress=False,
+                 auth_token_provider=None, reachability=None,
+                 min_backoff=1.0, max_backoff=300.0, idle_interval=5.0, timeout=15.0):
+        self.outbox = outbox
+        self.base_url = base_url.rstrip("/")
+        self.root_path = root_path.strip("/")
+        self.batch_size = batch_size
+        self.compress = compress
+        self.auth_token_provider = auth_token_provider
+        self.reachability = reachability or (lambda: is_reachable(self.base_url))
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.idle_interval = idle_interval
+        self.timeout = timeout
+
+        self.online = None
+        self.uploaded = 0
+        self.last_error = None
+        self._backoff = 0.0
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def flush(self):
+        """Yêu cầu gửi ngay (không chờ idle_interval)"""
+        self._wake.set()
+
+    def _sleep(self, seconds):
+        self._wake.wait(seconds)
+        self._wake.clear()
+
+    def _run(self):
+        while not self._stop.is_set():
+            # 1. Mất mạng -> tạm dừng, kiểm tra lại sau
+            self.online = self.reachability()
+            if not self.online:
+                self._sleep(max(self.idle_interval, self._backoff or self.min_backoff))
+                continue
+
+            # 2. Lấy 1 lô
+            batch = self.outbox.peek(self.batch_size)
+            if not batch:
+                self._sleep(self.idle_interval)
+                continue
+
+            # 3. Gửi
+            ids = [row[0] for row in batch]
+            try:
+                self.upload_batch(batch)
+            except AuthTokenUnavailable:
+                self.last_error = "chưa có token đăng nhập"
+                self._increase_backoff()
+                self._sleep(self._backoff)
+                continue
+            except urllib.error.HTTPError as e:
+                self.last_error = f"HTTP {e.code}"
+                if e.code in AUTH_STATUS:
+                    # Token hết hạn / bị thu hồi -> lần sau lấy token mới, lô vẫn nằm trong outbox
+                    invalidate = getattr(self.auth_token_provider, "invalidate", None)
+                    if invalidate is not None:
+                        invalidate()
+                elif e.code not in RETRYABLE_STATUS:
+                    self.outbox.nack(ids, self.last_error)
+                self._increase_backoff()
+                self._sleep(self._backoff)
+                continue
+            except (urllib.error.URLError, OSError) as e:
+                self.last_error = str(e)
+                self._increase_backoff()
+                self._sleep(self._backoff)
+                continue
+
+            self.outbox.ack(ids)
+            self.uploaded += len(ids)
+            self.last_error = None
+            self._backoff = 0.0
+            # Còn hàng -> gửi lô tiếp ngay, không ngủ
+
+    def _increase_backoff(self):
+        """Backoff lũy thừa có jitter: 1s, 2s, 4s ... tối đa max_backoff"""
+        base = self.min_backoff if self._backoff == 0 else min(self._backoff * 2, self.max_backoff)
+        self._backoff = base * random.uniform(0.8, 1.2)
+
+    def upload_batch(self, batch):
+        body = {f"{kind}/{key}": payload for _, key, kind, payload in batch}
+        data = json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.compress:
+            data = gzip.compress(data)
+            headers["Content-Encoding"] = "gzip"
+
+        url = f"{self.base_url}/{self.root_path}.json"
+        if self.auth_token_provider is not None:
+            token = self.auth_token_provider()
+            if not token:
+                # Không gửi khi chưa xác thực (server sẽ từ chối)
+                raise AuthTokenUnavailable()
+            url += "?" + urllib.parse.urlencode({"auth": token})
+
+        request = urllib.request.Request(url, data=data, headers=headers, method="PATCH")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
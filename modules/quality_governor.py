@@ -0,0 +1,149 @@
+"""
+quality_governor.py – Tự hạ/nâng chất lượng xử lý để giữ FPS mục tiêu trên máy yếu
+
+Đầu vào: FPS xử lý mục tiêu + ngân sách CPU (phần của 1 nhân dành cho pipeline).
+Mỗi frame được xử lý, VideoThread báo thời gian từng công đoạn (inference, convert ...).
+Mỗi `interval` giây governor so sánh:
+    tải = (thời gian xử lý trung bình 1 frame / skip) * target_fps
+- tải > ngân sách hoặc FPS thực < 90% mục tiêu -> hạ 1 mức
+- tải < 60% ngân sách trong nhiều chu kỳ liên tiếp -> nâng 1 mức (có trễ để không dao động)
+Các "núm" theo mức: độ phân giải suy luận, mức vẽ (lưới / chữ / không), refine_landmarks, bỏ frame.
+Mọi quyết định được ghi lại (data/governor_decisions.jsonl + metrics) để xem lại theo từng máy.
+"""
+
+import json
+import os
+import time
+from collections import namedtuple
+
+from modules import metrics
+
+DEFAULT_DECISION_LOG = os.path.join("data", "governor_decisions.jsonl")
+
+# inference_width: None = giữ nguyên; overlay: "mesh" / "text" / "none"; skip: xử lý 1 trên N frame
+QualityLevel = namedtuple("QualityLevel", "name inference_width overlay refine skip")
+
+QUALITY_LEVELS = (
+    QualityLevel("full", None, "mesh", True, 1),
+    QualityLevel("high", 480, "mesh", True, 1),
+    QualityLevel("medium", 480, "text", True, 1),
+    QualityLevel("low", 320, "text", True, 1),
+    QualityLevel("no_iris", 320, "text", False, 1),
+    QualityLevel("skip2", 320, "none", False, 2),
+    QualityLevel("skip3", 256, "none", False, 3),
+)
+
+QUALITY_LEVEL = metrics.Gauge("dms_quality_level", "Mức chất lượng hiện tại của governor (0 = cao nhất)")
+GOVERNOR_DECISIONS = metrics.Counter("dms_governor_decisions_total", "Số lần governor đổi mức", ["direction"])
+
+
+class QualityGovernor:
+    UPGRADE_HEADROOM = 0.6    # Chỉ nâng mức khi tải < 60% ngân sách ...
+    UPGRADE_INTERVALS = 3     # ... trong 3 chu kỳ liên tiếp
+    EMA_ALPHA = 0.2
+
+    def __init__(self, target_fps=15.0, cpu_budget=0.7, clock=None, interval=2.0,
+                 levels=QUALITY_LEVELS, start_level=0, log_path=DEFAULT_DECISION_LOG):
+        self.target_fps = float(target_fps)
+        self.cpu_budget = cpu_budget
+        self.clock = clock or time.perf_counter
+        self.interval = interval
+        self.levels = levels
+        self.level_index = start_level
+        self.log_path = log_path
+        self.decisions = []
+
+        self.stage_ema = {}       # Thời gian trung bình theo công đoạn (giây/frame xử lý)
+        self._processed = 0
+        self._captured = 0
+        self._window_start = None
+        self._calm_intervals = 0
+        QUALITY_LEVEL.set(self.level_index)
+
+    @property
+    def level(self):
+        return self.levels[self.level_index]
+
+    def should_infer(self, frame_seq):
+        """True nếu frame này cần chạy suy luận (theo skip của mức hiện tại)"""
+        return frame_seq % self.level.skip == 0
+
+    def observe(self, **stage_seconds):
+        """Gọi sau mỗi frame được xử lý, VD: observe(inference=0.031, convert=0.002)"""
+        for stage, seconds in stage_seconds.items():
+            previous = self.stage_ema.get(stage)
+            self.stage_ema[stage] = seconds if previous is None else (
+                previous + self.EMA_ALPHA * (seconds - previous)
+            )
+        self._processed += 1
+
+    def tick(self):
+        """Gọi mỗi frame đọc được từ camera. Trả về QualityLevel mới nếu vừa đổi mức, ngược lại None."""
+        now = self.clock()
+        if self._window_start is None:
+            self._window_start = now
+            return None
+        self._captured += 1
+        elapsed = now - self._window_start
+        if elapsed < self.interval or not self.stage_ema:
+            return None
+
+        processed_fps = self._processed / elapsed
+        frame_cost = sum(self.stage_ema.values())
+        load = frame_cost / self.level.skip * self.target_fps
+        # FPS xử lý mong đợi ở mức hiện tại: camera chậm hơn mục tiêu thì không phải lỗi của CPU,
+        # bỏ frame thì ít hơn là bình thường
+        captured_fps = self._captured / elapsed
+        expected_fps = min(self.target_fps, captured_fps) / self.level.skip
+        self._processed = 0
+        self._captured = 0
+        self._window_start = now
+
+        new_index = self.level_index
+        reason = None
+        if (load > self.cpu_budget or processed_fps < 0.9 * expected_fps) and \
+                self.level_index < len(self.levels) - 1:
+            new_index = self.level_index + 1
+            reason = "over_budget" if load > self.cpu_budget else "below_target_fps"
+            self._calm_intervals = 0
+        elif load < self.cpu_budget * self.UPGRADE_HEADROOM and self.level_index > 0:
+            self._calm_intervals += 1
+            if self._calm_intervals >= self.UPGRADE_INTERVALS:
+                new_index = self.level_index - 1
+                reason = "headroom"
+                self._calm_intervals = 0
+        else:
+            self._calm_intervals = 0
+
+        if new_index == self.level_index:
+            return None
+        return self._change(new_index, reason, now, load, processed_fps)
+
+    def _change(self, new_index, reason, now, load, processed_fps):
+        previous = self.level
+        self.level_index = new_index
+        stages_ms = {stage: round(seconds * 1000.0, 2) for stage, seconds in self.stage_ema.items()}
+        self.stage_ema.clear()  # Thời gian cũ không còn đúng với mức mới
+        decision = {
+            "time": now,
+            "from": previous.name,
+            "to": self.level.name,
+            "reason": reason,
+            "load": round(load, 3),
+            "processed_fps": round(processed_fps, 2),
+            "stages_ms": stages_ms,
+            "target_fps": self.target_fps,
+            "cpu_budget": self.cpu_budget,
+        }
+        self.decisions.append(decision)
+        QUALITY_LEVEL.set(self.level_index)
+        GOVERNOR_DECISIONS.labels(direction="down" if reason != "headroom" else "up").inc()
+        print(f"⚙️ [GOVERNOR] {previous.name} -> {self.level.name} ({reason}, tải {load:.0%}, {processed_fps:.1f} FPS)")
+        if self.log_path:
+            try:
+                os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(decision, ensure_ascii=False) + "\n")
+            except OSError:
+                pass
+        return self.level
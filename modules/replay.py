@@ -0,0 +1,189 @@
+"""
+replay.py – Phát lại video đã ghi qua toàn bộ pipeline (FaceProcessor + AlertEngine), không cần GUI
+Đồng hồ của logic cảnh báo chạy theo timestamp video (CAP_PROP_POS_MSEC) chứ không theo giờ thật,
+nên video được xử lý nhanh nhất CPU cho phép mà các quyết định cảnh báo vẫn như khi chạy trực tiếp.
+Hai lần chạy trên cùng 1 file cho cùng danh sách sự kiện (so sánh bằng "digest").
+
+Dùng:
+    python -m modules.replay data/trip.mp4
+    python -m modules.replay data/trip.mp4 --out data/trip_events.jsonl --skip 2
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import time
+
+import cv2
+
+from modules.alert_logic import AlertEngine
+from modules.alert_rules import DEFAULT_RULES_PATH
+from modules.clock import ManualClock
+from modules.face_processor import FaceProcessor
+from modules.detector_scheduler import DetectorScheduler
+from modules.trip_log import TripRecorder
+
+
+class RecordingSink:
+    """Thay cho loa/email: chỉ ghi lại sự kiện theo thời gian video"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.events = []
+
+    def play_sound(self, sound_file, loop, trace):
+        self.events.append({
+            "t": round(self.clock.now(), 3),
+            "event": "sound",
+            "type": trace.alert_type if trace else None,
+            "file": sound_file,
+            "loop": loop,
+        })
+
+    def send_email(self, recipient, subject, message, trace):
+        self.events.append({
+            "t": round(self.clock.now(), 3),
+            "event": "email",
+            "type": trace.alert_type if trace else None,
+            "subject": subject,
+        })
+
+
+def video_timestamp(cap, frame_index, fps):
+    """Timestamp (giây) của frame vừa đọc. Một số container không có POS_MSEC -> suy ra từ FPS"""
+    ts = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+    if ts <= 0 and frame_index > 0 and fps > 0:
+        ts = frame_index / fps
+    return ts
+
+
+def run_replay(path, skip=1, flip=True, recipient_email="", processor=None, on_frame=None,
+               rules_path=DEFAULT_RULES_PATH, detectors=None):
+    """
+    Chạy 1 video qua pipeline. Trả về dict kết quả:
+        frames, processed, video_seconds, wall_seconds, speed (x thời gian thực), events, digest
+    skip > 1: chỉ nhận diện 1/skip frame (các frame còn lại chỉ grab, không giải mã).
+              Thời lượng vẫn tính theo timestamp video, nhưng độ phân giải thời gian thô hơn.
+    on_frame(data, engine): hàm tùy chọn gọi sau mỗi frame đã xử lý (VD: ghi telemetry)
+    rules_path: file luật cảnh báo (cùng file với khi chạy trực tiếp -> cùng quyết định)
+    detectors: DetectorScheduler(synchronous=True) – chạy mô hình phụ theo timestamp video
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Không mở được video: {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+
+    clock = ManualClock()
+    sink = RecordingSink(clock)
+    engine = AlertEngine(clock=clock, sink=sink, rules_path=rules_path)
+    engine.config_recipient_email = recipient_email
+    own_processor = processor is None
+    if own_processor:
+        processor = FaceProcessor()
+
+    # Chỉ ghi sự kiện khi loại cảnh báo BẮT ĐẦU (sườn lên), tránh 1 dòng/frame
+    previous_alerts = set()
+    frames = 0
+    processed = 0
+    video_ts = 0.0
+    started = time.perf_counter()
+    try:
+        while True:
+            if skip > 1 and frames % skip:
+                if not cap.grab():
+                    break
+                frames += 1
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            video_ts = video_timestamp(cap, frames, fps)
+            frames += 1
+            clock.set(video_ts)
+
+            if flip:
+                frame = cv2.flip(frame, 1)
+            _, data = processor.process_frame(frame, timestamp=video_ts, annotate=False)
+            data["frame_seq"] = frames
+            if detectors is not None:
+                detectors.submit(frame, video_ts)
+                detectors.apply(data, video_ts)
+            engine.evaluate(data)
+            processed += 1
+
+            for alert_type in sorted(engine.frame_alert_types - previous_alerts):
+                sink.events.append({"t": round(video_ts, 3), "event": "alert", "type": alert_type})
+            previous_alerts = engine.frame_alert_types
+            if on_frame is not None:
+                on_frame(data, engine)
+    finally:
+        cap.release()
+        if own_processor:
+            processor.close()
+
+    wall_seconds = time.perf_counter() - started
+    digest = hashlib.sha256(
+        json.dumps(sink.events, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+    return {
+        "frames": frames,
+        "processed": processed,
+        "video_seconds": video_ts,
+        "wall_seconds": wall_seconds,
+        "speed": video_ts / wall_seconds if wall_seconds > 0 else float("inf"),
+        "events": sink.events,
+        "digest": digest,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Phát lại video qua pipeline cảnh báo (nhanh hơn thời gian thực)")
+    parser.add_argument("video", help="Đường dẫn file video")
+    parser.add_argument("--out", help="Ghi danh sách sự kiện ra file JSONL")
+    parser.add_argument("--skip", type=int, default=1, help="Chỉ nhận diện 1/N frame (mặc định 1 = mọi frame)")
+    parser.add_argument("--no-flip", action="store_true", help="Không lật ảnh (video đã đúng chiều)")
+    parser.add_argument("--email", default="", help="Giả lập email người nhận (để ghi sự kiện email)")
+    parser.add_argument("--rules", default=DEFAULT_RULES_PATH, help="File luật cảnh báo (JSON)")
+    parser.add_argument("--backend", default=None,
+                        help="Backend suy luận (mediapipe / opencv_dnn / onnx, mặc định = đã chọn cho máy này)")
+    parser.add_argument("--detectors", action="store_true",
+                        help="Chạy cả mô hình phụ trong config/detectors.json (điện thoại, tay lái...)")
+    parser.add_argument("--trip", metavar="DIR",
+                        help="Ghi chuyến đi (frame + cảnh báo) vào DIR để làm báo cáo bằng modules.trip_report")
+    args = parser.parse_args(argv)
+
+    processor = FaceProcessor(backend=args.backend) if args.backend else None
+    detectors = DetectorScheduler(synchronous=True) if args.detectors else None
+    recorder = None
+    if args.trip:
+        recorder = TripRecorder(directory=args.trip, user_id="replay")
+        recorder.start()
+    try:
+        result = run_replay(args.video, skip=max(1, args.skip), flip=not args.no_flip,
+                            recipient_email=args.email, processor=processor, rules_path=args.rules,
+                            detectors=detectors, on_frame=recorder.on_frame if recorder else None)
+    finally:
+        if recorder is not None:
+            print(f"🧾 Đã ghi chuyến: {recorder.close()}")
+        if processor is not None:
+            processor.close()
+        if detectors is not None:
+            detectors.close()
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            for event in result["events"]:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    for event in result["events"]:
+        print(f"[{event['t']:>10.3f}s] {event['event']:<5} {event['type']}")
+    print(f"Frame: {result['frames']} (nhận diện {result['processed']}) | "
+          f"Video: {result['video_seconds']:.1f}s | Thực tế: {result['wall_seconds']:.1f}s | "
+          f"Tốc độ: x{result['speed']:.1f}")
+    print(f"Digest: {result['digest']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
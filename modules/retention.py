@@ -0,0 +1,576 @@
+"""
+retention.py – Giữ thư mục data/ trong ngân sách dung lượng: gộp / nén / xóa dữ liệu cũ theo tầng tuổi
+
+Chạy nền (luồng daemon, ưu tiên CPU + I/O thấp nhất) mỗi `interval_min` phút, cấu hình ở config/retention.json.
+Theo tuổi (luôn làm):
+1. Log (logs.txt, alert_latency.jsonl, governor_decisions.jsonl) lớn hơn `log_rotate_mb` -> đổi tên (nguyên tử)
+   rồi nén nối vào 1 file lưu trữ theo tháng data/archive/<tên>.<YYYY-MM><đuôi>.gz (nhiều đoạn nhỏ -> 1 file).
+   Các hàm ghi log mở file ở chế độ append mỗi lần ghi -> lần ghi sau tự tạo file mới, không bị chặn.
+2. Chuyến đã kết thúc quá `rollup_after_hours` giờ: frames.bin (45 byte / frame) -> rollup.npz
+   (tổng hợp theo giây + theo phút, xem trip_report.rollup_trip). Báo cáo / tổng hợp đội xe vẫn đọc được.
+3. Chuyến quá `drop_seconds_after_days` ngày: bỏ phần theo giây, chỉ giữ theo phút.
+4. Video (.mp4, .avi ...) trong data/ KHÔNG gắn với đợt nguy hiểm nào: quá `clip_downsample_after_days` ngày
+   -> giảm một nửa độ phân giải + FPS (cần OpenCV), quá `clip_delete_after_days` ngày -> xóa.
+   Video gắn với đợt nguy hiểm (khoảng thời gian của clip chạm 1 khoảng "danger" của chuyến nào đó,
+   nới thêm `clip_danger_window_sec`) được giữ nguyên vẹn.
+Vẫn vượt ngân sách (`budget_gb`) hoặc ổ đĩa còn ít hơn `min_free_gb` -> làm sớm theo thứ tự:
+xóa log lưu trữ cũ nhất -> gộp mọi chuyến đã kết thúc -> bỏ phần theo giây -> xóa video không nguy hiểm
+(cũ nhất trước) -> xóa chuyến cũ nhất. Chuyến đang ghi, outbox, thông tin đăng nhập... không bao giờ bị đụng tới.
+Kết quả mỗi lượt: data/retention_report.json + metrics dms_retention_reclaimed_bytes_total{action}.
+
+    python -m modules.retention --dry-run
+    python -m modules.retention --budget-gb 5
+"""
+
+import argparse
+import ctypes
+import gzip
+import json
+import os
+import platform
+import shutil
+import sys
+import threading
+import time
+
+from modules import metrics
+from modules.trip_log import FRAMES_FILE, ROLLUP_FILE, STATE_DANGER, trip_is_active
+
+DEFAULT_RETENTION_PATH = os.path.join("config", "retention.json")
+DEFAULT_DATA_DIR = "data"
+REPORT_FILE = "retention_report.json"
+ARCHIVE_DIR = "archive"
+TRIPS_DIR = "trips"
+
+DEFAULT_POLICY = {
+    "enabled": True,
+    "budget_gb": 20.0,
+    "min_free_gb": 2.0,
+    "interval_min": 30.0,
+    "first_run_delay_sec": 120.0,
+    "rollup_after_hours": 24.0,
+    "drop_seconds_after_days": 30.0,
+    "clip_downsample_after_days": 3.0,
+    "clip_delete_after_days": 14.0,
+    "clip_danger_window_sec": 30.0,
+    "clip_max_sec": 600.0,
+    "log_rotate_mb": 10.0,
+    "log_archive_keep_months": 12,
+    "io_pause_sec": 0.05,
+}
+
+LOG_FILES = ("logs.txt", "alert_latency.jsonl", "governor_decisions.jsonl")
+ROTATING_SUFFIX = ".rotating"
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov")
+DOWNSAMPLED_SUFFIX = "_ds"
+# Không bao giờ xử lý (clip đo hiệu năng do người dùng chọn)
+PROTECTED_FILES = ("benchmark_clip.mp4",)
+DELETE_ACTIONS = ("trip_delete", "clip_delete", "log_expire")
+COPY_BLOCK = 1 << 20
+ROTATE_GRACE_SEC = 1.0   # Chờ các lần ghi đang dở vào file vừa đổi tên
+
+RETENTION_RECLAIMED = metrics.Counter(
+    "dms_retention_reclaimed_bytes_total", "Số byte giải phóng bởi retention", ["action"]
+)
+DATA_DIR_BYTES = metrics.Gauge("dms_data_dir_bytes", "Dung lượng thư mục data/ sau lượt retention gần nhất")
+
+# ioprio_set (Linux): số hiệu syscall theo kiến trúc
+_IOPRIO_SYSCALL = {"x86_64": 251, "amd64": 251, "aarch64": 30, "arm64": 30, "i386": 289, "i686": 289}
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_WHO_PROCESS = 1
+_THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+
+
+def load_policy(path=DEFAULT_RETENTION_PATH):
+    policy = dict(DEFAULT_POLICY)
+    try:
+        with open(path, encoding="utf-8") as f:
+            policy.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+    return policy
+
+
+def lower_io_priority():
+    """Hạ ưu tiên CPU + I/O của LUỒNG hiện tại (không ảnh hưởng luồng camera / giao diện)"""
+    applied = []
+    if sys.platform.startswith("linux"):
+        tid = threading.get_native_id()
+        try:
+            os.setpriority(os.PRIO_PROCESS, tid, 19)  # Linux: nice theo từng luồng
+            applied.append("nice")
+        except (OSError, AttributeError):
+            pass
+        number = _IOPRIO_SYSCALL.get(platform.machine().lower())
+        if number is not None:
+            try:
+                libc = ctypes.CDLL(None, use_errno=True)
+                if libc.syscall(number, _IOPRIO_WHO_PROCESS, tid, _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT) == 0:
+                    applied.append("ioprio_idle")
+            except (OSError, AttributeError):
+                pass
+    elif sys.platform == "win32":
+        try:
+            kernel32 = ctypes.windll.kernel32
+            if kernel32.SetThreadPriority(kernel32.GetCurrentThread(), _THREAD_MODE_BACKGROUND_BEGIN):
+                applied.append("background_mode")
+        except (OSError, AttributeError):
+            pass
+    return applied
+
+
+def dir_size(path):
+    total = 0
+    for directory, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.stat(os.path.join(directory, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+class RetentionManager:
+    def __init__(self, data_dir=DEFAULT_DATA_DIR, policy_path=DEFAULT_RETENTION_PATH, policy=None):
+        self.data_dir = data_dir
+        self.policy_path = policy_path
+        self.policy = policy
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._skip_downsample = set()  # Clip giảm chất lượng không nhỏ hơn -> không thử lại
+        self._policy = policy or DEFAULT_POLICY
+        self._dry_run = False
+        self._now = 0.0
+        self._actions = []
+        self._handled = {}  # {đường dẫn: {hành động: byte}} trong lượt hiện tại
+        self._before = self._size = 0
+
+    # --- Luồng nền ---
+    def start(self):
+        if self._thread is not None:
+            return
+        policy = self.policy or load_policy(self.policy_path)
+        if not policy.get("enabled", True):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        lower_io_priority()
+        delay = (self.policy or load_policy(self.policy_path))["first_run_delay_sec"]
+        while not self._stop.wait(delay):
+            try:
+                self.run_once()
+            except Exception as e:  # Lỗi dọn dẹp không được làm dừng ứng dụng
+                print(f"⚠️ [RETENTION] Lỗi: {e}")
+            # Nạp lại cấu hình mỗi lượt (sửa file không cần khởi động lại)
+            delay = (self.policy or load_policy(self.policy_path))["interval_min"] * 60.0
+
+    def _pause(self):
+        if self._stop.wait(self._policy["io_pause_sec"]):
+            raise _Stopped()
+
+    # --- 1 lượt ---
+    def run_once(self, dry_run=False, now=None):
+        """-> báo cáo: dung lượng trước / sau, số byte giải phóng theo hành động, danh sách hành động"""
+        started = time.perf_counter()
+        self._policy = policy = self.policy or load_policy(self.policy_path)
+        self._dry_run = dry_run
+        self._now = time.time() if now is None else now
+        self._actions = []
+        self._handled = {}
+        before = self._before = self._size = dir_size(self.data_dir)
+        try:
+            # Theo tuổi
+            self._rotate_logs()
+            self._expire_log_archives(policy["log_archive_keep_months"])
+            self._rollup_trips(policy["rollup_after_hours"] * 3600.0)
+            self._drop_seconds(policy["drop_seconds_after_days"] * 86400.0)
+            self._age_clips(policy["clip_downsample_after_days"] * 86400.0,
+                            policy["clip_delete_after_days"] * 86400.0)
+            # Theo ngân sách
+            for step in (self._expire_log_archives_until_budget,
+                         lambda: self._rollup_trips(0.0),
+                         lambda: self._drop_seconds(0.0),
+                         self._delete_clips_until_budget,
+                         self._delete_trips_until_budget):
+                if not self._over_budget():
+                    break
+                step()
+        except _Stopped:
+            pass
+
+        after = before - sum(a["bytes"] for a in self._actions) if dry_run else dir_size(self.data_dir)
+        by_action = {}
+        for action in self._actions:
+            by_action[action["action"]] = by_action.get(action["action"], 0) + action["bytes"]
+        report = {
+            "at": self._now,
+            "dry_run": dry_run,
+            "before_bytes": before,
+            "after_bytes": after,
+            "reclaimed_bytes": sum(by_action.values()),
+            "reclaimed_by_action": by_action,
+            "budget_bytes": int(policy["budget_gb"] * 1e9),
+            "over_budget": self._over_budget(after),
+            "actions": self._actions,
+            "elapsed_sec": round(time.perf_counter() - started, 3),
+        }
+        self.last_report = report
+        if not dry_run:
+            DATA_DIR_BYTES.set(after)
+            os.makedirs(self.data_dir, exist_ok=True)
+            tmp_path = os.path.join(self.data_dir, REPORT_FILE + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, os.path.join(self.data_dir, REPORT_FILE))
+            if report["reclaimed_bytes"]:
+                print(f"🧹 [RETENTION] Giải phóng {report['reclaimed_bytes'] / 1e6:.1f} MB "
+                      f"({len(self._actions)} thao tác), data/ = {after / 1e9:.2f} GB")
+        return report
+
+    def _over_budget(self, size=None):
+        policy = self._policy
+        size = self._size if size is None else size
+        if size > policy["budget_gb"] * 1e9:
+            return True
+        try:
+            free = shutil.disk_usage(self.data_dir).free
+        except OSError:
+            return False
+        if self._dry_run:
+            free += self._before - size  # Phần "sẽ" giải phóng
+        return free < policy["min_free_gb"] * 1e9
+
+    def _record(self, action, path, freed):
+        self._actions.append({"action": action, "path": path, "bytes": int(freed)})
+        self._handled.setdefault(path, {})[action] = freed
+        self._size -= freed
+        if not self._dry_run:
+            RETENTION_RECLAIMED.labels(action=action).inc(max(int(freed), 0))
+
+    def _gone(self, path):
+        """Đã xóa trong lượt này (dry-run: file vẫn còn trên đĩa nhưng coi như đã xóa)"""
+        return any(action in DELETE_ACTIONS for action in self._handled.get(path, ()))
+
+    def _remaining(self, path, size):
+        """Dry-run: trừ phần đã tính giải phóng ở bước trước (gộp / giảm chất lượng) của cùng đường dẫn"""
+        if not self._dry_run:
+            return size
+        return max(size - sum(self._handled.get(path, {}).values()), 0)
+
+    # --- Log: đổi tên + nén nối vào file lưu trữ theo tháng ---
+    def _rotate_logs(self):
+        limit = self._policy["log_rotate_mb"] * 1e6
+        leftovers = [name for name in os.listdir(self.data_dir) if name.endswith(ROTATING_SUFFIX)] \
+            if os.path.isdir(self.data_dir) else []
+        for name in LOG_FILES:
+            path = os.path.join(self.data_dir, name)
+            size = _file_size(path)
+            if size < limit:
+                continue
+            if self._dry_run:
+                self._record("log_compact", path, size * 0.9)
+                continue
+            rotated = f"{path}.{int(self._now)}{ROTATING_SUFFIX}"
+            os.replace(path, rotated)
+            leftovers.append(os.path.basename(rotated))
+        if leftovers and not self._dry_run:
+            self._stop.wait(ROTATE_GRACE_SEC)
+        for name in leftovers:  # Kể cả đoạn còn sót từ lượt bị ngắt trước đó
+            if not self._dry_run:
+                self._compact_segment(os.path.join(self.data_dir, name))
+
+    def _compact_segment(self, segment):
+        base = os.path.basename(segment)[:-len(ROTATING_SUFFIX)].rsplit(".", 1)[0]
+        stem, ext = os.path.splitext(base)
+        month = time.strftime("%Y-%m", time.localtime(self._now))
+        archive = os.path.join(self.data_dir, ARCHIVE_DIR, f"{stem}.{month}{ext}.gz")
+        os.makedirs(os.path.dirname(archive), exist_ok=True)
+        size = _file_size(segment)
+        before = _file_size(archive)
+        with open(segment, "rb") as src, open(archive, "ab") as out:
+            start = out.tell()
+            try:
+                # 1 gzip member mới nối vào cuối (gzip / zcat đọc liền các member)
+                with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6) as gz:
+                    while True:
+                        block = src.read(COPY_BLOCK)
+                        if not block:
+                            break
+                        gz.write(block)
+                        self._pause()
+            except BaseException:
+                out.truncate(start)  # Không để member dở dang trong file lưu trữ
+                raise
+        os.remove(segment)
+        self._record("log_compact", os.path.join(self.data_dir, base), size - (_file_size(archive) - before))
+
+    def _log_archives(self):
+        directory = os.path.join(self.data_dir, ARCHIVE_DIR)
+        if not os.path.isdir(directory):
+            return []
+        paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".gz")]
+        return sorted((os.path.getmtime(path), path) for path in paths if not self._gone(path))
+
+    def _delete(self, action, path):
+        size = self._remaining(path, _file_size(path))
+        if not self._dry_run:
+            os.remove(path)
+        self._record(action, path, size)
+
+    def _expire_log_archives(self, keep_months):
+        cutoff = self._now - keep_months * 31 * 86400.0
+        for mtime, path in self._log_archives():
+            if mtime < cutoff:
+                self._delete("log_expire", path)
+
+    def _expire_log_archives_until_budget(self):
+        current_month = time.strftime("%Y-%m", time.localtime(self._now))
+        for _, path in self._log_archives():
+            if not self._over_budget():
+                return
+            if f".{current_month}." not in os.path.basename(path):
+                self._delete("log_expire", path)
+
+    # --- Chuyến đi ---
+    def _trips(self):
+        """[(mtime, thư mục)] các chuyến KHÔNG đang ghi, cũ nhất trước"""
+        from modules.fleet_report import find_trips
+
+        trips = []
+        root = os.path.join(self.data_dir, TRIPS_DIR)
+        if not os.path.isdir(root):
+            return trips
+        for trip_dir in find_trips(root):
+            if trip_is_active(trip_dir) or self._gone(trip_dir):
+                continue
+            mtimes = [os.path.getmtime(p) for p in (os.path.join(trip_dir, FRAMES_FILE),
+                                                    os.path.join(trip_dir, ROLLUP_FILE)) if os.path.exists(p)]
+            if mtimes:
+                trips.append((max(mtimes), trip_dir))
+        trips.sort()
+        return trips
+
+    def _rollup_trips(self, min_age):
+        from modules.trip_report import rollup_trip
+
+        for mtime, trip_dir in self._trips():
+            frames_path = os.path.join(trip_dir, FRAMES_FILE)
+            if self._now - mtime < min_age or not os.path.exists(frames_path) \
+                    or "trip_rollup" in self._handled.get(trip_dir, ()):
+                continue
+            if not _file_size(frames_path):
+                # Chuyến không có frame nào (Bắt đầu rồi Dừng ngay) -> không có gì để giữ
+                self._record("trip_delete", trip_dir, dir_size(trip_dir))
+                if not self._dry_run:
+                    shutil.rmtree(trip_dir, ignore_errors=True)
+                continue
+            if self._dry_run:
+                self._record("trip_rollup", trip_dir, _file_size(frames_path))
+                continue
+            try:
+                self._record("trip_rollup", trip_dir, rollup_trip(trip_dir))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ [RETENTION] Không gộp được chuyến {trip_dir}: {e}")
+            self._pause()
+
+    def _drop_seconds(self, min_age):
+        from modules.trip_report import drop_seconds, rollup_resolution
+
+        for mtime, trip_dir in self._trips():
+            # Dry-run: chuyến đã "gộp" / "thu gọn" ở bước trước đã được tính hết phần giải phóng
+            if self._now - mtime < min_age or (self._dry_run and trip_dir in self._handled) \
+                    or rollup_resolution(trip_dir) != 1:
+                continue
+            if self._dry_run:
+                self._record("trip_drop_seconds", trip_dir, _file_size(os.path.join(trip_dir, ROLLUP_FILE)) * 0.5)
+                continue
+            try:
+                self._record("trip_drop_seconds", trip_dir, drop_seconds(trip_dir))
+            except (OSError, ValueError) as e:
+                print(f"⚠️ [RETENTION] Không thu gọn được chuyến {trip_dir}: {e}")
+            self._pause()
+
+    def _delete_trips_until_budget(self):
+        """Chuyến cũ nhất trước; giữ chuyến có đợt nguy hiểm (vài KB sau khi gộp, là căn cứ giữ clip)"""
+        for _, trip_dir in self._trips():
+            if not self._over_budget():
+                return
+            if self._trip_danger(trip_dir):
+                continue
+            self._record("trip_delete", trip_dir, self._remaining(trip_dir, dir_size(trip_dir)))
+            if not self._dry_run:
+                shutil.rmtree(trip_dir, ignore_errors=True)
+            self._pause()
+
+    # --- Video ---
+    @staticmethod
+    def _trip_danger(trip_dir):
+        """Các khoảng nguy hiểm (giờ hệ thống) của 1 chuyến"""
+        from modules.trip_report import analyze_events, trip_events
+
+        try:
+            meta, t0, events = trip_events(trip_dir)
+        except (OSError, ValueError, KeyError):
+            return []
+        if not events:
+            return []
+        t0 = events[0]["t"] if t0 is None else t0
+        t_end = max(meta.get("last_t") or 0.0, events[-1]["t"])
+        # Đồng hồ của chuyến (có thể là thời gian video khi phát lại) -> giờ hệ thống
+        offset = (meta.get("started_at") or t0) - t0
+        _, state_intervals, _ = analyze_events(events, t0, t_end)
+        return [(start + offset, end + offset) for start, end, state in state_intervals if state == STATE_DANGER]
+
+    def _danger_intervals(self):
+        """Các khoảng nguy hiểm của mọi chuyến còn trên đĩa (kể cả chuyến đang ghi)"""
+        from modules.fleet_report import find_trips
+
+        root = os.path.join(self.data_dir, TRIPS_DIR)
+        return [interval for trip_dir in (find_trips(root) if os.path.isdir(root) else ())
+                for interval in self._trip_danger(trip_dir)]
+
+    def _clips(self):
+        """[(mtime, đường dẫn)] video trong data/ (trừ file được bảo vệ), cũ nhất trước"""
+        clips = []
+        for directory, _, filenames in os.walk(self.data_dir):
+            for name in filenames:
+                if name in PROTECTED_FILES or not name.lower().endswith(VIDEO_EXTENSIONS):
+                    continue
+                path = os.path.join(directory, name)
+                if self._gone(path):
+                    continue
+                try:
+                    clips.append((os.path.getmtime(path), path))
+                except OSError:
+                    pass
+        clips.sort()
+        return clips
+
+    def _non_danger_clips(self):
+        clips = self._clips()
+        if not clips:
+            return []
+        danger = self._danger_intervals()
+        window = self._policy["clip_danger_window_sec"]
+        clip_sec = self._policy["clip_max_sec"]
+
+        def tied_to_danger(mtime):
+            # Clip kết thúc lúc mtime, dài tối đa clip_max_sec
+            start, end = mtime - clip_sec - window, mtime + window
+            return any(s < end and e > start for s, e in danger)
+
+        return [(mtime, path) for mtime, path in clips if not tied_to_danger(mtime)]
+
+    def _age_clips(self, downsample_age, delete_age):
+        for mtime, path in self._non_danger_clips():
+            age = self._now - mtime
+            if age >= delete_age:
+                self._delete("clip_delete", path)
+            elif age >= downsample_age and path not in self._skip_downsample \
+                    and "clip_downsample" not in self._handled.get(path, ()) \
+                    and not os.path.splitext(path)[0].endswith(DOWNSAMPLED_SUFFIX):
+                self._downsample_clip(path, mtime)
+            self._pause()
+
+    def _delete_clips_until_budget(self):
+        for _, path in self._non_danger_clips():
+            if not self._over_budget():
+                return
+            self._delete("clip_delete", path)
+            self._pause()
+
+    def _downsample_clip(self, path, mtime):
+        """Nửa độ phân giải, nửa FPS (giữ mtime gốc -> tuổi clip không đổi)"""
+        try:
+            import cv2
+        except ImportError:
+            return  # Không có OpenCV: chỉ còn tầng xóa
+        size = _file_size(path)
+        if self._dry_run:
+            self._record("clip_downsample", path, size * 0.75)
+            return
+        stem, _ = os.path.splitext(path)
+        out_path = f"{stem}{DOWNSAMPLED_SUFFIX}.mp4"
+        tmp_path = out_path + ".tmp.mp4"
+        cap = cv2.VideoCapture(path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) // 2
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) // 2
+        writer = None
+        try:
+            if width <= 0 or height <= 0:
+                self._skip_downsample.add(path)
+                return
+            writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*"mp4v"), fps / 2, (width, height))
+            index = 0
+            while True:
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                if index % 2 == 0:
+                    writer.write(cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA))
+                index += 1
+                if index % 300 == 0:
+                    self._pause()
+        finally:
+            cap.release()
+            if writer is not None:
+                writer.release()
+        new_size = _file_size(tmp_path)
+        if not new_size or new_size >= size:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self._skip_downsample.add(path)
+            return
+        os.utime(tmp_path, (mtime, mtime))
+        os.replace(tmp_path, out_path)
+        os.remove(path)
+        self._record("clip_downsample", path, size - new_size)
+
+
+class _Stopped(Exception):
+    """stop() được gọi giữa lượt -> dừng ngay ở ranh giới thao tác"""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dọn dẹp / gộp dữ liệu cũ trong data/ theo ngân sách dung lượng")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    parser.add_argument("--config", default=DEFAULT_RETENTION_PATH, help="File cấu hình retention")
+    parser.add_argument("--budget-gb", type=float, help="Ghi đè ngân sách dung lượng (GB)")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ liệt kê, không sửa / xóa gì")
+    args = parser.parse_args(argv)
+
+    policy = load_policy(args.config)
+    if args.budget_gb is not None:
+        policy["budget_gb"] = args.budget_gb
+    manager = RetentionManager(args.data_dir, args.config, policy=policy)
+    lower_io_priority()
+    report = manager.run_once(dry_run=args.dry_run)
+    for action in report["actions"]:
+        print(f"  {action['action']:<18} {action['bytes'] / 1e6:>9.2f} MB  {action['path']}")
+    print(f"{'(thử) ' if args.dry_run else ''}Giải phóng {report['reclaimed_bytes'] / 1e6:.1f} MB | "
+          f"data/ {report['before_bytes'] / 1e9:.2f} -> {report['after_bytes'] / 1e9:.2f} GB "
+          f"(ngân sách {policy['budget_gb']} GB){' | VẪN VƯỢT NGÂN SÁCH' if report['over_budget'] else ''}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
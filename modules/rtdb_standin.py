@@ -0,0 +1,126 @@
+"""
+rtdb_standin.py – Server giả lập Firebase Realtime Database (REST) chạy cục bộ
+Chỉ hỗ trợ những gì OutboxUploader dùng: PATCH/PUT/GET "<path>.json", body JSON (có thể gzip).
+Dùng để kiểm thử đồng bộ khi không có mạng / không muốn ghi lên Firebase thật.
+
+    python -m modules.rtdb_standin --port 9000
+"""
+
+import argparse
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    store = None  # RealtimeDBStandIn
+
+    def log_message(self, format, *args):
+        pass
+
+    def _path_parts(self):
+        path = self.path.split("?", 1)[0]
+        if not path.endswith(".json"):
+            return None
+        return [p for p in path[:-len(".json")].split("/") if p]
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        if self.headers.get("Content-Encoding") == "gzip":
+            raw = gzip.decompress(raw)
+        return json.loads(raw.decode("utf-8"))
+
+    def _reply(self, status, value):
+        body = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = self._path_parts()
+        if parts is None:
+            self._reply(400, {"error": "path must end with .json"})
+            return
+        self._reply(200, self.store.get(parts))
+
+    def do_PATCH(self):
+        parts = self._path_parts()
+        if parts is None or self.store.fail_next > 0:
+            if self.store.fail_next > 0:
+                self.store.fail_next -= 1
+            self._reply(503 if parts is not None else 400, {"error": "unavailable"})
+            return
+        body = self._read_body()
+        for sub_path, value in body.items():
+            self.store.set(parts + [p for p in sub_path.split("/") if p], value)
+        self.store.requests += 1
+        self._reply(200, body)
+
+    def do_PUT(self):
+        parts = self._path_parts()
+        if parts is None:
+            self._reply(400, {"error": "path must end with .json"})
+            return
+        body = self._read_body()
+        self.store.set(parts, body)
+        self.store.requests += 1
+        self._reply(200, body)
+
+
+class RealtimeDBStandIn:
+    def __init__(self, host="127.0.0.1", port=0):
+        self.data = {}
+        self.requests = 0
+        self.fail_next = 0  # Số request PATCH kế tiếp sẽ trả 503 (giả lập lỗi server)
+        self._lock = threading.Lock()
+        handler = type("Handler", (_StandInHandler,), {"store": self})
+        self._httpd = ThreadingHTTPServer((host, port), handler)
+        self._httpd.daemon_threads = True
+        self.url = f"http://{host}:{self._httpd.server_address[1]}"
+        self._thread = None
+
+    def get(self, parts):
+        with self._lock:
+            node = self.data
+            for p in parts:
+                if not isinstance(node, dict) or p not in node:
+                    return None
+                node = node[p]
+            return node
+
+    def set(self, parts, value):
+        with self._lock:
+            node = self.data
+            for p in parts[:-1]:
+                node = node.setdefault(p, {})
+            node[parts[-1]] = value
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Server giả lập Firebase Realtime Database")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args(argv)
+    server = RealtimeDBStandIn(args.host, args.port)
+    print(f"RTDB giả lập tại {server.url} (Ctrl+C để dừng)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
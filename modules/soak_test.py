@@ -0,0 +1,540 @@
+"""
+soak_test.py – Chạy thử dài hạn (soak test): nhiều giờ thời gian giả lập, phát hiện rò rỉ bộ nhớ / luồng / file
+
+Dựng lại đúng các bước của 1 ca lái trên VideoThread + MainWindow (không cần cửa sổ):
+    đọc frame -> FaceProcessor -> mô hình phụ -> AlertEngine (âm thanh / email thật qua luồng riêng)
+    -> telemetry (outbox SQLite) -> đổi sang QImage/QPixmap (nếu có PySide6) -> MJPEG (tùy chọn)
+và định kỳ Dừng / Bắt đầu lại (tạo lại FaceProcessor) như khi tài xế bấm nút.
+Đồng hồ cảnh báo là ManualClock (mỗi frame + 1/fps giây) nên chạy nhanh nhất CPU cho phép:
+12 giờ giả lập không cần chờ 12 giờ.
+
+Nguồn frame: video đã ghi (phát lặp vô hạn) hoặc ảnh tổng hợp. Với ảnh tổng hợp (không có mặt người),
+kịch bản buồn ngủ (DrowsyScript) ghi đè chỉ số khuôn mặt -> cảnh báo, âm thanh, email vẫn được kích hoạt.
+Email KHÔNG gửi thật (giả lập độ trễ mạng), âm thanh phát qua pygame với SDL_AUDIODRIVER=dummy.
+
+Mỗi `--sample-sec` giây giả lập ghi: RSS, bộ nhớ Python (tracemalloc), số luồng Python / luồng hệ điều hành,
+số file descriptor (handle) đang mở. Bỏ qua giai đoạn làm nóng, rồi coi là RÒ RỈ khi 1 chỉ số tăng liên tục:
+trung vị 3 phần ba sau làm nóng tăng dần + tổng tăng vượt ngưỡng + độ dốc (Theil–Sen, theo giờ giả lập) vượt ngưỡng.
+Cuối buổi in các dòng code cấp phát tăng nhiều nhất (tracemalloc, so với lúc hết làm nóng).
+
+    python -m modules.soak_test --hours 12 --no-inference            # Chỉ phần ứng dụng (nhanh)
+    python -m modules.soak_test --video data/trip.mp4 --hours 4      # Đủ pipeline với video lặp
+    python -m modules.soak_test --hours 12 --out data/soak_report.json
+Trả mã thoát 1 nếu có chỉ số bị coi là rò rỉ.
+"""
+
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from modules import metrics
+from modules.alert_logic import AlertEngine
+from modules.alert_rules import DEFAULT_RULES_PATH
+from modules.clock import ManualClock
+from modules.detection import DetectionRecord
+from modules.detector_scheduler import DEFAULT_DETECTORS_PATH, DetectorScheduler
+from modules.driver_profile import DriverProfileStore
+from modules.head_motion import FRONTAL_ROLL_DEG
+from modules.identity import IdentityStore, IdentityVerifier
+from modules.latency_trace import AlertLatencyTracer
+from modules.outbox import Outbox
+from modules.sound import SoundModule
+from modules.telemetry import TelemetryRecorder
+
+MB = 1024 * 1024
+
+# Chỉ số theo dõi: (tổng tăng tối thiểu, độ dốc tối thiểu / giờ giả lập) để bị coi là rò rỉ
+DEFAULT_LIMITS = {
+    "rss_bytes": (32 * MB, 8 * MB),
+    "traced_bytes": (8 * MB, 2 * MB),
+    "threads": (2, 0.5),
+    "native_threads": (2, 0.5),
+    "open_fds": (4, 1.0),
+}
+_MAX_SLOPE_POINTS = 400  # Theil–Sen O(n²): giảm mẫu nếu nhiều điểm hơn
+
+
+# --- Nguồn frame ---
+class LoopingVideoSource:
+    """Phát lặp 1 video đã ghi (hết file -> tua về đầu)"""
+
+    def __init__(self, path):
+        import cv2
+        self._cv2 = cv2
+        self.path = path
+        self.loops = 0
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"Không mở được video: {path}")
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if not ret:
+            self.loops += 1
+            self.cap.set(self._cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read()
+            if not ret:
+                # Một số container không tua được -> mở lại
+                self.cap.release()
+                self.cap = self._cv2.VideoCapture(self.path)
+                ret, frame = self.cap.read()
+                if not ret:
+                    raise IOError(f"Không đọc được frame nào từ {self.path}")
+        return frame
+
+    def close(self):
+        self.cap.release()
+
+
+class SyntheticSource:
+    """Ảnh tổng hợp (nền chuyển màu + khối sáng di chuyển + nhiễu), tạo sẵn `pool` frame rồi dùng vòng"""
+
+    def __init__(self, width=640, height=480, pool=30):
+        import numpy as np
+        rng = np.random.default_rng(0)
+        gradient = np.linspace(40, 200, width, dtype=np.float32)[None, :, None]
+        base = np.broadcast_to(gradient, (height, width, 3))
+        self.frames = []
+        for i in range(pool):
+            frame = (base + rng.normal(0, 12, (height, width, 3))).clip(0, 255).astype(np.uint8)
+            x = int((width - 160) * (0.5 + 0.4 * np.sin(2 * np.pi * i / pool)))
+            frame[height // 4:height // 4 + 200, x:x + 160] = (180, 170, 210)
+            self.frames.append(frame)
+        self._index = 0
+
+    def read(self):
+        frame = self.frames[self._index]
+        self._index = (self._index + 1) % len(self.frames)
+        return frame
+
+    def close(self):
+        self.frames = []
+
+
+# --- Kịch bản buồn ngủ (ghi đè chỉ số khuôn mặt khi nguồn không có mặt người thật) ---
+class DrowsyScript:
+    """
+    Chu kỳ `period` giây: lái bình thường + chớp mắt mỗi 4s, rồi lần lượt
+    nhắm mắt lâu, ngáp, nghiêng đầu, nhìn xuống và mất mặt -> đi qua mọi nhánh cảnh báo chính.
+    """
+
+    def __init__(self, period=120.0):
+        self.period = period
+
+    def at(self, t):
+        phase = t % self.period
+        # Góc thô như FaceProcessor trả về: nhìn thẳng -> roll ±180 (gật / ngẩng nằm ở roll, xem head_motion.py)
+        values = {"face_found": True, "ear": 0.31, "mar": 0.2, "roll": FRONTAL_ROLL_DEG, "pitch": 0.0, "yaw": 0.0,
+                  "gaze_zone": "road"}
+        if phase % 4.0 < 0.15:
+            values["ear"] = 0.12          # Chớp mắt
+        if 20.0 <= phase < 23.5:
+            values["ear"] = 0.1           # Nhắm mắt lâu
+        elif 40.0 <= phase < 46.0:
+            values["mar"] = 0.85          # Ngáp
+        elif 60.0 <= phase < 64.0:
+            values["roll"] = FRONTAL_ROLL_DEG - 28.0  # Nghiêng đầu (ngửa ra sau 28 độ)
+        elif 80.0 <= phase < 85.0:
+            values["roll"] = -150.0       # Nhìn xuống 30 độ (roll thô quá 180 -> -150; không nhìn đường)
+            values["gaze_zone"] = "lap"
+        elif 100.0 <= phase < 104.0:
+            return {"face_found": False}  # Mất mặt
+        return values
+
+
+class ScriptedProcessor:
+    """Thay FaceProcessor khi chỉ soak phần ứng dụng (--no-inference): không chạy mô hình nào"""
+
+    def process_frame(self, frame, timestamp=None, annotate=True):
+        return frame, DetectionRecord(timestamp=timestamp, camera_state="ok")
+
+    def close(self):
+        pass
+
+
+# --- Sink âm thanh / email (giống MainWindow.play_sound / send_email) ---
+class SoakSink:
+    def __init__(self, sound_module, tracer, email_delay=0.5):
+        self.sound_module = sound_module
+        self.tracer = tracer
+        self.email_delay = email_delay
+        self.sounds = 0
+        self.emails = 0
+
+    def play_sound(self, sound_file, loop, trace):
+        self.sounds += 1
+        self.sound_module.play_sound(sound_file, loop=loop, on_started=self.tracer.sound_callback(trace))
+
+    def send_email(self, recipient, subject, message, trace):
+        self.emails += 1
+
+        def _send():
+            started = time.perf_counter()
+            time.sleep(self.email_delay)  # Giả lập SMTP, không gửi thật
+            sent_at = time.perf_counter()
+            metrics.EMAIL_DISPATCH_LATENCY.labels(result="ok").observe(sent_at - started)
+            self.tracer.record("email", trace, sent_at)
+
+        threading.Thread(target=_send, daemon=True).start()
+
+
+class QtFrameSink:
+    """Đổi frame sang QImage -> QPixmap thu nhỏ mỗi frame (giống VideoThread + update_image)"""
+
+    def __init__(self, size=(640, 480)):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PySide6.QtCore import Qt
+        from PySide6.QtGui import QGuiApplication, QImage, QPixmap
+        self._app = QGuiApplication.instance() or QGuiApplication(sys.argv[:1])
+        self._QImage, self._QPixmap, self._Qt = QImage, QPixmap, Qt
+        self.size = size
+
+    def show(self, frame):
+        import cv2
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        h, w, ch = rgb.shape
+        image = self._QImage(rgb.data, w, h, ch * w, self._QImage.Format.Format_RGB888)
+        self._QPixmap.fromImage(image).scaled(
+            self.size[0], self.size[1],
+            self._Qt.AspectRatioMode.KeepAspectRatio, self._Qt.TransformationMode.SmoothTransformation
+        )
+        self._app.processEvents()
+
+
+# --- Đo tài nguyên ---
+def open_fd_count():
+    """Số file descriptor (Windows: handle) đang mở, None nếu không đo được"""
+    for fd_dir in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(fd_dir))
+        except OSError:
+            continue
+    try:
+        import psutil
+        process = psutil.Process()
+        return process.num_handles() if sys.platform == "win32" else process.num_fds()
+    except Exception:
+        return None
+
+
+def native_thread_count():
+    """Số luồng hệ điều hành của tiến trình (kể cả luồng C của pygame / onnxruntime / OpenCV)"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().num_threads()
+    except Exception:
+        return None
+
+
+def sample_resources():
+    gc.collect()  # Chỉ tính đối tượng còn được giữ, không tính rác chưa dọn
+    return {
+        "rss_bytes": metrics.process_resident_memory_bytes(),
+        "traced_bytes": tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None,
+        "threads": threading.active_count(),
+        "native_threads": native_thread_count(),
+        "open_fds": open_fd_count(),
+    }
+
+
+# --- Phát hiện tăng trưởng ---
+def theil_sen_slope(xs, ys):
+    """Trung vị độ dốc mọi cặp điểm (ít bị ảnh hưởng bởi đột biến đơn lẻ như GC, tải mô hình)"""
+    step = max(1, len(xs) // _MAX_SLOPE_POINTS)
+    xs, ys = xs[::step], ys[::step]
+    slopes = [(ys[j] - ys[i]) / (xs[j] - xs[i])
+              for i in range(len(xs)) for j in range(i + 1, len(xs)) if xs[j] > xs[i]]
+    return statistics.median(slopes) if slopes else 0.0
+
+
+def detect_growth(hours, values, min_growth, min_slope):
+    """
+    hours: thời điểm (giờ giả lập) sau làm nóng; values: giá trị chỉ số.
+    Rò rỉ = trung vị 3 phần ba tăng dần VÀ (cuối - đầu) > min_growth VÀ độ dốc > min_slope / giờ.
+    """
+    points = [(h, v) for h, v in zip(hours, values) if v is not None]
+    if len(points) < 6:
+        return None
+    xs = [h for h, _ in points]
+    ys = [v for _, v in points]
+    third = len(ys) // 3
+    medians = (statistics.median(ys[:third]), statistics.median(ys[third:-third]),
+               statistics.median(ys[-third:]))
+    growth = medians[2] - medians[0]
+    slope = theil_sen_slope(xs, ys)
+    return {
+        "medians": medians,
+        "growth": growth,
+        "slope_per_hour": slope,
+        "leaking": medians[0] < medians[1] < medians[2] and growth > min_growth and slope > min_slope,
+    }
+
+
+def top_allocations(baseline, snapshot, limit=10):
+    """Các dòng code có lượng cấp phát còn giữ tăng nhiều nhất kể từ baseline"""
+    ignore = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen *>"))
+    stats = snapshot.filter_traces(ignore).compare_to(baseline.filter_traces(ignore), "lineno")
+    return [
+        {"where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+         "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+        for stat in stats[:limit] if stat.size_diff > 0
+    ]
+
+
+# --- Pipeline ---
+class SoakPipeline:
+    """1 "phiên giám sát" giả lập, có start()/stop() giống start_video()/stop_video() của MainWindow"""
+
+    def __init__(self, source, processor_factory, workdir, fps=30.0, script=None, qt_sink=None,
+                 mjpeg=False, rebuild_processor=True, rules_path=DEFAULT_RULES_PATH,
+                 detectors_path=DEFAULT_DETECTORS_PATH, email_delay=0.5):
+        self.source = source
+        self.processor_factory = processor_factory
+        self.frame_interval = 1.0 / fps
+        self.script = script
+        self.qt_sink = qt_sink
+        self.rebuild_processor = rebuild_processor
+        self.clock = ManualClock()
+        self.sound_module = SoundModule()
+        tracer = AlertLatencyTracer(log_path=os.path.join(workdir, "alert_latency.jsonl"))
+        self.sink = SoakSink(self.sound_module, tracer, email_delay=email_delay)
+        driver_id = "soak-test"
+        self.engine = AlertEngine(
+            clock=self.clock, sink=self.sink, rules_path=rules_path,
+            profile_store=DriverProfileStore(os.path.join(workdir, "driver_profiles.json")), driver_id=driver_id
+        )
+        self.engine.config_recipient_email = "soak@example.invalid"
+        self.outbox = Outbox(os.path.join(workdir, "outbox.sqlite3"))
+        self.telemetry = TelemetryRecorder(self.outbox, user_id=driver_id)
+        self.engine.alert_listeners.append(self.telemetry.on_alert)
+        self.detectors = DetectorScheduler(config_path=detectors_path)
+        self.identity = IdentityVerifier(IdentityStore(os.path.join(workdir, "identity.json")), driver_id)
+        self.mjpeg_server = None
+        if mjpeg:
+            from modules.mjpeg_server import MJPEGServer
+            self.mjpeg_server = MJPEGServer(host="127.0.0.1", port=0)
+        self.processor = None
+        self.frames = 0
+        self.sessions = 0
+
+    def start(self):
+        self.engine.init_state_vars()
+        if self.processor is None:
+            self.processor = self.processor_factory()
+        self.processor.identity = self.identity
+        self.detectors.reset()
+        self.detectors.start()
+        self.identity.reset()
+        if self.mjpeg_server is not None:
+            self.mjpeg_server.start()
+        self.sessions += 1
+
+    def stop(self):
+        self.detectors.stop()
+        if self.mjpeg_server is not None:
+            self.mjpeg_server.stop()
+        self.telemetry.close()
+        self.sound_module.stop_sound()
+        if self.rebuild_processor and self.processor is not None:
+            self.processor.close()
+            self.processor = None
+
+    def step(self):
+        now = self.clock.now() + self.frame_interval
+        self.clock.set(now)
+        frame = self.source.read()
+        annotated, data = self.processor.process_frame(frame, timestamp=now, annotate=True)
+        self.frames += 1
+        data["frame_seq"] = self.frames
+        if self.script is not None:
+            data.update(self.script.at(now))
+        self.detectors.submit(frame, now)
+        self.detectors.apply(data, now)
+        self.engine.evaluate(data)
+        self.telemetry.on_frame(data, now)
+        if self.mjpeg_server is not None:
+            self.mjpeg_server.publish(annotated)
+        if self.qt_sink is not None:
+            self.qt_sink.show(annotated)
+        return now
+
+    def close(self):
+        self.stop()
+        if self.processor is not None:
+            self.processor.close()
+            self.processor = None
+        self.detectors.close()
+        self.outbox.close()
+        self.source.close()
+
+
+def run_soak(pipeline, hours=12.0, sample_sec=60.0, warmup_sec=600.0, restart_every_sec=1800.0,
+             speed=0.0, max_wall_sec=None, limits=DEFAULT_LIMITS, trace_frames=1, on_sample=None):
+    """
+    Chạy `hours` giờ giả lập. speed > 0: không nhanh hơn `speed` x thời gian thực (0 = nhanh nhất có thể).
+    Trả về dict báo cáo: samples, checks (theo chỉ số), top_allocations, passed.
+    """
+    end = hours * 3600.0
+    samples = []
+    baseline = None
+    next_sample = 0.0
+    next_restart = restart_every_sec if restart_every_sec > 0 else float("inf")
+    wall_start = time.perf_counter()
+    now = 0.0
+    pipeline.start()
+    try:
+        while now < end:
+            now = pipeline.step()
+            if now >= next_restart:
+                pipeline.stop()
+                pipeline.start()
+                next_restart += restart_every_sec
+            if speed > 0:
+                ahead = now / speed - (time.perf_counter() - wall_start)
+                if ahead > 0:
+                    time.sleep(ahead)
+            if now < next_sample:
+                continue
+            next_sample += sample_sec
+            if baseline is None and now >= warmup_sec:
+                # Hết làm nóng: bắt đầu theo dõi cấp phát từ đây (chỉ thấy cấp phát mới, không thấy lúc nạp mô hình)
+                tracemalloc.start(trace_frames)
+                baseline = tracemalloc.take_snapshot()
+            sample = {"sim_sec": round(now, 1), "wall_sec": round(time.perf_counter() - wall_start, 2),
+                      "frames": pipeline.frames, "sessions": pipeline.sessions}
+            sample.update(sample_resources())
+            samples.append(sample)
+            if on_sample is not None:
+                on_sample(sample)
+            if max_wall_sec is not None and sample["wall_sec"] >= max_wall_sec:
+                break
+        allocations = top_allocations(baseline, tracemalloc.take_snapshot()) if baseline is not None else []
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        pipeline.close()
+
+    steady = [s for s in samples if s["sim_sec"] >= warmup_sec]
+    hours_axis = [s["sim_sec"] / 3600.0 for s in steady]
+    checks = {}
+    for name, (min_growth, min_slope) in limits.items():
+        result = detect_growth(hours_axis, [s[name] for s in steady], min_growth, min_slope)
+        if result is not None:
+            checks[name] = result
+    return {
+        "sim_hours": round(now / 3600.0, 3),
+        "wall_seconds": round(time.perf_counter() - wall_start, 1),
+        "frames": pipeline.frames,
+        "sessions": pipeline.sessions,
+        "sounds": pipeline.sink.sounds,
+        "emails": pipeline.sink.emails,
+        "samples": samples,
+        "checks": checks,
+        "top_allocations": allocations,
+        "passed": bool(checks) and not any(c["leaking"] for c in checks.values()),
+    }
+
+
+def _format_value(name, value):
+    if value is None:
+        return "—"
+    return f"{value / MB:.1f} MB" if name.endswith("_bytes") else f"{value:g}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Soak test: chạy nhiều giờ giả lập, phát hiện rò rỉ tài nguyên")
+    parser.add_argument("--video", help="Video đã ghi (phát lặp). Bỏ trống = ảnh tổng hợp + kịch bản buồn ngủ")
+    parser.add_argument("--hours", type=float, default=12.0, help="Số giờ giả lập (mặc định 12)")
+    parser.add_argument("--fps", type=float, default=30.0, help="FPS giả lập")
+    parser.add_argument("--sample-sec", type=float, default=60.0, help="Chu kỳ đo tài nguyên (giây giả lập)")
+    parser.add_argument("--warmup-sec", type=float, default=600.0, help="Bỏ qua giai đoạn làm nóng (giây giả lập)")
+    parser.add_argument("--restart-every", type=float, default=1800.0,
+                        help="Dừng / Bắt đầu lại mỗi N giây giả lập (0 = không)")
+    parser.add_argument("--reuse-processor", action="store_true",
+                        help="Giữ FaceProcessor qua các lần Dừng/Bắt đầu (mặc định tạo lại)")
+    parser.add_argument("--no-inference", action="store_true",
+                        help="Không chạy mô hình khuôn mặt (chỉ soak phần ứng dụng, nhanh hơn nhiều)")
+    parser.add_argument("--script", action="store_true", help="Ghi đè chỉ số bằng kịch bản buồn ngủ cả khi dùng video")
+    parser.add_argument("--no-qt", action="store_true", help="Bỏ bước đổi sang QImage/QPixmap")
+    parser.add_argument("--mjpeg", action="store_true", help="Bật cả server MJPEG (cổng ngẫu nhiên)")
+    parser.add_argument("--speed", type=float, default=0.0, help="Giới hạn tốc độ (x thời gian thực), 0 = tối đa")
+    parser.add_argument("--max-wall-min", type=float, default=None, help="Dừng sớm sau N phút thực")
+    parser.add_argument("--email-delay", type=float, default=0.5, help="Độ trễ giả lập mỗi email (giây thực)")
+    parser.add_argument("--audible", action="store_true", help="Phát âm thanh ra loa thật")
+    parser.add_argument("--rules", default=DEFAULT_RULES_PATH, help="File luật cảnh báo (JSON)")
+    parser.add_argument("--out", default=os.path.join("data", "soak_report.json"), help="File báo cáo JSON")
+    args = parser.parse_args(argv)
+
+    if not args.audible:
+        os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+    source = LoopingVideoSource(args.video) if args.video else SyntheticSource()
+    script = DrowsyScript() if (args.script or not args.video) else None
+    if args.no_inference:
+        processor_factory = ScriptedProcessor
+    else:
+        from modules.face_processor import _default_factory
+        processor_factory = _default_factory
+    qt_sink = None
+    if not args.no_qt:
+        try:
+            qt_sink = QtFrameSink()
+        except ImportError:
+            print("⚠️ Không có PySide6 -> bỏ bước QImage/QPixmap")
+
+    with tempfile.TemporaryDirectory(prefix="dms_soak_") as workdir:
+        pipeline = SoakPipeline(
+            source, processor_factory, workdir, fps=args.fps, script=script, qt_sink=qt_sink,
+            mjpeg=args.mjpeg, rebuild_processor=not args.reuse_processor, rules_path=args.rules,
+            email_delay=args.email_delay,
+        )
+
+        def progress(sample):
+            print(f"[{sample['sim_sec'] / 3600:6.2f} h | {sample['wall_sec']:8.1f}s thực] "
+                  f"RSS {_format_value('rss_bytes', sample['rss_bytes']):>9} | "
+                  f"traced {_format_value('traced_bytes', sample['traced_bytes']):>9} | "
+                  f"luồng {sample['threads']}/{_format_value('', sample['native_threads'])} | "
+                  f"fd {_format_value('', sample['open_fds'])}")
+
+        report = run_soak(
+            pipeline, hours=args.hours, sample_sec=args.sample_sec, warmup_sec=args.warmup_sec,
+            restart_every_sec=args.restart_every, speed=args.speed,
+            max_wall_sec=args.max_wall_min * 60 if args.max_wall_min else None, on_sample=progress,
+        )
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n{report['sim_hours']} giờ giả lập trong {report['wall_seconds']}s | {report['frames']} frame | "
+          f"{report['sessions']} phiên | {report['sounds']} âm thanh | {report['emails']} email")
+    for name, check in report["checks"].items():
+        mark = "❌ RÒ RỈ" if check["leaking"] else "✅"
+        medians = " -> ".join(_format_value(name, m) for m in check["medians"])
+        print(f"{name:15} {medians:36} dốc {_format_value(name, check['slope_per_hour'])}/giờ  {mark}")
+    if report["top_allocations"]:
+        print("\nCấp phát tăng nhiều nhất (kể từ hết làm nóng):")
+        for entry in report["top_allocations"]:
+            print(f"  {entry['size_diff'] / 1024:10.1f} KiB  {entry['count_diff']:+8d}  {entry['where']}")
+    if not report["checks"]:
+        print("⚠️ Không đủ mẫu sau làm nóng để kết luận (tăng --hours hoặc giảm --warmup-sec)")
+    print(f"\n=> {'ĐẠT' if report['passed'] else 'KHÔNG ĐẠT'} (báo cáo: {args.out})")
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,29 +1,51 @@
 """
 sound.py – Phát âm thanh từ file .mp3 trong thư mục assets
+pygame được import + khởi tạo mixer TRỄ (lần phát đầu tiên hoặc preload() chạy nền),
+để không làm chậm lúc mở cửa sổ.
 """
-import threading
-import pygame
-from playsound import playsound
-import os
-
-import pygame
 import os
 import threading
+import time
+
+from modules import metrics
 
 class SoundModule:
     def __init__(self):
-        # Khởi tạo mixer của pygame
-        try:
-            pygame.mixer.init()
-            self.is_playing = False
-        except Exception as e:
-            print(f"Lỗi khởi tạo âm thanh: {e}")
+        self.is_playing = False
+        self._pygame = None
+        self._init_failed = False
+        self._init_lock = threading.Lock()
 
-    def play_sound(self, filename="sound.mp3", loop=False):
+    def _mixer(self):
+        """Import pygame và khởi tạo mixer (1 lần duy nhất). Trả về pygame.mixer hoặc None nếu lỗi"""
+        if self._pygame is not None:
+            return self._pygame.mixer
+        with self._init_lock:
+            if self._init_failed:
+                return None
+            if self._pygame is None:
+                try:
+                    import pygame
+                    pygame.mixer.init()
+                    self._pygame = pygame
+                except Exception as e:
+                    print(f"Lỗi khởi tạo âm thanh: {e}")
+                    self._init_failed = True
+                    return None
+        return self._pygame.mixer
+
+    def preload(self):
+        """Khởi tạo mixer trên luồng nền (gọi sau khi cửa sổ đã hiện)"""
+        threading.Thread(target=self._mixer, daemon=True).start()
+
+    def play_sound(self, filename="sound.mp3", loop=False, on_started=None):
         """
         Phát âm thanh.
         loop=True: Phát lặp lại (cho chế độ báo động căng)
+        on_started: hàm nhận time.perf_counter() lúc âm thanh thực sự bắt đầu phát
         """
+        requested_at = time.perf_counter()
+
         def _run():
             try:
                 sound_path = os.path.join("assets", filename)
@@ -31,16 +53,25 @@ class SoundModule:
                     print(f"⚠️ Không tìm thấy file: {sound_path}")
                     return
 
-                if pygame.mixer.music.get_busy():
+                mixer = self._mixer()
+                if mixer is None:
+                    return
+
+                if mixer.music.get_busy():
                     # Nếu đang phát bài khác thì thôi, hoặc dừng bài cũ tùy logic
                     # Ở đây ta dừng bài cũ để ưu tiên bài mới
-                    pygame.mixer.music.stop()
+                    mixer.music.stop()
 
-                pygame.mixer.music.load(sound_path)
+                mixer.music.load(sound_path)
                 
                 # play(-1) là lặp vô tận, play(0) là 1 lần
                 loops = -1 if loop else 0
-                pygame.mixer.music.play(loops=loops)
+                mixer.music.play(loops=loops)
+                # Đo độ trễ từ lúc yêu cầu tới lúc bắt đầu phát
+                started_at = time.perf_counter()
+                metrics.SOUND_DISPATCH_LATENCY.observe(started_at - requested_at)
+                if on_started is not None:
+                    on_started(started_at)
                 
             except Exception as e:
                 print(f"Lỗi phát nhạc: {e}")
@@ -51,7 +82,9 @@ class SoundModule:
 
     def stop_sound(self):
         """Dừng phát âm thanh ngay lập tức"""
+        if self._pygame is None:
+            return  # Chưa phát lần nào -> không có gì để dừng
         try:
-            pygame.mixer.music.stop()
+            self._pygame.mixer.music.stop()
         except Exception as e:
             print(f"Lỗi dừng nhạc: {e}")
@@ -0,0 +1,115 @@
+"""
+startup_profile.py – Đo thời gian import và khởi động cửa sổ chính, kèm kiểm tra ngân sách (budget)
+
+Chạy trong tiến trình con sạch (không bị ảnh hưởng bởi module đã import sẵn):
+    python -m modules.startup_profile
+    python -m modules.startup_profile --budget-ms 1500 --forbid cv2,mediapipe,pygame
+Trả mã thoát 1 nếu vượt ngân sách hoặc có module nặng bị import ngay lúc khởi động.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Các module nặng phải được import TRỄ (không được có mặt lúc cửa sổ vừa hiện)
+DEFAULT_FORBIDDEN = ("cv2", "mediapipe", "pygame", "playsound")
+
+_CHILD_SCRIPT = r"""
+import json, os, sys, time
+t0 = time.perf_counter()
+from PySide6.QtWidgets import QApplication
+import camera
+t_import = time.perf_counter()
+app = QApplication(sys.argv[:1])
+window = camera.MainWindow("startup-profile")
+window.show()
+app.processEvents()
+t_shown = time.perf_counter()
+loaded = sorted(sys.modules)
+warmup_ms = None
+if "--warmup" in sys.argv:
+    window.processor_loader.get(timeout=60)
+    warmup_ms = (window.processor_loader.load_seconds or 0) * 1000
+window.close()
+print("@@RESULT@@" + json.dumps({
+    "import_ms": (t_import - t0) * 1000,
+    "window_ms": (t_shown - t_import) * 1000,
+    "total_ms": (t_shown - t0) * 1000,
+    "warmup_ms": warmup_ms,
+    "modules": loaded,
+}))
+"""
+
+
+def parse_importtime(stderr_text):
+    """Đọc output của `python -X importtime` -> list (cumulative_us, self_us, tên module)"""
+    rows = []
+    for line in stderr_text.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        try:
+            _, rest = line.split(":", 1)
+            self_us, cumulative_us, name = rest.split("|", 2)
+            rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+        except ValueError:
+            continue
+    return rows
+
+
+def profile(warmup=False, cwd=None):
+    """Chạy tiến trình con, trả về (kết quả dict, danh sách importtime)"""
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    cmd = [sys.executable, "-X", "importtime", "-c", _CHILD_SCRIPT]
+    if warmup:
+        cmd.append("--warmup")
+    proc = subprocess.run(cmd, cwd=cwd or os.getcwd(), env=env, capture_output=True, text=True)
+    result = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("@@RESULT@@"):
+            result = json.loads(line[len("@@RESULT@@"):])
+    if result is None:
+        raise RuntimeError(f"Tiến trình đo bị lỗi (mã {proc.returncode}):\n{proc.stderr[-2000:]}")
+    return result, parse_importtime(proc.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo thời gian khởi động ứng dụng")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Ngân sách: import + hiện cửa sổ (ms)")
+    parser.add_argument("--forbid", default=",".join(DEFAULT_FORBIDDEN),
+                        help="Module không được import lúc khởi động (phân cách bởi dấu phẩy, rỗng = bỏ qua)")
+    parser.add_argument("--top", type=int, default=15, help="Số module import chậm nhất hiển thị")
+    parser.add_argument("--warmup", action="store_true", help="Đo thêm thời gian làm nóng FaceMesh (nền)")
+    args = parser.parse_args(argv)
+
+    result, imports = profile(warmup=args.warmup)
+
+    print(f"Import camera.py : {result['import_ms']:8.1f} ms")
+    print(f"Tạo + hiện cửa sổ: {result['window_ms']:8.1f} ms")
+    print(f"Tổng             : {result['total_ms']:8.1f} ms")
+    if result["warmup_ms"] is not None:
+        print(f"Làm nóng FaceMesh: {result['warmup_ms']:8.1f} ms (luồng nền)")
+
+    print(f"\nTop {args.top} module import chậm nhất (cumulative):")
+    for cumulative_us, self_us, name in sorted(imports, reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    forbidden = [m.strip() for m in args.forbid.split(",") if m.strip()]
+    eager = [m for m in forbidden if m in result["modules"]]
+    if eager:
+        print(f"\n❌ Module nặng bị import lúc khởi động: {', '.join(eager)}")
+        failed = True
+    if args.budget_ms is not None:
+        if result["total_ms"] > args.budget_ms:
+            print(f"❌ Vượt ngân sách: {result['total_ms']:.1f} ms > {args.budget_ms:.1f} ms")
+            failed = True
+        else:
+            print(f"✅ Trong ngân sách: {result['total_ms']:.1f} ms <= {args.budget_ms:.1f} ms")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
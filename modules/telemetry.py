@@ -0,0 +1,118 @@
+"""
+telemetry.py – Ghi dữ liệu chuyến đi vào outbox (để đồng bộ Firebase khi có mạng)
+- Sự kiện cảnh báo: 1 bản ghi mỗi khi 1 loại cảnh báo bắt đầu
+- Tóm tắt theo phút: số frame, tỉ lệ thấy mặt, EAR/MAR trung bình/cực trị, số cảnh báo
+Cộng dồn trong RAM (O(1)/frame), chỉ ghi SQLite 1 lần mỗi phút.
+"""
+
+
+class MinuteSummarizer:
+    """Gom số liệu từng frame thành bản tóm tắt mỗi phút (theo đồng hồ của AlertEngine)"""
+
+    def __init__(self, on_summary):
+        self.on_summary = on_summary
+        self._minute = None
+        self._reset()
+
+    def _reset(self):
+        self.frames = 0
+        self.face_frames = 0
+        self.ear_sum = 0.0
+        self.ear_min = None
+        self.mar_sum = 0.0
+        self.mar_max = None
+        self.perclos_max = None
+        self.blink_rate = None
+        self.microsleeps = 0
+        self.fatigue_max = None
+        self.fatigue_last = None
+        self.event_counts = {}
+        self.alerts = {}
+
+    def add_frame(self, data, now):
+        minute = int(now // 60)
+        if self._minute is not None and minute != self._minute:
+            self.flush()
+        self._minute = minute
+        self.frames += 1
+        if "fatigue_score" in data:
+            score = data["fatigue_score"]
+            self.fatigue_max = score if self.fatigue_max is None else max(self.fatigue_max, score)
+            self.fatigue_last = score
+            # Số sự kiện trong cửa sổ 60s -> giữ giá trị lớn nhất trong phút
+            for key in ("yawn_count", "microsleep_count", "nod_count", "tilt_count"):
+                self.event_counts[key] = max(self.event_counts.get(key, 0), data.get(key, 0))
+        if data["face_found"]:
+            ear = data["ear"]
+            mar = data["mar"]
+            self.face_frames += 1
+            self.ear_sum += ear
+            self.mar_sum += mar
+            self.ear_min = ear if self.ear_min is None else min(self.ear_min, ear)
+            self.mar_max = mar if self.mar_max is None else max(self.mar_max, mar)
+            if "perclos" in data:
+                perclos = data["perclos"]
+                self.perclos_max = perclos if self.perclos_max is None else max(self.perclos_max, perclos)
+                self.blink_rate = data["blink_rate"]
+                self.microsleeps = max(self.microsleeps, data["microsleeps"])
+
+    def add_alert(self, alert_type):
+        self.alerts[alert_type] = self.alerts.get(alert_type, 0) + 1
+
+    def summary(self):
+        face = self.face_frames
+        return {
+            "minute_start": self._minute * 60,
+            "frames": self.frames,
+            "face_ratio": round(face / self.frames, 4) if self.frames else 0.0,
+            "ear_mean": round(self.ear_sum / face, 4) if face else None,
+            "ear_min": round(self.ear_min, 4) if face else None,
+            "mar_mean": round(self.mar_sum / face, 4) if face else None,
+            "mar_max": round(self.mar_max, 4) if face else None,
+            "perclos_max": round(self.perclos_max, 4) if self.perclos_max is not None else None,
+            "blink_rate": round(self.blink_rate, 2) if self.blink_rate is not None else None,
+            "microsleeps_60s": self.microsleeps,
+            "fatigue_max": round(self.fatigue_max, 1) if self.fatigue_max is not None else None,
+            "fatigue_last": round(self.fatigue_last, 1) if self.fatigue_last is not None else None,
+            "events_60s": dict(self.event_counts),
+            "alerts": dict(self.alerts),
+        }
+
+    def flush(self):
+        """Gửi bản tóm tắt phút hiện tại (nếu có dữ liệu) và bắt đầu phút mới"""
+        if self._minute is not None and self.frames:
+            self.on_summary(self.summary())
+        self._reset()
+
+
+class TelemetryRecorder:
+    """Nối AlertEngine -> Outbox. Gọi on_frame() mỗi frame, gắn on_alert vào engine.alert_listeners"""
+
+    def __init__(self, outbox, user_id=""):
+        self.outbox = outbox
+        self.user_id = user_id
+        self.minutes = MinuteSummarizer(self._write_summary)
+
+    def _write_summary(self, summary):
+        summary["user_id"] = self.user_id
+        self.outbox.put("minutes", summary, created_at=summary["minute_start"])
+
+    def on_frame(self, data, now):
+        self.minutes.add_frame(data, now)
+
+    def on_alert(self, alert_type, now, data):
+        self.minutes.add_alert(alert_type)
+        event = {
+            "type": alert_type,
+            "time": now,
+            "user_id": self.user_id,
+            "ear": round(data.get("ear", 0.0), 4),
+            "mar": round(data.get("mar", 0.0), 4),
+            "roll": round(data.get("roll", 0.0), 2),
+            "gaze_zone": data.get("gaze_zone"),
+            "fatigue_score": round(data.get("fatigue_score", 0.0), 1),
+        }
+        self.outbox.put("events", event, created_at=now)
+
+    def close(self):
+        self.minutes.flush()
@@ -0,0 +1,105 @@
+"""
+timeseries.py – Lịch sử chỉ số có kích thước cố định + giảm mẫu LTTB cho biểu đồ
+
+- MetricHistory: vòng đệm (array 'd' cấp phát sẵn) cho thời gian + nhiều chuỗi (EAR, MAR, góc đầu ...).
+  Ghi O(1) mỗi frame, bộ nhớ cố định dù chạy cả ca.
+- lttb(): Largest-Triangle-Three-Buckets – giữ hình dạng đường (đỉnh chớp mắt, ngáp) khi giảm
+  hàng nghìn điểm xuống ~ số pixel chiều ngang -> chi phí vẽ phụ thuộc độ rộng, không phụ thuộc lịch sử.
+Không phụ thuộc Qt (dùng được cho báo cáo / kiểm thử).
+"""
+
+from array import array
+
+# Góc đầu: đã cân bằng + đúng trục gật / quay (pitch / yaw / roll thô của solvePnP nhảy ±180, xem head_motion.py)
+CHART_FIELDS = ("ear", "mar", "head_pitch", "head_yaw")
+
+
+class MetricHistory:
+    def __init__(self, capacity, fields=CHART_FIELDS):
+        self.capacity = int(capacity)
+        self.fields = tuple(fields)
+        self.times = array("d", bytes(8 * self.capacity))
+        self.values = {name: array("d", bytes(8 * self.capacity)) for name in self.fields}
+        self._next = 0      # Vị trí ghi tiếp theo
+        self.size = 0
+        self.version = 0    # Tăng mỗi lần ghi (biểu đồ chỉ vẽ lại khi có dữ liệu mới)
+
+    def append(self, t, data):
+        i = self._next
+        self.times[i] = t
+        for name in self.fields:
+            self.values[name][i] = data[name]
+        self._next = (i + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+        self.version += 1
+
+    def clear(self):
+        self._next = 0
+        self.size = 0
+        self.version += 1
+
+    @property
+    def last_time(self):
+        return self.times[self._next - 1] if self.size else None
+
+    def series(self, name, since=None):
+        """(times, values) theo thứ tự thời gian; since: chỉ lấy điểm có t >= since"""
+        values = self.values[name]
+        if self.size < self.capacity:
+            times, values = self.times[:self.size], values[:self.size]
+        else:
+            i = self._next
+            times = self.times[i:] + self.times[:i]
+            values = values[i:] + values[:i]
+        if since is not None and times and times[0] < since:
+            start = _bisect(times, since)
+            times, values = times[start:], values[start:]
+        return times, values
+
+
+def _bisect(times, t):
+    lo, hi = 0, len(times)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if times[mid] < t:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def lttb(xs, ys, threshold):
+    """Giảm (xs, ys) xuống `threshold` điểm theo LTTB. Trả về (xs, ys) dạng list."""
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(xs), list(ys)
+
+    out_x = [xs[0]]
+    out_y = [ys[0]]
+    bucket = (n - 2) / (threshold - 2)
+    a = 0  # Điểm đã chọn ở bucket trước
+    for i in range(threshold - 2):
+        start = int(i * bucket) + 1
+        end = int((i + 1) * bucket) + 1
+        # Trung bình của bucket kế tiếp (điểm thứ 3 của tam giác)
+        next_start = end
+        next_end = min(int((i + 2) * bucket) + 1, n)
+        count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / count
+        avg_y = sum(ys[next_start:next_end]) / count
+
+        ax, ay = xs[a], ys[a]
+        dx, dy = ax - avg_x, ay - avg_y
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            # Diện tích tam giác (a, j, trung bình) x2 – chỉ cần so sánh nên bỏ hệ số 1/2
+            area = abs(dx * (ys[j] - ay) - (ax - xs[j]) * dy)
+            if area > best_area:
+                best, best_area = j, area
+        out_x.append(xs[best])
+        out_y.append(ys[best])
+        a = best
+    out_x.append(xs[n - 1])
+    out_y.append(ys[n - 1])
+    return out_x, out_y
@@ -0,0 +1,197 @@
+"""
+trip_log.py – Ghi lại toàn bộ 1 chuyến đi (mỗi lần Bắt đầu -> Dừng) để làm báo cáo sau ca
+
+Mỗi chuyến là 1 thư mục data/trips/<YYYYmmdd-HHMMSS>_<user_id>/:
+- frames.bin  : mỗi frame 1 bản ghi nhị phân cố định DetectionRecord.to_bytes() (45 byte),
+                timestamp = đồng hồ của AlertEngine. 12 giờ x 30 FPS ~ 58 MB, đọc lại theo khối bằng numpy.
+- events.jsonl: cảnh báo bắt đầu / kết thúc (kèm mức độ) và mỗi lần đổi trạng thái rủi ro
+                (safe / warning / danger / no_face) -> ít dòng, đọc thẳng bằng json.
+- meta.json   : tài xế, xe, giờ bắt đầu / kết thúc, ngưỡng EAR / MAR đang dùng.
+- recording.lock: chỉ tồn tại khi chuyến ĐANG GHI (máy + PID của tiến trình ghi) -> công cụ khác
+                (fleet_report, retention) bỏ qua chuyến này; tiến trình đã chết thì coi như đã kết thúc.
+Chuyến cũ được retention.py gộp thành 1 file rollup.npz (tổng hợp theo giây / phút + meta + sự kiện).
+Ghi qua bộ đệm (chỉ 1 lệnh write nhỏ mỗi frame), không chặn luồng giao diện.
+
+Báo cáo: python -m modules.trip_report data/trips/<chuyến>  (xem trip_report.py)
+"""
+
+import ctypes
+import json
+import os
+import socket
+import sys
+import time
+
+DEFAULT_TRIPS_DIR = os.path.join("data", "trips")
+FRAMES_FILE = "frames.bin"
+EVENTS_FILE = "events.jsonl"
+META_FILE = "meta.json"
+ROLLUP_FILE = "rollup.npz"
+LOCK_FILE = "recording.lock"
+
+# Trạng thái rủi ro (giống mức độ trên thanh trạng thái, thêm "no_face" khi không thấy mặt)
+STATE_SAFE = "safe"
+STATE_WARNING = "warning"
+STATE_DANGER = "danger"
+STATE_NO_FACE = "no_face"
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    if sys.platform == "win32":
+        # os.kill(pid, 0) trên Windows sẽ KẾT THÚC tiến trình -> dùng OpenProcess
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def trip_is_active(trip_dir):
+    """
+    Chuyến đang được ghi (không được đọc tổng hợp / gộp / xóa): có recording.lock và tiến trình ghi
+    (cùng máy) còn sống. Không suy ra từ mtime của frames.bin (ghi qua bộ đệm, ở FPS thấp
+    có thể nhiều phút mới xả 1 lần).
+    """
+    try:
+        with open(os.path.join(trip_dir, LOCK_FILE), encoding="utf-8") as f:
+            lock = json.load(f)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError):
+        return True  # Khóa đang được ghi dở -> coi như đang ghi
+    if lock.get("host") != socket.gethostname():
+        return False  # Thư mục chép từ máy khác: tiến trình ghi không ở đây
+    return _pid_alive(int(lock.get("pid", 0)))
+
+
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class TripRecorder:
+    """
+    start() mở chuyến mới, on_frame(data, engine) mỗi frame SAU khi engine.evaluate(data), close() khi Dừng.
+    Cùng chữ ký on_frame với replay.run_replay -> ghi được chuyến từ video đã quay.
+    """
+
+    def __init__(self, directory=DEFAULT_TRIPS_DIR, user_id="", vehicle_id=None):
+        self.directory = directory
+        self.user_id = user_id
+        self.vehicle_id = vehicle_id or socket.gethostname()
+        self.path = None
+        self._frames = None
+        self._events = None
+        self._meta = None
+        self._alerts = {}
+        self._state = None
+        self._severity_of = {}
+        self._last_time = None
+
+    @property
+    def recording(self):
+        return self._frames is not None
+
+    def start(self, started_at=None):
+        self.close()
+        started_at = time.time() if started_at is None else started_at
+        name = time.strftime("%Y%m%d-%H%M%S", time.localtime(started_at))
+        self.path = os.path.join(self.directory, f"{name}_{self.user_id or 'unknown'}")
+        os.makedirs(self.path, exist_ok=True)
+        # Đánh dấu đang ghi TRƯỚC khi mở frames.bin
+        _write_json(os.path.join(self.path, LOCK_FILE),
+                    {"host": socket.gethostname(), "pid": os.getpid(), "started_at": started_at})
+        self._frames = open(os.path.join(self.path, FRAMES_FILE), "ab", buffering=256 * 1024)
+        self._events = open(os.path.join(self.path, EVENTS_FILE), "a", encoding="utf-8")
+        self._meta = {"user_id": self.user_id, "vehicle_id": self.vehicle_id, "started_at": started_at,
+                      "ended_at": None, "first_t": None, "last_t": None, "frames": 0}
+        _write_json(os.path.join(self.path, META_FILE), self._meta)
+        self._alerts = {}
+        self._state = None
+        self._last_time = None
+        return self.path
+
+    def _event(self, event):
+        self._events.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self._events.flush()  # Ít dòng: ghi ngay để không mất khi tắt máy đột ngột
+
+    def on_frame(self, data, engine):
+        if self._frames is None:
+            return
+        now = engine.clock.now()
+        self._frames.write(data.to_bytes(timestamp=now))
+        meta = self._meta
+        if meta["first_t"] is None:
+            meta["first_t"] = now
+            meta["ear_threshold"] = engine.INTERNAL_EAR_THRESHOLD
+            meta["mar_threshold"] = engine.INTERNAL_MAR_THRESHOLD
+        meta["frames"] += 1
+        self._last_time = now
+
+        # Cảnh báo bắt đầu / kết thúc
+        active = engine.frame_alert_types
+        alerts = self._alerts
+        if active or alerts:
+            for alert_type in sorted(a for a in active if a not in alerts):
+                severity = self._severity(engine, alert_type)
+                alerts[alert_type] = severity
+                self._event({"t": now, "event": "alert_start", "type": alert_type, "severity": severity})
+            for alert_type in [a for a in alerts if a not in active]:
+                del alerts[alert_type]
+                self._event({"t": now, "event": "alert_end", "type": alert_type})
+
+        # Trạng thái rủi ro của frame
+        if alerts:
+            state = STATE_DANGER if STATE_DANGER in alerts.values() else STATE_WARNING
+        else:
+            state = STATE_SAFE if data["face_found"] else STATE_NO_FACE
+        if state != self._state:
+            self._state = state
+            self._event({"t": now, "event": "state", "state": state})
+
+    def _severity(self, engine, alert_type):
+        severity = self._severity_of.get(alert_type)
+        if severity is None:
+            # Luật có thể được nạp lại giữa chuyến -> tra lại khi gặp loại cảnh báo mới
+            self._severity_of = {rule.id: rule.severity for rule in engine.rules.rules}
+            severity = self._severity_of.get(alert_type, STATE_WARNING)
+        return severity
+
+    def close(self, engine=None):
+        """Kết thúc chuyến (đóng các cảnh báo đang bật). engine: cập nhật ngưỡng đã học vào meta.json"""
+        if self._frames is None:
+            return None
+        now = self._last_time
+        if now is not None:
+            for alert_type in list(self._alerts):
+                self._event({"t": now, "event": "alert_end", "type": alert_type})
+        self._alerts = {}
+        self._frames.close()
+        self._events.close()
+        self._frames = self._events = None
+        meta = self._meta
+        meta["ended_at"] = time.time()
+        meta["last_t"] = now
+        if engine is not None and meta["frames"]:
+            meta["ear_threshold"] = engine.INTERNAL_EAR_THRESHOLD
+            meta["mar_threshold"] = engine.INTERNAL_MAR_THRESHOLD
+        _write_json(os.path.join(self.path, META_FILE), meta)
+        try:
+            os.remove(os.path.join(self.path, LOCK_FILE))
+        except OSError:
+            pass
+        return self.path
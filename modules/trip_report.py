@@ -0,0 +1,683 @@
+"""
+trip_report.py – Báo cáo sau ca / chuyến đi từ dữ liệu đã ghi bởi trip_log.TripRecorder
+
+Đọc frames.bin theo KHỐI cố định (np.fromfile, mặc định 262 144 frame ~ 11 MB/khối) và tính bằng numpy:
+- Theo từng khoảng `bin_sec` (mặc định 1 phút): PERCLOS, số lần chớp mắt, nhắm mắt kéo dài, ngáp,
+  tỉ lệ thấy mặt / không nhìn đường, điểm mệt mỏi trung bình / cao nhất (np.bincount theo chỉ số khoảng)
+- Đoạn nhắm mắt / ngáp nối liền qua ranh giới khối (chỉ mang theo trạng thái cuối khối trước)
+- Chỉ giữ top-N đợt nhắm mắt dài nhất -> bộ nhớ không phụ thuộc độ dài chuyến
+events.jsonl (ít dòng) cho: dòng thời gian cảnh báo, thời gian ở mỗi trạng thái rủi ro, đợt nguy hiểm dài nhất.
+Chuyến 12 giờ x 30 FPS (~1,3 triệu frame) xử lý trong vài giây.
+Chuyến đã gộp (rollup.npz, xem rollup_trip / retention.py): đọc thẳng mảng theo giây (hoặc theo phút nếu
+phần theo giây đã bị bỏ) -> bin_sec được làm tròn về bội số của độ phân giải còn lại.
+
+Kết quả: report.json + report.html (1 file duy nhất, biểu đồ SVG nhúng sẵn, không cần mạng / thư viện JS).
+    python -m modules.trip_report data/trips/20250101-080000_user
+    python -m modules.trip_report --latest
+    python -m modules.trip_report data/trips/<chuyến> --bin-sec 30 --out-dir data/reports
+"""
+
+import argparse
+import html
+import io
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+from modules.detection import WIRE_STRUCT
+from modules.trip_log import (
+    DEFAULT_TRIPS_DIR, EVENTS_FILE, FRAMES_FILE, META_FILE, ROLLUP_FILE,
+    STATE_DANGER, STATE_NO_FACE, STATE_SAFE, STATE_WARNING,
+)
+
+# Bố cục giống WIRE_STRUCT ("<BIdffffffff"), không chèn byte đệm
+FRAME_DTYPE = np.dtype([
+    ("flags", "u1"), ("seq", "<u4"), ("t", "<f8"),
+    ("ear", "<f4"), ("mar", "<f4"), ("roll", "<f4"), ("pitch", "<f4"), ("yaw", "<f4"),
+    ("perclos", "<f4"), ("fatigue", "<f4"), ("off_road_sec", "<f4"),
+])
+assert FRAME_DTYPE.itemsize == WIRE_STRUCT.size
+FLAG_FACE = 1
+FLAG_OFF_ROAD = 2
+
+DEFAULT_BIN_SEC = 60.0
+CHUNK_ROWS = 1 << 18
+BLINK_MAX_SEC = 0.5        # Nhắm lâu hơn = nhắm mắt kéo dài (không tính là chớp mắt)
+TOP_EPISODES = 10
+WORST_BINS = 5
+MIN_FACE_RATIO = 0.5       # Khoảng có ít mặt hơn thì không xếp hạng PERCLOS (quá ít mẫu)
+STATES = (STATE_SAFE, STATE_WARNING, STATE_DANGER, STATE_NO_FACE)
+ACC_FIELDS = ("frames", "face", "closed", "off_road", "blinks", "long_closures", "yawns", "fatigue_sum",
+              "fatigue_max")
+ROLLUP_MINUTE_SEC = 60
+ROLLUP_VERSION = 1
+
+
+class _RunTracker:
+    """Các đoạn liên tiếp True của 1 chuỗi boolean theo thời gian, nối qua ranh giới các khối"""
+
+    def __init__(self):
+        self.prev = False
+        self.open_start = None  # Thời điểm bắt đầu của đoạn còn dở ở cuối khối trước
+
+    def feed(self, t, mask):
+        """-> (thời điểm bắt đầu các đoạn mới trong khối, (bắt đầu, kết thúc) các đoạn kết thúc trong khối)"""
+        edges = np.diff(mask.astype(np.int8), prepend=np.int8(self.prev))
+        starts = t[edges == 1]
+        ends = t[edges == -1]
+        if self.open_start is not None:
+            all_starts = np.concatenate(([self.open_start], starts))
+        else:
+            all_starts = starts
+        count = len(ends)
+        self.open_start = all_starts[count] if len(all_starts) > count else None
+        self.prev = bool(mask[-1])
+        return starts, (all_starts[:count], ends)
+
+    def finish(self, t_end):
+        if self.open_start is None:
+            return np.empty(0), np.empty(0)
+        return np.array([self.open_start]), np.array([t_end])
+
+
+class _TopN:
+    """N đợt dài nhất (chỉ giữ N phần tử)"""
+
+    def __init__(self, n=TOP_EPISODES):
+        self.n = n
+        self.starts = np.empty(0)
+        self.durations = np.empty(0)
+
+    def add(self, starts, durations):
+        if not len(durations):
+            return
+        self.starts = np.concatenate((self.starts, starts))
+        self.durations = np.concatenate((self.durations, durations))
+        if len(self.durations) > self.n:
+            keep = np.argpartition(-self.durations, self.n)[:self.n]
+            self.starts, self.durations = self.starts[keep], self.durations[keep]
+
+    def items(self):
+        order = np.lexsort((self.starts, -self.durations))  # Dài nhất trước, bằng nhau thì sớm hơn trước
+        return [(float(self.starts[i]), float(self.durations[i])) for i in order]
+
+
+def _read_json(path, default):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def read_events(path):
+    events = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue  # Dòng cuối ghi dở (tắt máy đột ngột)
+    except OSError:
+        pass
+    events.sort(key=lambda e: e.get("t", 0.0))
+    return events
+
+
+def _time_bounds(path, count):
+    """t của frame đầu và frame cuối (đọc đúng 2 bản ghi)"""
+    with open(path, "rb") as f:
+        first = np.fromfile(f, FRAME_DTYPE, count=1)
+        f.seek((count - 1) * FRAME_DTYPE.itemsize)
+        last = np.fromfile(f, FRAME_DTYPE, count=1)
+    return float(first["t"][0]), float(last["t"][0])
+
+
+def aggregate_frames(path, t0, t_end, bin_sec, ear_threshold, mar_threshold, chunk_rows=CHUNK_ROWS):
+    """Đi qua frames.bin theo khối -> (dict mảng theo khoảng, tổng số frame, top đợt nhắm mắt)"""
+    n_bins = int((t_end - t0) // bin_sec) + 1
+    acc = {name: np.zeros(n_bins) for name in (
+        "frames", "face", "closed", "off_road", "blinks", "long_closures", "yawns", "fatigue_sum",
+    )}
+    fatigue_max = np.zeros(n_bins)
+    closures = _RunTracker()
+    yawns = _RunTracker()
+    top_closures = _TopN()
+
+    def bin_of(times):
+        index = ((times - t0) // bin_sec).astype(np.int64)
+        return np.clip(index, 0, n_bins - 1, out=index)
+
+    def add_closures(starts, ends):
+        durations = ends - starts
+        bins = bin_of(starts)
+        long = durations > BLINK_MAX_SEC
+        acc["blinks"] += np.bincount(bins[~long], minlength=n_bins)
+        acc["long_closures"] += np.bincount(bins[long], minlength=n_bins)
+        top_closures.add(starts[long], durations[long])
+
+    total = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = np.fromfile(f, FRAME_DTYPE, count=chunk_rows)
+            if not len(chunk):
+                break
+            total += len(chunk)
+            t = chunk["t"]
+            bins = bin_of(t)
+            face = (chunk["flags"] & FLAG_FACE).astype(bool)
+            closed = face & (chunk["ear"] < ear_threshold)
+            mouth_open = face & (chunk["mar"] > mar_threshold)
+            fatigue = chunk["fatigue"]
+
+            acc["frames"] += np.bincount(bins, minlength=n_bins)
+            acc["face"] += np.bincount(bins[face], minlength=n_bins)
+            acc["closed"] += np.bincount(bins[closed], minlength=n_bins)
+            acc["off_road"] += np.bincount(bins[(chunk["flags"] & FLAG_OFF_ROAD).astype(bool)], minlength=n_bins)
+            acc["fatigue_sum"] += np.bincount(bins, weights=fatigue, minlength=n_bins)
+            np.maximum.at(fatigue_max, bins, fatigue)
+
+            _, (starts, ends) = closures.feed(t, closed)
+            add_closures(starts, ends)
+            # Ngáp: mỗi lần MAR vượt ngưỡng = 1 lần (giống AlertEngine)
+            yawn_starts, _ = yawns.feed(t, mouth_open)
+            acc["yawns"] += np.bincount(bin_of(yawn_starts), minlength=n_bins)
+
+    add_closures(*closures.finish(t_end))
+    acc["fatigue_max"] = fatigue_max
+    return acc, total, top_closures
+
+
+def analyze_events(events, t0, t_end):
+    """Thời gian ở mỗi trạng thái, các khoảng trạng thái, khoảng từng loại cảnh báo"""
+    state_time = dict.fromkeys(STATES, 0.0)
+    state_intervals = []
+    transitions = [(e["t"], e["state"]) for e in events if e.get("event") == "state"]
+    for i, (t, state) in enumerate(transitions):
+        end = transitions[i + 1][0] if i + 1 < len(transitions) else t_end
+        start, end = max(t, t0), min(end, t_end)
+        if end > start:
+            state_time[state] = state_time.get(state, 0.0) + end - start
+            state_intervals.append((start, end, state))
+
+    alerts = {}
+    open_alerts = {}
+    for e in events:
+        kind = e.get("event")
+        if kind == "alert_start":
+            open_alerts[e["type"]] = (e["t"], e.get("severity", STATE_WARNING))
+        elif kind == "alert_end" and e["type"] in open_alerts:
+            start, severity = open_alerts.pop(e["type"])
+            alerts.setdefault(e["type"], {"severity": severity, "intervals": []})["intervals"].append((start, e["t"]))
+    for alert_type, (start, severity) in open_alerts.items():
+        alerts.setdefault(alert_type, {"severity": severity, "intervals": []})["intervals"].append((start, t_end))
+    return state_time, state_intervals, alerts
+
+
+def _clean(values, digits=4):
+    """Mảng numpy -> list JSON (NaN -> None)"""
+    return [None if math.isnan(v) else round(v, digits) for v in values.tolist()]
+
+
+def rebin(acc, factor):
+    """Gộp mỗi `factor` khoảng liên tiếp thành 1 (cộng dồn; fatigue_max lấy max)"""
+    if factor <= 1:
+        return acc
+    starts = np.arange(0, len(acc["frames"]), factor)
+    return {name: (np.maximum if name == "fatigue_max" else np.add).reduceat(values, starts)
+            for name, values in acc.items()}
+
+
+# --- Chuyến đã gộp (rollup.npz) ---
+def rollup_trip(trip_dir, keep_seconds=True, chunk_rows=CHUNK_ROWS):
+    """
+    Gộp frames.bin + events.jsonl + meta.json thành 1 file rollup.npz (mảng theo giây và theo phút,
+    top đợt nhắm mắt, meta, sự kiện) rồi xóa 3 file gốc. -> số byte giải phóng.
+    Ghi ra file tạm rồi os.replace: dừng giữa chừng thì chuyến vẫn nguyên dạng cũ.
+    rollup.npz giữ mtime của frames.bin -> tuổi / thứ tự các chuyến không đổi sau khi gộp.
+    """
+    trip = load_trip(trip_dir, bin_sec=1.0, chunk_rows=chunk_rows)
+    mtime = os.path.getmtime(os.path.join(trip_dir, FRAMES_FILE))
+    originals = [os.path.join(trip_dir, name) for name in (FRAMES_FILE, EVENTS_FILE, META_FILE)]
+    before = sum(os.path.getsize(p) for p in originals if os.path.exists(p))
+    info = {
+        "version": ROLLUP_VERSION, "meta": trip["meta"], "t0": trip["t0"], "t_end": trip["t_end"],
+        "total": trip["total"], "ear_threshold": trip["ear_threshold"], "mar_threshold": trip["mar_threshold"],
+        "events": read_events(os.path.join(trip_dir, EVENTS_FILE)),
+    }
+    arrays = {f"min_{name}": values.astype(np.float32)
+              for name, values in rebin(trip["acc"], ROLLUP_MINUTE_SEC).items()}
+    if keep_seconds:
+        arrays.update({f"sec_{name}": values.astype(np.float32) for name, values in trip["acc"].items()})
+    top = trip["top_closures"]
+    arrays.update(closure_starts=top.starts, closure_durations=top.durations,
+                  info=np.array(json.dumps(info, ensure_ascii=False)))
+    after = _write_rollup(trip_dir, arrays, mtime)
+    for path in originals:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return before - after
+
+
+def _write_rollup(trip_dir, arrays, mtime):
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    path = os.path.join(trip_dir, ROLLUP_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(buffer.getbuffer())
+    os.utime(tmp_path, (mtime, mtime))
+    os.replace(tmp_path, path)
+    return buffer.getbuffer().nbytes
+
+
+def _read_rollup(trip_dir):
+    with np.load(os.path.join(trip_dir, ROLLUP_FILE), allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files}
+    return json.loads(str(arrays.pop("info"))), arrays
+
+
+def drop_seconds(trip_dir):
+    """Bỏ phần theo giây của rollup.npz (chỉ giữ theo phút). -> số byte giải phóng"""
+    info, arrays = _read_rollup(trip_dir)
+    if not any(name.startswith("sec_") for name in arrays):
+        return 0
+    st = os.stat(os.path.join(trip_dir, ROLLUP_FILE))
+    arrays = {name: values for name, values in arrays.items() if not name.startswith("sec_")}
+    arrays["info"] = np.array(json.dumps(info, ensure_ascii=False))
+    return st.st_size - _write_rollup(trip_dir, arrays, st.st_mtime)
+
+
+def rollup_resolution(trip_dir):
+    """Độ phân giải (giây) còn lại của chuyến đã gộp: 1, 60; None nếu chưa gộp"""
+    if not os.path.exists(os.path.join(trip_dir, ROLLUP_FILE)):
+        return None
+    with np.load(os.path.join(trip_dir, ROLLUP_FILE), allow_pickle=False) as data:
+        return 1 if "sec_frames" in data.files else ROLLUP_MINUTE_SEC
+
+
+def trip_events(trip_dir):
+    """(meta, t0, sự kiện) của 1 chuyến, chưa gộp hay đã gộp (không đọc frame)"""
+    if os.path.exists(os.path.join(trip_dir, ROLLUP_FILE)):
+        info, _ = _read_rollup(trip_dir)
+        return info["meta"], info["t0"], info["events"]
+    meta = _read_json(os.path.join(trip_dir, META_FILE), {})
+    return meta, meta.get("first_t"), read_events(os.path.join(trip_dir, EVENTS_FILE))
+
+
+def _load_rollup(trip_dir, bin_sec):
+    info, arrays = _read_rollup(trip_dir)
+    prefix, base = ("sec_", 1) if "sec_frames" in arrays else ("min_", ROLLUP_MINUTE_SEC)
+    factor = max(1, int(round(bin_sec / base)))
+    acc = rebin({name: arrays[prefix + name].astype(np.float64) for name in ACC_FIELDS}, factor)
+    top_closures = _TopN()
+    top_closures.add(arrays["closure_starts"], arrays["closure_durations"])
+    t0, t_end = info["t0"], info["t_end"]
+    state_time, state_intervals, alerts = analyze_events(info["events"], t0, t_end)
+    return {
+        "meta": info["meta"], "t0": t0, "t_end": t_end, "bin_sec": float(base * factor),
+        "ear_threshold": info["ear_threshold"], "mar_threshold": info["mar_threshold"],
+        "acc": acc, "total": info["total"], "top_closures": top_closures,
+        "state_time": state_time, "state_intervals": state_intervals, "alerts": alerts,
+    }
+
+
+def load_trip(trip_dir, bin_sec=DEFAULT_BIN_SEC, chunk_rows=CHUNK_ROWS):
+    """
+    Số liệu thô của 1 chuyến (dùng chung cho báo cáo chuyến và tổng hợp đội xe):
+        meta, t0, t_end, bin_sec (thực tế), ear_threshold, mar_threshold, acc (mảng theo khoảng), total,
+        top_closures, state_time, state_intervals, alerts
+    """
+    meta = _read_json(os.path.join(trip_dir, META_FILE), {})
+    frames_path = os.path.join(trip_dir, FRAMES_FILE)
+    count = os.path.getsize(frames_path) // FRAME_DTYPE.itemsize if os.path.exists(frames_path) else 0
+    if not count and os.path.exists(os.path.join(trip_dir, ROLLUP_FILE)):
+        return _load_rollup(trip_dir, bin_sec)
+    if not count:
+        raise ValueError(f"Chuyến {trip_dir} không có dữ liệu frame")
+    t0, t_end = _time_bounds(frames_path, count)
+    t_end = max(t_end, t0)
+    ear_threshold = meta.get("ear_threshold") or 0.25
+    mar_threshold = meta.get("mar_threshold") or 0.5
+    acc, total, top_closures = aggregate_frames(
+        frames_path, t0, t_end, bin_sec, ear_threshold, mar_threshold, chunk_rows
+    )
+    events = read_events(os.path.join(trip_dir, EVENTS_FILE))
+    state_time, state_intervals, alerts = analyze_events(events, t0, t_end)
+    return {
+        "meta": meta, "t0": t0, "t_end": t_end, "bin_sec": bin_sec,
+        "ear_threshold": ear_threshold, "mar_threshold": mar_threshold,
+        "acc": acc, "total": total, "top_closures": top_closures,
+        "state_time": state_time, "state_intervals": state_intervals, "alerts": alerts,
+    }
+
+
+def build_report(trip_dir, bin_sec=DEFAULT_BIN_SEC, chunk_rows=CHUNK_ROWS):
+    started = time.perf_counter()
+    trip = load_trip(trip_dir, bin_sec, chunk_rows)
+    meta, t0, t_end, bin_sec = trip["meta"], trip["t0"], trip["t_end"], trip["bin_sec"]
+    ear_threshold, mar_threshold = trip["ear_threshold"], trip["mar_threshold"]
+    acc, total, top_closures = trip["acc"], trip["total"], trip["top_closures"]
+    state_time, state_intervals, alerts = trip["state_time"], trip["state_intervals"], trip["alerts"]
+    frames, face = acc["frames"], acc["face"]
+    per_minute = 60.0 / bin_sec
+    with np.errstate(invalid="ignore", divide="ignore"):
+        perclos = np.where(face > 0, acc["closed"] / face, np.nan)
+        face_ratio = np.where(frames > 0, face / frames, np.nan)
+        off_road_ratio = np.where(face > 0, acc["off_road"] / face, np.nan)
+        fatigue_mean = np.where(frames > 0, acc["fatigue_sum"] / frames, np.nan)
+    fatigue_max = np.where(frames > 0, acc["fatigue_max"], np.nan)
+
+    duration = t_end - t0
+    face_total = face.sum()
+
+    # Các đợt tệ nhất
+    danger = sorted(((end - start, start) for start, end, state in state_intervals if state == STATE_DANGER),
+                    reverse=True)[:TOP_EPISODES]
+    rankable = np.where(face_ratio >= MIN_FACE_RATIO, perclos, np.nan)
+    worst_bins = [int(i) for i in np.argsort(-np.nan_to_num(rankable, nan=-1.0))[:WORST_BINS]
+                  if not math.isnan(rankable[i]) and rankable[i] > 0]
+
+    report = {
+        "trip": os.path.basename(os.path.normpath(trip_dir)),
+        "meta": meta,
+        "bin_sec": bin_sec,
+        "thresholds": {"ear": ear_threshold, "mar": mar_threshold, "blink_max_sec": BLINK_MAX_SEC},
+        "summary": {
+            "frames": total,
+            "duration_sec": round(duration, 1),
+            "fps": round(total / duration, 1) if duration > 0 else None,
+            "face_ratio": round(float(face_total / total), 4),
+            "perclos": round(float(acc["closed"].sum() / face_total), 4) if face_total else None,
+            "blinks": int(acc["blinks"].sum()),
+            "blinks_per_min": round(float(acc["blinks"].sum()) / duration * 60, 2) if duration > 0 else None,
+            "long_closures": int(acc["long_closures"].sum()),
+            "yawns": int(acc["yawns"].sum()),
+            "yawns_per_hour": round(float(acc["yawns"].sum()) / duration * 3600, 2) if duration > 0 else None,
+            "off_road_ratio": round(float(acc["off_road"].sum() / face_total), 4) if face_total else None,
+            "fatigue_mean": round(float(acc["fatigue_sum"].sum() / total), 1),
+            "fatigue_max": round(float(np.nanmax(fatigue_max)), 1),
+            "alerts": sum(len(a["intervals"]) for a in alerts.values()),
+        },
+        "time_in_state": {state: round(sec, 1) for state, sec in state_time.items()},
+        "alerts": {
+            alert_type: {
+                "severity": a["severity"],
+                "count": len(a["intervals"]),
+                "total_sec": round(sum(end - start for start, end in a["intervals"]), 1),
+                "intervals": [(round(start - t0, 2), round(end - t0, 2)) for start, end in a["intervals"]],
+            }
+            for alert_type, a in sorted(alerts.items())
+        },
+        "state_timeline": [(round(start - t0, 2), round(end - t0, 2), state) for start, end, state in state_intervals],
+        "worst": {
+            "eye_closures": [{"offset_sec": round(s - t0, 2), "duration_sec": round(d, 2)}
+                             for s, d in top_closures.items()],
+            "danger_episodes": [{"offset_sec": round(s - t0, 2), "duration_sec": round(d, 2)} for d, s in danger],
+            "perclos_bins": [{"offset_sec": round(i * bin_sec, 1), "perclos": round(float(perclos[i]), 4),
+                              "blinks": int(acc["blinks"][i]), "yawns": int(acc["yawns"][i])}
+                             for i in worst_bins],
+        },
+        "series": {
+            "offset_sec": [round(i * bin_sec, 1) for i in range(len(frames))],
+            "perclos": _clean(perclos),
+            "blinks_per_min": _clean(acc["blinks"] * per_minute, 2),
+            "long_closures": acc["long_closures"].astype(int).tolist(),
+            "yawns": acc["yawns"].astype(int).tolist(),
+            "face_ratio": _clean(face_ratio),
+            "off_road_ratio": _clean(off_road_ratio),
+            "fatigue_mean": _clean(fatigue_mean, 1),
+            "fatigue_max": _clean(fatigue_max, 1),
+        },
+        "elapsed_sec": None,
+    }
+    report["elapsed_sec"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+# --- HTML ---
+_STATE_COLORS = {STATE_SAFE: "#2ecc71", STATE_WARNING: "#f39c12", STATE_DANGER: "#e74c3c", STATE_NO_FACE: "#7f8c8d"}
+_STATE_NAMES = {STATE_SAFE: "An toàn", STATE_WARNING: "Cảnh báo", STATE_DANGER: "Nguy hiểm",
+                STATE_NO_FACE: "Không thấy mặt"}
+_CHART_W, _CHART_H, _PAD = 760, 110, 34
+
+
+def _hms(seconds):
+    seconds = int(round(seconds))
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def _downsample(values, width):
+    """Gộp trung bình (bỏ None) để số điểm <= số pixel"""
+    step = max(1, math.ceil(len(values) / width))
+    if step == 1:
+        return values, 1
+    out = []
+    for i in range(0, len(values), step):
+        block = [v for v in values[i:i + step] if v is not None]
+        out.append(sum(block) / len(block) if block else None)
+    return out, step
+
+
+def _svg_chart(title, values, bin_sec, duration, y_max, color, bars=False, reference=None, fmt="{:g}"):
+    values, step = _downsample(values, _CHART_W - _PAD)
+    present = [v for v in values if v is not None]
+    y_max = max([y_max] + present) if present else y_max
+    plot_w, plot_h = _CHART_W - _PAD - 4, _CHART_H - 24
+    scale_x = plot_w / max(duration, bin_sec)
+
+    def x(i):
+        return _PAD + i * step * bin_sec * scale_x
+
+    def y(v):
+        return 6 + plot_h - min(v, y_max) / y_max * plot_h if y_max else 6 + plot_h
+
+    parts = [f'<svg width="{_CHART_W}" height="{_CHART_H}" role="img"><title>{html.escape(title)}</title>',
+             f'<rect x="{_PAD}" y="6" width="{plot_w}" height="{plot_h}" class="frame"/>',
+             f'<text x="{_PAD - 4}" y="14" class="axis">{fmt.format(y_max)}</text>',
+             f'<text x="{_PAD - 4}" y="{6 + plot_h}" class="axis">0</text>',
+             f'<text x="{_PAD + 4}" y="18" class="title">{html.escape(title)}</text>']
+    if reference is not None and reference <= y_max:
+        parts.append(f'<line x1="{_PAD}" x2="{_PAD + plot_w}" y1="{y(reference):.1f}" y2="{y(reference):.1f}" '
+                     f'class="ref"/>')
+    if bars:
+        bar_w = max(step * bin_sec * scale_x - 0.5, 0.5)
+        for i, v in enumerate(values):
+            if v:
+                parts.append(f'<rect x="{x(i):.1f}" y="{y(v):.1f}" width="{bar_w:.1f}" '
+                             f'height="{6 + plot_h - y(v):.1f}" fill="{color}"/>')
+    else:
+        segment = []
+        for i, v in enumerate(values + [None]):
+            if v is None:
+                if len(segment) > 1:
+                    parts.append(f'<polyline fill="none" stroke="{color}" stroke-width="1.3" '
+                                 f'points="{" ".join(segment)}"/>')
+                segment = []
+            else:
+                segment.append(f"{x(i):.1f},{y(v):.1f}")
+    for hour in range(0, int(duration // 3600) + 1):
+        px = _PAD + hour * 3600 * scale_x
+        parts.append(f'<text x="{px:.1f}" y="{_CHART_H - 4}" class="tick">{hour}h</text>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def _svg_timeline(report):
+    duration = report["summary"]["duration_sec"] or 1.0
+    alerts = report["alerts"]
+    row_h, label_w = 16, 150
+    width = _CHART_W
+    plot_w = width - label_w - 4
+    height = row_h * (len(alerts) + 1) + 18
+    scale_x = plot_w / duration
+    parts = [f'<svg width="{width}" height="{height}" role="img"><title>Dòng thời gian cảnh báo</title>',
+             f'<text x="{label_w - 6}" y="{row_h - 4}" class="axis">Trạng thái</text>']
+    for start, end, state in report["state_timeline"]:
+        parts.append(f'<rect x="{label_w + start * scale_x:.1f}" y="2" width="{max((end - start) * scale_x, 0.5):.1f}" '
+                     f'height="{row_h - 4}" fill="{_STATE_COLORS.get(state, "#95a5a6")}"/>')
+    for row, (alert_type, alert) in enumerate(alerts.items(), start=1):
+        top = row * row_h
+        color = _STATE_COLORS.get(alert["severity"], "#f39c12")
+        parts.append(f'<text x="{label_w - 6}" y="{top + row_h - 4}" class="axis">{html.escape(alert_type)}</text>')
+        for start, end in alert["intervals"]:
+            parts.append(f'<rect x="{label_w + start * scale_x:.1f}" y="{top + 2}" '
+                         f'width="{max((end - start) * scale_x, 1.0):.1f}" height="{row_h - 4}" fill="{color}"/>')
+    for hour in range(0, int(duration // 3600) + 1):
+        px = label_w + hour * 3600 * scale_x
+        parts.append(f'<text x="{px:.1f}" y="{height - 4}" class="tick">{hour}h</text>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def render_html(report):
+    summary = report["summary"]
+    meta = report["meta"]
+    bin_sec = report["bin_sec"]
+    duration = summary["duration_sec"]
+    series = report["series"]
+
+    def pct(value):
+        return "—" if value is None else f"{value * 100:.1f}%"
+
+    def when(offset):
+        started_at = meta.get("started_at")
+        clock = time.strftime(" (%H:%M:%S)", time.localtime(started_at + offset)) if started_at else ""
+        return f"+{_hms(offset)}{clock}"
+
+    cards = (
+        ("Thời lượng", _hms(duration)),
+        ("Thấy mặt", pct(summary["face_ratio"])),
+        ("PERCLOS", pct(summary["perclos"])),
+        ("Chớp mắt / phút", f"{summary['blinks_per_min']}"),
+        ("Nhắm mắt kéo dài", f"{summary['long_closures']}"),
+        ("Ngáp / giờ", f"{summary['yawns_per_hour']}"),
+        ("Không nhìn đường", pct(summary["off_road_ratio"])),
+        ("Mệt mỏi TB / max", f"{summary['fatigue_mean']} / {summary['fatigue_max']}"),
+        ("Số cảnh báo", f"{summary['alerts']}"),
+    )
+    charts = [
+        _svg_chart("PERCLOS", series["perclos"], bin_sec, duration, 0.3, "#e67e22", reference=0.15, fmt="{:.0%}"),
+        _svg_chart("Chớp mắt / phút", series["blinks_per_min"], bin_sec, duration, 30, "#3498db"),
+        _svg_chart("Nhắm mắt kéo dài", series["long_closures"], bin_sec, duration, 1, "#c0392b", bars=True),
+        _svg_chart("Ngáp", series["yawns"], bin_sec, duration, 1, "#9b59b6", bars=True),
+        _svg_chart("Điểm mệt mỏi (max)", series["fatigue_max"], bin_sec, duration, 100, "#e74c3c", reference=60),
+        _svg_chart("Tỉ lệ thấy mặt", series["face_ratio"], bin_sec, duration, 1.0, "#1abc9c", fmt="{:.0%}"),
+    ]
+    state_rows = "".join(
+        f'<tr><td><span class="dot" style="background:{_STATE_COLORS[state]}"></span>{_STATE_NAMES[state]}</td>'
+        f"<td>{_hms(sec)}</td><td>{pct(sec / duration if duration else None)}</td></tr>"
+        for state, sec in report["time_in_state"].items()
+    )
+    alert_rows = "".join(
+        f"<tr><td>{html.escape(t)}</td><td>{_STATE_NAMES.get(a['severity'], a['severity'])}</td>"
+        f"<td>{a['count']}</td><td>{_hms(a['total_sec'])}</td></tr>"
+        for t, a in report["alerts"].items()
+    ) or '<tr><td colspan="4">Không có cảnh báo</td></tr>'
+    worst = report["worst"]
+
+    def episode_rows(items):
+        return "".join(f"<tr><td>{when(e['offset_sec'])}</td><td>{e['duration_sec']:.1f}s</td></tr>"
+                       for e in items) or '<tr><td colspan="2">Không có</td></tr>'
+
+    perclos_rows = "".join(
+        f"<tr><td>{when(e['offset_sec'])}</td><td>{pct(e['perclos'])}</td><td>{e['blinks']}</td><td>{e['yawns']}</td></tr>"
+        for e in worst["perclos_bins"]
+    ) or '<tr><td colspan="4">Không có</td></tr>'
+    started_text = (time.strftime("%d/%m/%Y %H:%M:%S", time.localtime(meta["started_at"]))
+                    if meta.get("started_at") else "—")
+
+    return f"""<!DOCTYPE html>
+<html lang="vi"><head><meta charset="utf-8">
+<title>Báo cáo chuyến đi {html.escape(report['trip'])}</title>
+<style>
+body {{ font-family: Segoe UI, Arial, sans-serif; background: #1e1e1e; color: #ecf0f1; margin: 24px; }}
+h1 {{ font-size: 20px; }} h2 {{ font-size: 16px; margin-top: 28px; color: #00bfa6; }}
+.cards {{ display: grid; grid-template-columns: repeat(auto-fill, minmax(170px, 1fr)); gap: 10px; max-width: 900px; }}
+.card {{ background: #2c2c2c; border-radius: 8px; padding: 10px 12px; }}
+.card b {{ display: block; font-size: 18px; margin-top: 4px; }}
+table {{ border-collapse: collapse; margin-top: 6px; }}
+td, th {{ border-bottom: 1px solid #3a3a3a; padding: 4px 14px 4px 0; text-align: left; font-size: 13px; }}
+.dot {{ display: inline-block; width: 10px; height: 10px; border-radius: 5px; margin-right: 6px; }}
+svg {{ display: block; margin: 6px 0; }}
+svg .frame {{ fill: none; stroke: #444; }} svg .ref {{ stroke: #e74c3c; stroke-dasharray: 4 3; }}
+svg text {{ fill: #bdc3c7; font-size: 10px; }} svg .axis {{ text-anchor: end; }}
+svg .title {{ font-size: 11px; fill: #ecf0f1; }}
+.muted {{ color: #95a5a6; font-size: 12px; }}
+</style></head><body>
+<h1>Báo cáo chuyến đi – {html.escape(str(meta.get('user_id', '')))} / {html.escape(str(meta.get('vehicle_id', '')))}</h1>
+<p class="muted">Bắt đầu {started_text} · {summary['frames']:,} frame · {summary['fps']} FPS ·
+ngưỡng EAR {report['thresholds']['ear']:.3f} / MAR {report['thresholds']['mar']:.3f} · mỗi điểm = {bin_sec:g}s</p>
+<div class="cards">{"".join(f'<div class="card">{k}<b>{v}</b></div>' for k, v in cards)}</div>
+<h2>Theo thời gian</h2>{"".join(charts)}
+<h2>Dòng thời gian cảnh báo</h2>{_svg_timeline(report)}
+<h2>Thời gian ở mỗi trạng thái</h2><table>{state_rows}</table>
+<h2>Cảnh báo theo loại</h2>
+<table><tr><th>Loại</th><th>Mức độ</th><th>Số lần</th><th>Tổng thời gian</th></tr>{alert_rows}</table>
+<h2>Đợt nhắm mắt dài nhất</h2><table><tr><th>Thời điểm</th><th>Thời lượng</th></tr>{episode_rows(worst['eye_closures'])}</table>
+<h2>Đợt nguy hiểm dài nhất</h2><table><tr><th>Thời điểm</th><th>Thời lượng</th></tr>{episode_rows(worst['danger_episodes'])}</table>
+<h2>Khoảng PERCLOS cao nhất</h2>
+<table><tr><th>Thời điểm</th><th>PERCLOS</th><th>Chớp mắt</th><th>Ngáp</th></tr>{perclos_rows}</table>
+<p class="muted">Tạo lúc {time.strftime('%d/%m/%Y %H:%M:%S')} trong {report['elapsed_sec']}s</p>
+</body></html>
+"""
+
+
+def latest_trip(directory=DEFAULT_TRIPS_DIR):
+    trips = []
+    for name in os.listdir(directory):
+        for data_file in (FRAMES_FILE, ROLLUP_FILE):
+            path = os.path.join(directory, name, data_file)
+            if os.path.isfile(path):
+                trips.append((os.path.getmtime(path), os.path.join(directory, name)))
+                break
+    if not trips:
+        raise FileNotFoundError(f"Không có chuyến nào trong {directory}")
+    return max(trips)[1]
+
+
+def write_report(report, out_dir, formats=("html", "json")):
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    if "json" in formats:
+        paths.append(os.path.join(out_dir, "report.json"))
+        with open(paths[-1], "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False)
+    if "html" in formats:
+        paths.append(os.path.join(out_dir, "report.html"))
+        with open(paths[-1], "w", encoding="utf-8") as f:
+            f.write(render_html(report))
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Báo cáo sau ca từ dữ liệu chuyến đi đã ghi")
+    parser.add_argument("trip", nargs="?", help="Thư mục chuyến (data/trips/...)")
+    parser.add_argument("--latest", action="store_true", help="Dùng chuyến mới nhất trong data/trips")
+    parser.add_argument("--bin-sec", type=float, default=DEFAULT_BIN_SEC, help="Độ dài mỗi khoảng (giây)")
+    parser.add_argument("--out-dir", help="Thư mục ghi báo cáo (mặc định = thư mục chuyến)")
+    parser.add_argument("--format", default="html,json", help="html, json hoặc cả hai")
+    args = parser.parse_args(argv)
+
+    if not args.trip and not args.latest:
+        parser.error("cần đường dẫn chuyến hoặc --latest")
+    trip = latest_trip() if args.latest else args.trip
+    report = build_report(trip, bin_sec=args.bin_sec)
+    formats = {f.strip() for f in args.format.split(",")}
+    for path in write_report(report, args.out_dir or trip, formats):
+        print(f"📝 {path}")
+    summary = report["summary"]
+    print(f"{summary['frames']:,} frame ({_hms(summary['duration_sec'])}) xử lý trong {report['elapsed_sec']}s | "
+          f"PERCLOS {summary['perclos']} | {summary['alerts']} cảnh báo")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
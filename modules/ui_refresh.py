@@ -0,0 +1,87 @@
+"""
+ui_refresh.py – Gom các cập nhật giao diện theo frame, áp dụng ở tần số thấp cố định
+
+Trước đây mỗi frame (30+ lần/giây) đều gọi setText + setStyleSheet cho status bar, kể cả khi
+không có gì thay đổi; setStyleSheet buộc Qt phân tích lại QSS và polish lại widget.
+- Mỗi frame chỉ ghi giá trị MỚI vào mô hình "dirty" (rẻ, không chạm tới widget)
+- QTimer gọi flush() ~10 lần/giây: chỉ những giá trị thực sự khác với đang hiển thị mới được áp dụng
+- Màu theo mức độ dùng thuộc tính động (`severity`) + bộ chọn QSS viết sẵn trong theme
+  (QLabel#StatusBar[severity="danger"]) -> đổi mức chỉ cần polish lại 1 widget, không parse QSS.
+
+Lớp không phụ thuộc Qt: widget được gắn qua hàm apply(value) khi bind().
+"""
+
+from modules import metrics
+
+DEFAULT_INTERVAL_MS = 100  # 10 Hz
+
+UI_WIDGET_UPDATES = metrics.Counter(
+    "dms_ui_widget_updates_total", "Số lần thực sự cập nhật widget (sau khi gom)", ["field"]
+)
+UI_UPDATES_COALESCED = metrics.Counter(
+    "dms_ui_updates_coalesced_total", "Số giá trị bị gộp/bỏ qua vì không đổi hoặc bị giá trị mới hơn ghi đè"
+)
+
+_UNSET = object()
+
+
+class UIRefreshScheduler:
+    def __init__(self, interval_ms=DEFAULT_INTERVAL_MS):
+        self.interval_ms = interval_ms
+        self._apply = {}     # field -> hàm áp dụng lên widget
+        self._shown = {}     # field -> giá trị đang hiển thị
+        self._pending = {}   # field -> giá trị chờ áp dụng ở lần flush tới
+
+    def bind(self, field, apply, shown=_UNSET):
+        """Gắn 1 trường hiển thị với hàm cập nhật widget (shown: giá trị widget đang hiện, nếu biết)"""
+        self._apply[field] = apply
+        if shown is not _UNSET:
+            self._shown[field] = shown
+
+    def set(self, field, value):
+        """Gọi mỗi frame: chỉ ghi nhận, chưa chạm tới widget"""
+        if self._shown.get(field, _UNSET) == value:
+            self._pending.pop(field, None)
+            UI_UPDATES_COALESCED.inc()
+        else:
+            if field in self._pending:
+                UI_UPDATES_COALESCED.inc()
+            self._pending[field] = value
+
+    def set_now(self, field, value):
+        """Cập nhật ngay (thông báo do người dùng bấm nút...), bỏ giá trị đang chờ của trường đó"""
+        self._pending.pop(field, None)
+        if self._shown.get(field, _UNSET) != value:
+            self._show(field, value)
+
+    @property
+    def dirty(self):
+        return bool(self._pending)
+
+    def flush(self):
+        """Áp dụng các giá trị đã đổi. Trả về số widget được cập nhật."""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        for field, value in pending.items():
+            self._show(field, value)
+        return len(pending)
+
+    def discard(self):
+        """Bỏ mọi giá trị đang chờ (VD: vừa dừng camera)"""
+        self._pending.clear()
+
+    def _show(self, field, value):
+        self._apply[field](value)
+        self._shown[field] = value
+        UI_WIDGET_UPDATES.labels(field=field).inc()
+
+
+def property_applier(widget, name):
+    """Hàm apply đổi thuộc tính động `name` rồi polish lại đúng widget đó (QSS đã viết sẵn bộ chọn)"""
+    def apply(value):
+        widget.setProperty(name, value)
+        style = widget.style()
+        style.unpolish(widget)
+        style.polish(widget)
+    return apply